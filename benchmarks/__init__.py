@@ -0,0 +1,8 @@
+"""
+Benchmarks de desempenho do modelo.
+
+`micro` mede os núcleos do passo diário (preço esperado, médias móveis, livro
+de ordens, volatilidade e sentimento) com dados sintéticos; `macro` mede
+`run_single_simulation` em grades de agentes × dias × processos. Execute com
+`python -m benchmarks`.
+"""
@@ -0,0 +1,124 @@
+import argparse
+import sys
+from typing import List, Optional
+
+from .macro import carregar_parametros, executar_macro
+from .micro import MICRO_BENCHMARKS, executar_micro
+from .nucleo import (
+    carregar_resultados,
+    comparar,
+    formatar_comparacao,
+    formatar_tabela,
+    metadados,
+    salvar_resultados,
+)
+
+
+def _inteiros(texto: str) -> List[int]:
+    return [int(valor) for valor in texto.split(",") if valor]
+
+
+def _textos(texto: str) -> List[str]:
+    return [valor for valor in texto.split(",") if valor]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Executa os benchmarks e compara com uma execução de base."
+    )
+    parser.add_argument("--suite", choices=("micro", "macro", "todos"), default="todos")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument(
+        "--tamanhos",
+        type=_inteiros,
+        default=[1_000, 10_000, 100_000],
+        help="Tamanhos de população dos micro-benchmarks (separados por vírgula).",
+    )
+    parser.add_argument(
+        "--micro",
+        type=_textos,
+        default=None,
+        help=f"Subconjunto dos micro-benchmarks: {','.join(MICRO_BENCHMARKS)}.",
+    )
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--agentes", type=_inteiros, default=[100, 1_000])
+    parser.add_argument("--dias", type=_inteiros, default=[50])
+    parser.add_argument("--processos", type=_inteiros, default=[1, 4])
+    parser.add_argument("--motores", type=_textos, default=["agentes", "vetorizado"])
+    parser.add_argument(
+        "--fundos",
+        type=_inteiros,
+        default=[1],
+        help="Números de FIIs do universo nos macro-benchmarks.",
+    )
+    parser.add_argument(
+        "--rodadas",
+        type=_inteiros,
+        default=[1],
+        help="Rodadas de negociação por dia nos macro-benchmarks.",
+    )
+    parser.add_argument(
+        "--executores",
+        type=_textos,
+        default=["auto"],
+        help="Executores do passo de sentimento (auto, serial, threads, "
+        "processos) nos macro-benchmarks.",
+    )
+    parser.add_argument("--repeticoes-macro", type=int, default=1)
+    parser.add_argument("--saida", default="results/benchmarks/ultimo.json")
+    parser.add_argument(
+        "--base",
+        default=None,
+        help="JSON de uma execução anterior; benchmarks mais lentos que a "
+        "tolerância são marcados como regressão.",
+    )
+    parser.add_argument("--tolerancia", type=float, default=0.1)
+    parser.add_argument(
+        "--estatistica",
+        choices=("min", "mediana", "media"),
+        default="min",
+        help="Estatística comparada com a base (o mínimo é a menos ruidosa).",
+    )
+    args = parser.parse_args(argv)
+
+    benchmarks = {}
+    if args.suite in ("micro", "todos"):
+        benchmarks.update(
+            executar_micro(args.tamanhos, args.repeticoes, selecionados=args.micro)
+        )
+    if args.suite in ("macro", "todos"):
+        benchmarks.update(
+            executar_macro(
+                carregar_parametros(args.config),
+                num_agentes=args.agentes,
+                num_dias=args.dias,
+                num_processos=args.processos,
+                motores=args.motores,
+                repeticoes=args.repeticoes_macro,
+                num_fundos=args.fundos,
+                rodadas_por_dia=args.rodadas,
+                executores=args.executores,
+            )
+        )
+
+    resultados = {"metadados": metadados(), "benchmarks": benchmarks}
+    salvar_resultados(resultados, args.saida)
+    print(formatar_tabela(resultados))
+    print(f"\nResultados salvos em: {args.saida}")
+
+    if args.base is None:
+        return 0
+    comparacoes = comparar(
+        resultados, carregar_resultados(args.base), args.tolerancia, args.estatistica
+    )
+    print()
+    print(formatar_comparacao(comparacoes))
+    regressoes = [c["nome"] for c in comparacoes if c["situacao"] == "regressao"]
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import contextlib
+import io
+import itertools
+import json
+import os
+import statistics
+import time
+from typing import Dict, Optional, Sequence
+
+from src.monte_carlo import aplicar_sobrescritas
+from src.rodadas_simuladas import run_single_simulation
+
+from .nucleo import RAIZ_PROJETO
+
+
+def carregar_parametros(caminho: Optional[str] = None) -> dict:
+    caminho = caminho or os.path.join(RAIZ_PROJETO, "config", "parametros.json")
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def executar_macro(
+    sim_params: dict,
+    num_agentes: Sequence[int] = (100, 1_000),
+    num_dias: Sequence[int] = (50,),
+    num_processos: Sequence[int] = (1, 4),
+    motores: Sequence[str] = ("agentes", "vetorizado"),
+    repeticoes: int = 1,
+    num_fundos: Sequence[int] = (1,),
+    rodadas_por_dia: Sequence[int] = (1,),
+    executores: Sequence[str] = ("auto",),
+) -> Dict[str, Dict[str, float]]:
+    """
+    Roda `run_single_simulation` para cada combinação da grade agentes × dias ×
+    processos × motor de sentimento × número de FIIs × rodadas por dia ×
+    executor e mede o tempo total de cada execução, incluindo a criação do
+    mercado e dos processos.
+
+    O motor vetorizado não usa processos nem executores, então roda uma única
+    vez por (agentes, dias, fundos); o executor vale para os motores "agentes"
+    e "auto".
+    """
+    resultados = {}
+    for (
+        agentes,
+        dias,
+        processos,
+        motor,
+        fundos,
+        rodadas,
+        executor,
+    ) in itertools.product(
+        num_agentes,
+        num_dias,
+        num_processos,
+        motores,
+        num_fundos,
+        rodadas_por_dia,
+        executores,
+    ):
+        if motor == "vetorizado" and processos != min(num_processos):
+            continue
+        usa_executor = motor in ("agentes", "auto")
+        if not usa_executor and executor != executores[0]:
+            continue
+        params = aplicar_sobrescritas(
+            sim_params,
+            {
+                "agente.num_agentes": agentes,
+                "geral.num_dias": dias,
+                "mercado.num_processos_paralelos": processos,
+                "mercado.motor_sentimento": motor,
+                "mercado.executor": executor if usa_executor else "auto",
+                "universo_fiis.num_fundos": fundos,
+                "mercado.rodadas_por_dia": rodadas,
+            },
+        )
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_single_simulation(params, "benchmark", verbose=False)
+            tempos.append(time.perf_counter() - inicio)
+
+        nome = f"macro/motor={motor}/agentes={agentes}/dias={dias}"
+        if motor != "vetorizado":
+            nome += f"/processos={processos}"
+        if fundos != 1:
+            nome += f"/fundos={fundos}"
+        if rodadas != 1:
+            nome += f"/rodadas={rodadas}"
+        if usa_executor and executor != "auto":
+            nome += f"/executor={executor}"
+        mediana = statistics.median(tempos)
+        resultados[nome] = {
+            "min": min(tempos),
+            "mediana": mediana,
+            "media": statistics.fmean(tempos),
+            "repeticoes": repeticoes,
+            "segundos_por_agente_dia": mediana / (agentes * dias),
+        }
+    return resultados
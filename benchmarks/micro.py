@@ -0,0 +1,282 @@
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src import utils
+from src.agentes_economicos import (
+    calcular_preco_esperado_investidor,
+    calcular_precos_esperados_populacao,
+)
+from src.ambiente_de_mercado import _processar_investidor
+from src.componentes_de_mercado import LivroOrdens
+from src.configuracao import ParametrosInvestidor, ParametrosSentimento
+from src.historico_de_mercado import HistoricoPrecos
+from src.instrumentos_financeiros import FII, Imovel
+from src.populacao import PopulacaoInvestidores
+from src.rede_social import gerar_rede
+from src.volatilidade import EstimadorVolatilidade
+
+from .nucleo import medir
+
+PARAMETROS_INVESTIDOR = ParametrosInvestidor.a_partir_de_dicionario(
+    {
+        "tipo_media_movel": "ema",
+        "media_movel_params": {"dias_uteis_ano": 252, "janela_curta_divisor": 4},
+        "ruido_std_privada": 0.05,
+        "ruido_std_preco_esperado": 0.1,
+    }
+)
+PARAMETROS_SENTIMENTO = ParametrosSentimento.a_partir_de_dicionario(
+    {"a0": 0.8, "b0": 0.25, "c0": 0.2, "beta": 0.4}
+)
+
+# Variantes escalares (um agente por vez) ficam lentas demais em populações
+# grandes e só rodam até este tamanho.
+LIMITE_ESCALAR = 10_000
+LIMITE_PANDAS = 1_000
+
+
+def _precos(num_dias: int, gerador: np.random.Generator) -> np.ndarray:
+    retornos = gerador.normal(0, 0.01, num_dias)
+    return 30.0 * np.exp(np.cumsum(retornos))
+
+
+def _bench_preco_esperado(n: int, gerador, repeticoes: int) -> Dict[str, Any]:
+    precos = _precos(300, gerador)
+    lf = gerador.uniform(0.2, 1.0, n)
+    servico = utils.ServicoMediasMoveis(
+        precos, "ema", PARAMETROS_INVESTIDOR.media_movel
+    )
+    medias = servico.medias_para_populacao(lf)
+    resultados = {
+        f"preco_esperado/vetorizado/n={n}": medir(
+            lambda: calcular_precos_esperados_populacao(
+                lf, 0.4, 0.3, precos, 0.07, 0.08, PARAMETROS_INVESTIDOR, None, medias
+            ),
+            repeticoes,
+        )
+    }
+    if n <= LIMITE_ESCALAR:
+        curtas, longas = medias[0].tolist(), medias[1].tolist()
+
+        def escalar():
+            for i, valor in enumerate(lf.tolist()):
+                calcular_preco_esperado_investidor(
+                    valor,
+                    0.4,
+                    0.3,
+                    precos,
+                    0.07,
+                    0.08,
+                    PARAMETROS_INVESTIDOR,
+                    medias_moveis=(curtas[i], longas[i]),
+                )
+
+        resultados[f"preco_esperado/escalar/n={n}"] = medir(escalar, repeticoes)
+    return resultados
+
+
+def _bench_medias_moveis(n: int, gerador, repeticoes: int) -> Dict[str, Any]:
+    precos = HistoricoPrecos(_precos(300, gerador))
+    lf = gerador.uniform(0.2, 1.0, n)
+    parametros_mm = PARAMETROS_INVESTIDOR.media_movel
+    servico = utils.ServicoMediasMoveis(precos, "ema", parametros_mm)
+    servico.medias_para_populacao(lf)
+
+    def dia_servico():
+        precos.append(precos[-1] * 1.001)
+        servico.medias_para_populacao(lf)
+
+    resultados = {
+        f"medias_moveis/servico_incremental/n={n}": medir(dia_servico, repeticoes)
+    }
+    if n <= LIMITE_PANDAS:
+        serie = precos.precos
+
+        def pandas_por_agente():
+            for valor in lf.tolist():
+                utils.calcular_media_movel_tecnica(serie, valor, "ema", parametros_mm)
+
+        resultados[f"medias_moveis/pandas_por_agente/n={n}"] = medir(
+            pandas_por_agente, repeticoes, aquecimento=0
+        )
+    return resultados
+
+
+def _bench_livro_ordens(n: int, gerador, repeticoes: int) -> Dict[str, Any]:
+    agentes = [SimpleNamespace(caixa=1e9, carteira={"FII": 10**6}) for _ in range(n)]
+    compra = gerador.random(n) < 0.5
+    precos = 30.0 + gerador.normal(0, 0.5, n)
+    quantidades = gerador.integers(1, 31, n)
+    mercado = SimpleNamespace(atualizar_preco=lambda ativo, preco: None)
+    estado = {}
+
+    def novo_livro():
+        estado["livro"] = LivroOrdens()
+
+    def livro_preenchido():
+        novo_livro()
+        estado["livro"].adicionar_lote(
+            "FII", agentes, compra, precos, quantidades, dia_expiracao=0
+        )
+
+    def submeter():
+        estado["livro"].submeter_lote(
+            "FII", agentes, compra, precos, quantidades, mercado, dia_expiracao=0
+        )
+
+    return {
+        f"livro_ordens/submeter_lote/n={n}": medir(
+            submeter, repeticoes, preparar=novo_livro
+        ),
+        f"livro_ordens/executar_ordens/n={n}": medir(
+            lambda: estado["livro"].executar_ordens("FII", mercado),
+            repeticoes,
+            preparar=livro_preenchido,
+        ),
+    }
+
+
+def _bench_volatilidade(n: int, gerador, repeticoes: int) -> Dict[str, Any]:
+    # Aqui n é o tamanho do histórico de preços
+    precos = _precos(n, gerador)
+    estimador = EstimadorVolatilidade()
+    estimador.adicionar_precos(precos.tolist())
+    novo_preco = float(precos[-1])
+    return {
+        f"volatilidade/recalculo_completo/dias={n}": medir(
+            lambda: np.std(np.diff(np.log(precos))) * 252**0.5, repeticoes
+        ),
+        f"volatilidade/incremental/dias={n}": medir(
+            lambda: (estimador.adicionar_preco(novo_preco), estimador.volatilidade),
+            repeticoes,
+        ),
+    }
+
+
+def _bench_sentimento(n: int, gerador, repeticoes: int) -> Dict[str, Any]:
+    precos = HistoricoPrecos(_precos(300, gerador))
+    lf = gerador.uniform(0.2, 1.0, n)
+    rede = gerar_rede(n, min(30, n - 1))
+    populacao = PopulacaoInvestidores(
+        lf=lf,
+        caixa=np.full(n, 10_000.0),
+        cotas=np.full(n, 100),
+        rede=rede,
+        parametros=PARAMETROS_INVESTIDOR,
+        historico_riqueza=np.full((n, 5), 13_000.0),
+    )
+    populacao.servico_medias_moveis = utils.ServicoMediasMoveis(
+        precos, "ema", PARAMETROS_INVESTIDOR.media_movel
+    )
+    argumentos = dict(
+        historico_precos=precos.precos,
+        dividendos=0.3,
+        expectativa_inflacao=0.07,
+        premio_risco=0.08,
+        news=0.5,
+        volatilidade=0.2,
+        parametros_sentimento=PARAMETROS_SENTIMENTO,
+    )
+    resultados = {
+        f"sentimento/vetorizado/n={n}": medir(
+            lambda: populacao.calcular_sentimentos(**argumentos), repeticoes
+        )
+    }
+    if n <= LIMITE_ESCALAR:
+        influencia = rede.influencia_social(populacao.sentimento).tolist()
+        medias = populacao.servico_medias_moveis.medias_para_populacao(lf)
+        historico_precos = precos.precos.tolist()
+        dados = [
+            {
+                "id": i,
+                "literacia_financeira": valor,
+                "sentimento": 0.0,
+                "historico_precos": historico_precos,
+                "historico_riqueza": [13_000.0] * 5,
+                "influencia_social": influencia[i],
+                "ruido_privada": 0.0,
+                "ruido_preco_esperado": 0.0,
+                "medias_moveis": (medias[0][i], medias[1][i]),
+                "mercado_snapshot": {
+                    "volatilidade_historica": 0.2,
+                    "news": 0.5,
+                    "fii_dividendos_ultimo": 0.3,
+                },
+                "banco_central_snapshot": {
+                    "expectativa_inflacao": 0.07,
+                    "premio_risco": 0.08,
+                },
+                "parametros_sentimento": PARAMETROS_SENTIMENTO,
+                "parametros_investidor": PARAMETROS_INVESTIDOR,
+            }
+            for i, valor in enumerate(lf.tolist())
+        ]
+        resultados[f"sentimento/por_agente/n={n}"] = medir(
+            lambda: list(map(_processar_investidor, dados)), repeticoes
+        )
+    return resultados
+
+
+def _bench_imoveis(n: int, gerador, repeticoes: int) -> Dict[str, Any]:
+    # Aqui n é o número de imóveis do fundo
+    valores = gerador.uniform(5e5, 5e6, n)
+    vacancias = gerador.uniform(0.0, 0.3, n)
+    custos = gerador.uniform(100, 1_000, n)
+    params = {"aluguel_factor": 0.005, "desvio_normal": 0.01}
+    fii = FII(num_cotas=100_000, caixa=50_000.0)
+    fii.carteira_imoveis.adicionar_lote(valores, vacancias, custos, [params] * n)
+    resultados = {
+        f"imoveis/fluxo_aluguel_vetorizado/n={n}": medir(
+            fii.calcular_fluxo_total_aluguel, repeticoes
+        ),
+        f"imoveis/reavaliacao_vetorizada/n={n}": medir(
+            lambda: fii.atualizar_imoveis_com_investimento(0.0), repeticoes
+        ),
+    }
+    if n <= LIMITE_ESCALAR:
+        # Objetos soltos, como na carteira anterior baseada em listas
+        imoveis = [
+            Imovel(valor, vacancia, custo, params)
+            for valor, vacancia, custo in zip(
+                valores.tolist(), vacancias.tolist(), custos.tolist()
+            )
+        ]
+        resultados[f"imoveis/fluxo_aluguel_por_objeto/n={n}"] = medir(
+            lambda: sum(imovel.gerar_fluxo_aluguel() for imovel in imoveis),
+            repeticoes,
+        )
+    return resultados
+
+
+MICRO_BENCHMARKS = {
+    "preco_esperado": _bench_preco_esperado,
+    "medias_moveis": _bench_medias_moveis,
+    "livro_ordens": _bench_livro_ordens,
+    "volatilidade": _bench_volatilidade,
+    "sentimento": _bench_sentimento,
+    "imoveis": _bench_imoveis,
+}
+
+
+def executar_micro(
+    tamanhos: Sequence[int] = (1_000, 10_000, 100_000),
+    repeticoes: int = 5,
+    selecionados: Optional[List[str]] = None,
+    semente: int = 0,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Roda os micro-benchmarks para cada tamanho de população (ou de histórico,
+    no caso da volatilidade, e de carteira, no caso dos imóveis). Os dados de entrada são sintéticos e gerados com
+    semente fixa, de modo que execuções diferentes medem o mesmo trabalho.
+    """
+    resultados = {}
+    for nome, bench in MICRO_BENCHMARKS.items():
+        if selecionados and nome not in selecionados:
+            continue
+        for n in tamanhos:
+            gerador = np.random.default_rng(semente)
+            for chave, tempos in bench(n, gerador, repeticoes).items():
+                resultados[f"micro/{chave}"] = tempos
+    return resultados
@@ -0,0 +1,161 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def medir(
+    funcao: Callable[[], Any],
+    repeticoes: int = 5,
+    aquecimento: int = 1,
+    preparar: Optional[Callable[[], None]] = None,
+    tempo_minimo: float = 0.01,
+) -> Dict[str, float]:
+    """
+    Mede o tempo de parede de uma chamada de `funcao`, em segundos.
+
+    `preparar`, se informado, roda antes de cada repetição fora da medição (por
+    exemplo, para recriar um livro de ordens consumido pela execução anterior).
+    Sem ele, funções rápidas são chamadas várias vezes por amostra, até somar
+    `tempo_minimo`, para que a resolução do relógio não domine a medida.
+    """
+    for _ in range(aquecimento):
+        if preparar is not None:
+            preparar()
+        funcao()
+
+    numero = 1
+    if preparar is None:
+        while True:
+            inicio = time.perf_counter()
+            for _ in range(numero):
+                funcao()
+            if time.perf_counter() - inicio >= tempo_minimo:
+                break
+            numero *= 10
+
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        for _ in range(numero):
+            funcao()
+        tempos.append((time.perf_counter() - inicio) / numero)
+
+    return {
+        "min": min(tempos),
+        "mediana": statistics.median(tempos),
+        "media": statistics.fmean(tempos),
+        "desvio": statistics.pstdev(tempos),
+        "repeticoes": repeticoes,
+        "chamadas_por_amostra": numero,
+    }
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=RAIZ_PROJETO,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+            or None
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadados() -> Dict[str, Any]:
+    """
+    Ambiente em que os benchmarks rodaram, para comparar apenas o comparável.
+    """
+    return {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+        "num_cpus": os.cpu_count(),
+    }
+
+
+def salvar_resultados(resultados: Dict[str, Any], caminho: str) -> None:
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+
+def carregar_resultados(caminho: str) -> Dict[str, Any]:
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def comparar(
+    atual: Dict[str, Any],
+    base: Dict[str, Any],
+    tolerancia: float = 0.1,
+    estatistica: str = "min",
+) -> List[Dict[str, Any]]:
+    """
+    Compara os benchmarks em comum entre duas execuções.
+
+    Para cada benchmark devolve a razão atual/base da `estatistica` e a situação:
+    "regressao" se ficou mais de `tolerancia` mais lento, "melhoria" se ficou mais
+    de `tolerancia` mais rápido e "estavel" caso contrário.
+    """
+    comparacoes = []
+    tempos_base = base.get("benchmarks", {})
+    for nome, tempos in atual.get("benchmarks", {}).items():
+        if nome not in tempos_base:
+            continue
+        anterior = tempos_base[nome][estatistica]
+        novo = tempos[estatistica]
+        razao = novo / anterior if anterior > 0 else float("inf")
+        if razao > 1 + tolerancia:
+            situacao = "regressao"
+        elif razao < 1 - tolerancia:
+            situacao = "melhoria"
+        else:
+            situacao = "estavel"
+        comparacoes.append(
+            {
+                "nome": nome,
+                "base": anterior,
+                "atual": novo,
+                "razao": razao,
+                "situacao": situacao,
+            }
+        )
+    return comparacoes
+
+
+def formatar_tabela(resultados: Dict[str, Any]) -> str:
+    linhas = [f"{'benchmark':<60} {'mediana (s)':>12} {'min (s)':>12}"]
+    for nome, tempos in resultados.get("benchmarks", {}).items():
+        linhas.append(f"{nome:<60} {tempos['mediana']:>12.4g} {tempos['min']:>12.4g}")
+    return "\n".join(linhas)
+
+
+def formatar_comparacao(comparacoes: List[Dict[str, Any]]) -> str:
+    linhas = [f"{'benchmark':<60} {'base':>10} {'atual':>10} {'razão':>7}  situação"]
+    for c in comparacoes:
+        linhas.append(
+            f"{c['nome']:<60} {c['base']:>10.4g} {c['atual']:>10.4g} "
+            f"{c['razao']:>7.2f}  {c['situacao']}"
+        )
+    return "\n".join(linhas)
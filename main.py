@@ -1,12 +1,11 @@
-import json
 import os
 import numpy as np
 import matplotlib.pyplot as plt
+from src.configuracao import carregar_parametros
 from src.rodadas_simuladas import run_single_simulation
 
 if __name__ == "__main__":
-    with open("config/parametros.json", "r", encoding="utf-8") as f:
-        sim_params = json.load(f)
+    sim_params = carregar_parametros("config/parametros.json")
 
     run_id = "simulacao_completa"
     os.makedirs("results/plots", exist_ok=True)
@@ -38,7 +37,8 @@ if __name__ == "__main__":
 
     # Gerar e mostrar os gráficos
     print("\nGerando gráficos...")
-    dias_array = np.arange(num_dias)
+    # Com memória limitada, a série traz apenas os últimos dias retidos
+    dias_array = np.arange(num_dias - len(historico_precos_fii), num_dias)
     fig, ax = plt.subplots(2, 1, figsize=(12, 8), sharex=True)
 
     ax[0].plot(dias_array, historico_precos_fii, label="Preço da Cota do FII")
@@ -1,12 +1,15 @@
 # src/economic_agents.py
 import numpy as np
 import random
-from typing import TYPE_CHECKING, Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple, Union
 
 if TYPE_CHECKING:
     from .ambiente_de_mercado import Mercado
+    from .historico_de_mercado import HistoricoMercado
 
 from . import utils
+from .aleatoriedade import inteiros_uniformes
+from .configuracao import ParametrosInvestidor, ParametrosSentimento
 from .componentes_de_mercado import Ordem
 
 
@@ -17,7 +20,9 @@ def calcular_preco_esperado_investidor(
     historico_precos: np.ndarray,
     expectativa_inflacao: float,
     expectativa_premio: float,
-    parametros_investidor: Dict[str, Any],
+    parametros_investidor: Union[ParametrosInvestidor, Dict[str, Any]],
+    medias_moveis: Optional[Tuple[float, float]] = None,
+    ruido: Optional[float] = None,
 ) -> float:
     x = lf / (np.exp(1) ** beta)
     z = (1 - beta) * (1 - lf)
@@ -39,19 +44,23 @@ def calcular_preco_esperado_investidor(
             historico_precos[-1]
         )
 
-    tipo_media = parametros_investidor.get("tipo_media_movel", "ema")
-    parametros_mm = parametros_investidor.get("media_movel_params", {})
-    mm_curta, mm_longa = utils.calcular_media_movel_tecnica(
-        historico_precos, lf, tipo_media, parametros_mm
-    )
+    if medias_moveis is None:
+        parametros_investidor = ParametrosInvestidor.resolver(parametros_investidor)
+        medias_moveis = utils.calcular_media_movel_tecnica(
+            historico_precos,
+            lf,
+            parametros_investidor.tipo_media_movel,
+            parametros_investidor.media_movel,
+        )
+    mm_curta, mm_longa = medias_moveis
 
     retorno_especulador = np.log(mm_curta / mm_longa) if mm_longa > 0 else 0.0
-    retorno_ruido = np.random.normal(
-        0, parametros_investidor.get("ruido_std_preco_esperado", 0.1)
-    )
+    if ruido is None:
+        parametros_investidor = ParametrosInvestidor.resolver(parametros_investidor)
+        ruido = np.random.normal(0, parametros_investidor.ruido_std_preco_esperado)
 
     retorno_total = (
-        (x * retorno_fundamentalista) + (y * retorno_especulador) + (z * retorno_ruido)
+        (x * retorno_fundamentalista) + (y * retorno_especulador) + (z * ruido)
     )
 
     preco_esperado = (
@@ -62,6 +71,80 @@ def calcular_preco_esperado_investidor(
     return preco_esperado
 
 
+def calcular_precos_esperados_populacao(
+    lf: np.ndarray,
+    beta: float,
+    dividendos: float,
+    historico_precos: np.ndarray,
+    expectativa_inflacao: np.ndarray,
+    expectativa_premio: np.ndarray,
+    parametros_investidor: Union[ParametrosInvestidor, Dict[str, Any]],
+    ruido: Optional[np.ndarray] = None,
+    medias_moveis: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> np.ndarray:
+    """
+    Versão vetorizada de `calcular_preco_esperado_investidor`: recebe arrays com
+    a LF e as expectativas de cada agente e devolve o preço esperado de todos
+    eles em uma única passada.
+    """
+    lf = np.asarray(lf, dtype=float)
+    historico_precos = np.asarray(historico_precos, dtype=float)
+    n = lf.shape[0]
+    expectativa_inflacao = np.broadcast_to(
+        np.asarray(expectativa_inflacao, dtype=float), (n,)
+    )
+    expectativa_premio = np.broadcast_to(
+        np.asarray(expectativa_premio, dtype=float), (n,)
+    )
+
+    parametros_investidor = ParametrosInvestidor.resolver(parametros_investidor)
+    if ruido is None:
+        ruido = np.random.normal(0, parametros_investidor.ruido_std_preco_esperado, n)
+
+    if len(historico_precos) == 0 or historico_precos[-1] <= 0:
+        return np.zeros(n)
+    preco_atual = historico_precos[-1]
+
+    x = lf / (np.exp(1) ** beta)
+    z = (1 - beta) * (1 - lf)
+    y = 1 - x - z
+
+    preco_fundamentalista = np.zeros(n)
+    premio_positivo = expectativa_premio > 0
+    preco_fundamentalista[premio_positivo] = (
+        dividendos
+        * 12
+        * (1 + expectativa_inflacao[premio_positivo])
+        / expectativa_premio[premio_positivo]
+    )
+
+    retorno_fundamentalista = np.zeros(n)
+    fundamentalista_valido = preco_fundamentalista > 0
+    retorno_fundamentalista[fundamentalista_valido] = np.log(
+        preco_fundamentalista[fundamentalista_valido]
+    ) - np.log(preco_atual)
+
+    if medias_moveis is None:
+        medias_moveis = utils.calcular_medias_moveis_populacao(
+            historico_precos,
+            lf,
+            parametros_investidor.tipo_media_movel,
+            parametros_investidor.media_movel,
+        )
+    mm_curta, mm_longa = medias_moveis
+
+    retorno_especulador = np.zeros(n)
+    longa_positiva = mm_longa > 0
+    retorno_especulador[longa_positiva] = np.log(
+        mm_curta[longa_positiva] / mm_longa[longa_positiva]
+    )
+
+    retorno_total = (
+        (x * retorno_fundamentalista) + (y * retorno_especulador) + (z * ruido)
+    )
+    return preco_atual * np.exp(retorno_total)
+
+
 class Investidor:
     def __init__(
         self,
@@ -70,56 +153,140 @@ class Investidor:
         caixa: float,
         cotas: int,
         historico_precos: list,
-        parametros: dict,
+        parametros: Union[ParametrosInvestidor, dict],
+        ativo: str = "FII",
     ):
+        """
+        `cotas` são as cotas iniciais do FII `ativo`; `historico_precos` é a
+        série de preços desse fundo. `parametros` é um `ParametrosInvestidor`,
+        normalmente compartilhado por toda a população, ou o dicionário da
+        configuração.
+        """
         self.id = id_investidor
         self.LF = lf
         self.caixa = caixa
-        self.parametros = parametros
-        piso = self.parametros.get("piso_prob_negociar", 0.3)
-        fator = self.parametros.get("fator_lf_prob_negociar", 0.9)
-        self.prob_negociar = np.clip(piso + fator * ((1 - self.LF) ** 2), 0.1, 1.0)
+        self.parametros = ParametrosInvestidor.resolver(parametros)
+        self.prob_negociar = np.clip(
+            self.parametros.piso_prob_negociar
+            + self.parametros.fator_lf_prob_negociar * ((1 - self.LF) ** 2),
+            0.1,
+            1.0,
+        )
 
-        self.carteira = {"FII": cotas}
+        self.ativo = ativo
+        self.carteira = {ativo: cotas}
         self.sentimento = 0.0
         self.RD = 0.0
+        self.preco_esperado: Optional[float] = None
         self.percentual_alocacao = 0.0
 
-        self.historico_precos = np.array(historico_precos)
-        self.historico_riqueza = np.array(
-            [caixa + cotas * (historico_precos[-1] if historico_precos else 0)]
+        self._historico_mercado: Optional["HistoricoMercado"] = None
+        self._indice_historico = -1
+        self._historico_precos = np.array(historico_precos)
+        self._historico_riqueza = np.array(
+            [caixa + cotas * (historico_precos[-1] if len(historico_precos) else 0)]
         )
         self.historico_sentimentos = []
         self.vizinhos = []
 
+    @property
+    def historico_precos(self) -> np.ndarray:
+        """
+        Série de preços do FII `ativo` com que o investidor foi criado.
+        """
+        if self._historico_mercado is not None:
+            return self._historico_mercado.precos_de(self.ativo)
+        return self._historico_precos
+
+    @historico_precos.setter
+    def historico_precos(self, valor) -> None:
+        self._historico_precos = np.asarray(valor)
+
+    @property
+    def historico_riqueza(self) -> np.ndarray:
+        if self._historico_mercado is not None:
+            return self._historico_mercado.riqueza.linha(self._indice_historico)
+        return self._historico_riqueza
+
+    @historico_riqueza.setter
+    def historico_riqueza(self, valor) -> None:
+        self._historico_riqueza = np.asarray(valor)
+
+    def vincular_historico(self, historico: "HistoricoMercado", indice: int) -> None:
+        """
+        Passa a ler preços e riqueza do histórico compartilhado do mercado, em vez
+        de manter cópias próprias que crescem a cada dia.
+        """
+        self._historico_mercado = historico
+        self._indice_historico = indice
+        self._historico_precos = None
+        self._historico_riqueza = None
+
     def definir_vizinhos(self, todos_investidores: list, num_vizinhos: int):
-        candidatos = [i for i in todos_investidores if i.id != self.id]
-        self.vizinhos = random.sample(candidatos, min(num_vizinhos, len(candidatos)))
+        # Sorteia posições em range(n - 1) e pula a do próprio investidor, o que
+        # equivale a sortear da lista dos demais sem construí-la (O(k), não O(n)).
+        posicao = self.id
+        if not (
+            0 <= posicao < len(todos_investidores)
+            and todos_investidores[posicao] is self
+        ):
+            candidatos = [i for i in todos_investidores if i.id != self.id]
+            self.vizinhos = random.sample(
+                candidatos, min(num_vizinhos, len(candidatos))
+            )
+            return
+        num_candidatos = len(todos_investidores) - 1
+        sorteados = random.sample(
+            range(num_candidatos), min(num_vizinhos, num_candidatos)
+        )
+        self.vizinhos = [
+            todos_investidores[j if j < posicao else j + 1] for j in sorteados
+        ]
 
-    def criar_ordem(self, mercado: "Mercado", parametros: dict) -> Optional[Ordem]:
-        ativo = "FII"
-        preco_mercado = mercado.fii.preco_cota
+    def criar_ordem(
+        self,
+        mercado: "Mercado",
+        parametros: Union[ParametrosSentimento, dict],
+        preco_esperado: Optional[float] = None,
+        sorteios: Optional[Tuple[float, float]] = None,
+        indice_ativo: int = 0,
+    ) -> Optional[Ordem]:
+        """
+        Cria a ordem do dia para o FII `mercado.fiis[indice_ativo]`.
+        `preco_esperado` reaproveita o preço calculado no passo de sentimento e
+        `sorteios` são os uniformes (compra, venda) que definem as quantidades;
+        sem eles, ambos são sorteados aqui.
+        """
+        parametros = ParametrosSentimento.resolver(parametros)
+        fii = mercado.fiis[indice_ativo]
+        ativo = fii.nome
+        preco_mercado = fii.preco_cota
         if preco_mercado <= 0:
             return None
 
-        dividendos = mercado.fii.historico_dividendos[-1]
-
-        preco_esperado = calcular_preco_esperado_investidor(
-            self.LF,
-            parametros["beta"],
-            dividendos,
-            self.historico_precos,
-            mercado.banco_central.expectativa_inflacao,
-            mercado.banco_central.premio_risco,
-            self.parametros,
-        )
+        if preco_esperado is None:
+            preco_esperado = calcular_preco_esperado_investidor(
+                self.LF,
+                parametros.beta,
+                fii.historico_dividendos[-1],
+                np.asarray(fii.historico_precos),
+                mercado.banco_central.expectativa_inflacao,
+                mercado.banco_central.premio_risco,
+                self.parametros,
+                medias_moveis=mercado.servicos_medias_moveis[
+                    indice_ativo
+                ].medias_para_lf(self.LF),
+            )
 
-        peso_preco_esperado = parametros.get("peso_preco_esperado", 0.35)
+        peso_preco_esperado = parametros.peso_preco_esperado
 
         if preco_mercado < preco_esperado:
-            qtd_min = parametros.get("quantidade_compra_min", 1)
-            qtd_max = parametros.get("quantidade_compra_max", 30)
-            cotas_desejadas = random.randint(qtd_min, qtd_max)
+            qtd_min = parametros.quantidade_compra_min
+            qtd_max = parametros.quantidade_compra_max
+            if sorteios is None:
+                cotas_desejadas = random.randint(qtd_min, qtd_max)
+            else:
+                cotas_desejadas = int(inteiros_uniformes(sorteios[0], qtd_min, qtd_max))
             valor_total = preco_mercado * cotas_desejadas
             if self.caixa >= valor_total:
                 preco_limite = (
@@ -133,15 +300,20 @@ class Investidor:
                 preco_limite = (
                     1 - peso_preco_esperado
                 ) * preco_mercado + peso_preco_esperado * preco_esperado
-                divisor = parametros.get("divisor_quantidade_venda", 5)
+                divisor = parametros.divisor_quantidade_venda
                 qtd_max_venda = max(1, int(cotas_possuidas / divisor))
-                return Ordem(
-                    "venda", self, ativo, preco_limite, random.randint(1, qtd_max_venda)
-                )
+                if sorteios is None:
+                    cotas_venda = random.randint(1, qtd_max_venda)
+                else:
+                    cotas_venda = int(inteiros_uniformes(sorteios[1], 1, qtd_max_venda))
+                return Ordem("venda", self, ativo, preco_limite, cotas_venda)
 
         return None
 
     def atualizar_historico(self, preco_fii: float):
-        riqueza_atual = self.caixa + self.carteira.get("FII", 0) * preco_fii
-        self.historico_riqueza = np.append(self.historico_riqueza, riqueza_atual)
-        self.historico_precos = np.append(self.historico_precos, preco_fii)
+        if self._historico_mercado is not None:
+            # O histórico compartilhado é atualizado uma única vez pelo mercado.
+            return
+        riqueza_atual = self.caixa + self.carteira.get(self.ativo, 0) * preco_fii
+        self._historico_riqueza = np.append(self._historico_riqueza, riqueza_atual)
+        self._historico_precos = np.append(self._historico_precos, preco_fii)
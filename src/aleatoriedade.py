@@ -0,0 +1,107 @@
+import numpy as np
+from typing import Callable, Optional
+
+# Cada finalidade tem seu próprio fluxo; novos sorteios devem receber um número
+# novo para não alterar os fluxos já existentes.
+FINALIDADES = {
+    "ruido_privada": 0,
+    "ruido_preco_esperado": 1,
+    "negociar": 2,
+    "quantidade_compra": 3,
+    "quantidade_venda": 4,
+    "ativo": 5,
+}
+
+
+class FluxosAleatorios:
+    """
+    Sorteios dos agentes derivados da semente da rodada, independentes de como a
+    população é dividida entre processos.
+
+    Para cada (finalidade, dia, bloco de agentes) é criado um gerador Philox a
+    partir de `SeedSequence(semente, spawn_key=...)`. O valor sorteado para o
+    agente i no dia d depende apenas desses índices, então o motor por agente
+    (serial ou em pool), o vetorizado e o fragmentado produzem os mesmos números
+    e cada bloco é gerado de uma só vez.
+
+    Com várias rodadas de negociação por dia, a rodada entra na chave a partir
+    da segunda; a rodada 0 usa a mesma chave de um dia com uma única rodada.
+    """
+
+    TAMANHO_BLOCO = 2**16
+
+    def __init__(self, semente: int, num_agentes: int):
+        self.semente = int(semente)
+        self.num_agentes = num_agentes
+
+    def _gerador(
+        self, finalidade: str, dia: int, bloco: int, rodada: int = 0
+    ) -> np.random.Generator:
+        chave = (FINALIDADES[finalidade], dia, bloco)
+        if rodada:
+            chave += (rodada,)
+        sequencia = np.random.SeedSequence(self.semente, spawn_key=chave)
+        return np.random.Generator(np.random.Philox(sequencia))
+
+    def _amostrar(
+        self,
+        finalidade: str,
+        dia: int,
+        inicio: int,
+        fim: Optional[int],
+        amostrador: Callable[[np.random.Generator, int], np.ndarray],
+        rodada: int = 0,
+    ) -> np.ndarray:
+        fim = self.num_agentes if fim is None else fim
+        if fim <= inicio:
+            return np.zeros(0)
+        tamanho = self.TAMANHO_BLOCO
+        partes = []
+        for bloco in range(inicio // tamanho, (fim - 1) // tamanho + 1):
+            base = bloco * tamanho
+            valores = amostrador(
+                self._gerador(finalidade, dia, bloco, rodada),
+                min(tamanho, self.num_agentes - base),
+            )
+            partes.append(valores[max(inicio - base, 0) : fim - base])
+        return partes[0] if len(partes) == 1 else np.concatenate(partes)
+
+    def normal(
+        self,
+        finalidade: str,
+        dia: int,
+        desvio: float,
+        inicio: int = 0,
+        fim: Optional[int] = None,
+        rodada: int = 0,
+    ) -> np.ndarray:
+        """
+        Ruído normal N(0, desvio) dos agentes [inicio, fim) no dia (e rodada).
+        """
+        return desvio * self._amostrar(
+            finalidade, dia, inicio, fim, lambda g, n: g.standard_normal(n), rodada
+        )
+
+    def uniforme(
+        self,
+        finalidade: str,
+        dia: int,
+        inicio: int = 0,
+        fim: Optional[int] = None,
+        rodada: int = 0,
+    ) -> np.ndarray:
+        """
+        Sorteios uniformes em [0, 1) dos agentes [inicio, fim) no dia (e rodada).
+        """
+        return self._amostrar(
+            finalidade, dia, inicio, fim, lambda g, n: g.random(n), rodada
+        )
+
+
+def inteiros_uniformes(uniformes: np.ndarray, minimo, maximo) -> np.ndarray:
+    """
+    Converte sorteios em [0, 1) em inteiros uniformes em [minimo, maximo].
+    `maximo` pode ser um array (um limite por agente).
+    """
+    amplitude = np.asarray(maximo) - minimo + 1
+    return minimo + np.floor(uniformes * amplitude).astype(np.int64)
@@ -1,14 +1,38 @@
 import os
-import random
+import pickle
+import time
 import traceback
 import numpy as np
-from multiprocessing import Pool
-from typing import List, Dict, Any
+from collections import deque
+from typing import List, Dict, Any, Optional, Sequence, Union
 
 from .instrumentos_financeiros import FII
-from .componentes_de_mercado import LivroOrdens
+from .componentes_de_mercado import LivroOrdens, LivroOrdensReferencia
 from .agentes_economicos import Investidor, calcular_preco_esperado_investidor
+from .configuracao import (
+    EXECUTORES,
+    ParametrosInvestidor,
+    ParametrosMercado,
+    ParametrosSentimento,
+)
+from .aleatoriedade import FluxosAleatorios
+from .eventos import AgendaEventos, Evento
+from .executores import CalibradorExecutores, Executor, criar_executor
 from .fatores_de_ambiente import BancoCentral, Midia
+from .populacao import (
+    PopulacaoInvestidores,
+    agrupar_por_ativo,
+    matriz_cotas,
+    precos_fechamento,
+    riqueza_carteiras,
+    sortear_ativos_foco,
+)
+from .rede_social import RedeSocial
+from .fragmentos import ExecutorFragmentado
+from .historico_de_mercado import HistoricoMercado, HistoricoPrecos
+from .instrumentacao import Instrumentacao
+from .volatilidade import EstimadorVolatilidade
+from .utils import ServicoMediasMoveis, agrupar_janelas_media_movel
 
 
 def _processar_investidor(dados: Dict[str, Any]) -> Dict[str, Any]:
@@ -17,35 +41,36 @@ def _processar_investidor(dados: Dict[str, Any]) -> Dict[str, Any]:
         hist_precos = np.array(dados["historico_precos"])
         hist_riqueza = np.array(dados["historico_riqueza"])
         sentimento_ant = dados["sentimento"]
-        sentimentos_vizinhos = dados["vizinhos_sentimentos"]
-        params_sent = dados["parametros_sentimento"]
-        params_investidor = dados["parametros_investidor"]
+        params_sent = ParametrosSentimento.resolver(dados["parametros_sentimento"])
+        params_investidor = ParametrosInvestidor.resolver(
+            dados["parametros_investidor"]
+        )
         mercado_snap = dados["mercado_snapshot"]
         bc_snap = dados["banco_central_snapshot"]
 
-        peso_si = params_sent.get("peso_sentimento_inflacao", 0.9)
+        peso_si = params_investidor.peso_sentimento_inflacao
         exp_inflacao = bc_snap["expectativa_inflacao"] * (1 - sentimento_ant * peso_si)
 
-        peso_sp = params_sent.get("peso_sentimento_expectativa", 0.9)
+        peso_sp = params_investidor.peso_sentimento_expectativa
         exp_premio = bc_snap["premio_risco"] * (1 - sentimento_ant * peso_sp)
 
-        i_social = (
-            np.mean(np.nan_to_num(np.array(sentimentos_vizinhos)))
-            if sentimentos_vizinhos
-            else 0.0
-        )
+        i_social = dados["influencia_social"]
 
         preco_esperado = calcular_preco_esperado_investidor(
             lf,
-            params_sent["beta"],
+            params_sent.beta,
             mercado_snap["fii_dividendos_ultimo"],
             hist_precos,
             exp_inflacao,
             exp_premio,
             params_investidor,
+            medias_moveis=dados.get("medias_moveis"),
+            ruido=dados["ruido_preco_esperado"],
         )
 
-        preco_atual = hist_precos[-1] if len(hist_precos) > 0 else 0.0
+        preco_atual = dados.get("preco_atual")
+        if preco_atual is None:
+            preco_atual = hist_precos[-1] if len(hist_precos) > 0 else 0.0
         comp_retorno = (
             np.log(preco_esperado / preco_atual)
             if preco_atual > 0 and preco_esperado > 0
@@ -59,12 +84,13 @@ def _processar_investidor(dados: Dict[str, Any]) -> Dict[str, Any]:
             else 0.0
         )
 
-        peso_r = params_investidor.get("peso_retorno_privada", 0.6)
-        peso_w = params_investidor.get("peso_riqueza_privada", 0.4)
-        ruido = np.random.normal(0, params_investidor.get("ruido_std_privada", 0.05))
-        i_privado = peso_r * comp_retorno + peso_w * comp_riqueza + ruido
+        peso_r = params_investidor.peso_retorno_privada
+        peso_w = params_investidor.peso_riqueza_privada
+        i_privado = (
+            peso_r * comp_retorno + peso_w * comp_riqueza + dados["ruido_privada"]
+        )
 
-        a0, b0, c0 = params_sent["a0"], params_sent["b0"], params_sent["c0"]
+        a0, b0, c0 = params_sent.a0, params_sent.b0, params_sent.c0
         sentimento_bruto = (
             a0 * lf * i_privado
             + b0 * (1 - lf) * i_social
@@ -79,6 +105,7 @@ def _processar_investidor(dados: Dict[str, Any]) -> Dict[str, Any]:
             "id": dados["id"],
             "sentimento": sentimento_final,
             "RD": risco_decisao,
+            "preco_esperado": preco_esperado,
         }
     except Exception:
         traceback.print_exc()
@@ -89,102 +116,736 @@ class Mercado:
     def __init__(
         self,
         investidores: List[Investidor],
-        fii: FII,
+        fii: Union[FII, Sequence[FII]],
         banco_central: BancoCentral,
         midia: Midia,
         parametros: dict,
+        rede_social: Optional[RedeSocial] = None,
+        semente: Optional[int] = None,
+        estado_restaurado: Optional[Dict[str, Any]] = None,
     ):
+        """
+        `fii` é um FII ou o universo de FIIs negociados, cada um com seus imóveis,
+        calendário de dividendos, série de preços e livro de ordens próprios. O
+        primeiro fundo continua acessível como `self.fii`.
+
+        `estado_restaurado` é o dicionário devolvido por `Mercado.estado()` em um
+        checkpoint; com ele o mercado continua exatamente de onde parou.
+        """
         self.investidores = investidores
-        self.fii = fii
+        self.fiis = [fii] if isinstance(fii, FII) else list(fii)
+        self.fii = self.fiis[0]
+        self.num_ativos = len(self.fiis)
+        self.ativos = [fundo.nome for fundo in self.fiis]
+        self.indice_ativo = {nome: indice for indice, nome in enumerate(self.ativos)}
+        if len(self.indice_ativo) != self.num_ativos:
+            raise ValueError("Os FIIs do mercado precisam ter nomes distintos.")
         self.banco_central = banco_central
         self.midia = midia
         self.parametros = parametros
-        self.livro_ordens = LivroOrdens()
-        self.volatilidade_historica = self.parametros.get("volatilidade_inicial", 0.1)
-        self.freq_dividendos = self.parametros.get("dividendos_frequencia", 21)
-        self.freq_atu_imoveis = self.parametros.get(
-            "atualizacao_imoveis_frequencia", 126
+        # Opções validadas de uma vez; uma configuração inválida falha aqui
+        self.configuracao = configuracao = ParametrosMercado.resolver(parametros)
+        modo_livro = configuracao.livro_modo
+        # Na implementação de referência, livros ordenados a cada casamento e
+        # médias móveis recalculadas por agente, independentes das otimizações
+        self.implementacao_referencia = configuracao.implementacao_referencia
+        classe_livro = (
+            LivroOrdensReferencia if self.implementacao_referencia else LivroOrdens
         )
+        # Um livro por ativo, casados de forma independente
+        self.livros_ordens = [classe_livro(modo=modo_livro) for _ in self.fiis]
+        self.validade_ordens = configuracao.validade_ordens_dias
+        self.volatilidades = np.full(self.num_ativos, configuracao.volatilidade_inicial)
+        self.estimadores_volatilidade = [
+            EstimadorVolatilidade.a_partir_de_configuracao(configuracao)
+            for _ in self.fiis
+        ]
+        for indice, estimador in enumerate(self.estimadores_volatilidade):
+            if estado_restaurado is None:
+                estimador.adicionar_precos(self.fiis[indice].historico_precos)
+            else:
+                estimador.restaurar_estado(estado_restaurado["volatilidade"][indice])
+        self.freq_dividendos = configuracao.dividendos_frequencia
+        self.freq_atu_imoveis = configuracao.atualizacao_imoveis_frequencia
+        self.agenda = self._montar_agenda()
+        self.rodadas_por_dia = configuracao.rodadas_por_dia
+        self.sentimento_por_rodada = configuracao.sentimento_por_rodada
+        # Preço de cada ativo ao fim de cada rodada do dia corrente
+        self.precos_rodadas = np.zeros((self.rodadas_por_dia, self.num_ativos))
         self.news = 0
         self.dia_atual = 0
-        self.pool = Pool(
-            processes=self.parametros.get(
-                "num_processos_paralelos", os.cpu_count() // 2 or 2
+        self.instrumentacao = Instrumentacao(ativa=configuracao.instrumentacao)
+
+        # Uma série de preços por ativo e uma matriz de riqueza para todos os agentes
+        totais_precos = [None] * self.num_ativos
+        if estado_restaurado is None:
+            riqueza_inicial = np.array([inv.historico_riqueza for inv in investidores])
+        else:
+            riqueza_inicial = estado_restaurado["riqueza"]
+            self.dia_atual = estado_restaurado["dia_atual"]
+            self.news = estado_restaurado["news"]
+            self.volatilidades[:] = estado_restaurado["volatilidades"]
+            semente = estado_restaurado["semente"]
+            totais_precos = estado_restaurado.get("precos_total", totais_precos)
+            self.banco_central.decidir(
+                **estado_restaurado.get("decisoes_banco_central", {})
+            )
+
+        # Com memória limitada, os históricos guardam apenas o que o modelo lê:
+        # os preços da maior média móvel, as últimas riquezas, o último dividendo
+        # e a última notícia. As séries completas vão para a saída em disco
+        self.memoria_limitada = configuracao.memoria_limitada
+        janela_precos = janela_riqueza = None
+        if self.memoria_limitada:
+            janela_precos = self._janela_precos(investidores)
+            janela_riqueza = PopulacaoInvestidores.JANELA_RIQUEZA
+            for fundo in self.fiis:
+                fundo.historico_dividendos = deque(fundo.historico_dividendos, maxlen=1)
+            self.midia.historico_valores = deque(self.midia.historico_valores, maxlen=1)
+            for inv in investidores:
+                inv.historico_sentimentos = deque(maxlen=0)
+        self.historico = HistoricoMercado(
+            self.fii.historico_precos,
+            riqueza_inicial,
+            capacidade_dias=self.midia.total_dias,
+            janela_precos=janela_precos,
+            janela_riqueza=janela_riqueza,
+            total_precos=totais_precos[0],
+        )
+        self.historicos_precos = [self.historico.precos] + [
+            HistoricoPrecos(
+                fundo.historico_precos,
+                capacidade=len(fundo.historico_precos) + self.midia.total_dias,
+                janela=janela_precos,
+                total=total,
             )
+            for fundo, total in zip(self.fiis[1:], totais_precos[1:])
+        ]
+        for fundo, serie in zip(self.fiis, self.historicos_precos):
+            fundo.historico_precos = serie
+            self.historico.adicionar_ativo(fundo.nome, serie)
+        for indice, inv in enumerate(investidores):
+            inv.vincular_historico(self.historico, indice)
+
+        # Médias móveis técnicas mantidas uma vez por janela distinta e por ativo
+        parametros_investidor = (
+            investidores[0].parametros if investidores else ParametrosInvestidor()
         )
+        self.servicos_medias_moveis = [
+            ServicoMediasMoveis(
+                serie,
+                parametros_investidor.tipo_media_movel,
+                parametros_investidor.media_movel,
+            )
+            for serie in self.historicos_precos
+        ]
+        if estado_restaurado is not None:
+            for servico, estado in zip(
+                self.servicos_medias_moveis, estado_restaurado["medias_moveis"]
+            ):
+                servico.restaurar_estado(estado)
+            self.livros_ordens = [
+                classe_livro.a_partir_de_estado(estado, investidores)
+                for estado in estado_restaurado["livros_ordens"]
+            ]
+            for livro in self.livros_ordens:
+                livro.modo = modo_livro
+        lfs = np.array([inv.LF for inv in investidores], dtype=float)
+        for servico in self.servicos_medias_moveis:
+            servico.registrar_janelas(lfs)
 
-    def executar_dia(self, parametros_sentimento):
-        self.dia_atual += 1
-        try:
-            self.news = self.midia.gerar_noticia()
-        except StopIteration:
-            self.news = 0
+        # Sorteios dos agentes por (finalidade, dia, agente): o resultado não
+        # depende do motor nem do número de processos
+        if semente is None:
+            semente = np.random.randint(0, 2**31 - 1)
+        self.fluxos = FluxosAleatorios(semente, len(investidores))
+        # Fundos do dia de cada agente no motor por agente: (dia, ativos)
+        self._foco_do_dia: tuple = (None, None)
+        if rede_social is None:
+            posicao = {inv.id: idx for idx, inv in enumerate(investidores)}
+            rede_social = RedeSocial.a_partir_de_listas(
+                [[posicao[viz.id] for viz in inv.vizinhos] for inv in investidores]
+            )
+        self.rede_social = rede_social
+
+        self.motor_sentimento = configuracao.motor_sentimento
+        self.populacao = None
+        self.fragmentos = None
+        self.executor: Optional[Executor] = None
+        self.calibrador: Optional[CalibradorExecutores] = None
+        self.backend_sentimento = self.motor_sentimento
+        num_processos = configuracao.num_processos_paralelos or (
+            os.cpu_count() // 2 or 2
+        )
+        if self.motor_sentimento in ("vetorizado", "fragmentado", "auto"):
+            self.populacao = PopulacaoInvestidores.a_partir_de_investidores(
+                investidores, rede=rede_social, fluxos=self.fluxos, ativos=self.ativos
+            )
+            self.populacao.servicos_medias_moveis = self.servicos_medias_moveis
+        if self.motor_sentimento in ("agentes", "auto"):
+            # Os pools só são criados quando usados; em "auto", o executor (e,
+            # no motor "auto", o próprio motor vetorizado) é escolhido medindo
+            # os primeiros dias
+            executores = (
+                EXECUTORES[1:]
+                if configuracao.executor == "auto"
+                else (configuracao.executor,)
+            )
+            if self.motor_sentimento == "auto":
+                executores = ("vetorizado",) + tuple(executores)
+            if len(executores) > 1:
+                self.calibrador = CalibradorExecutores(
+                    executores,
+                    num_processos,
+                    len(investidores),
+                    tamanho_lote=configuracao.tamanho_lote,
+                )
+            else:
+                self.executor = criar_executor(
+                    executores[0], num_processos, configuracao.tamanho_lote
+                )
+                self.backend_sentimento = self.executor.nome
+        elif self.motor_sentimento == "fragmentado":
+            self.fragmentos = ExecutorFragmentado(
+                self.populacao, self.historicos_precos, num_processos
+            )
+            self.fragmentos.instrumentacao = self.instrumentacao
+        elif self.motor_sentimento != "vetorizado":
+            raise ValueError(
+                f"Motor de sentimento desconhecido: {self.motor_sentimento!r}"
+            )
+
+        # Probabilidade de cada agente negociar em uma rodada
+        self.prob_negociar_rodada = (
+            np.array([inv.prob_negociar for inv in investidores], dtype=float)
+            / self.rodadas_por_dia
+        )
+        # Entre rodadas, só os agentes que negociaram voltam a ser lidos dos
+        # objetos para os arrays da população
+        self.posicao_investidor = None
+        if self.populacao is not None and self.rodadas_por_dia > 1:
+            self.posicao_investidor = {
+                inv.id: indice for indice, inv in enumerate(investidores)
+            }
+            for livro in self.livros_ordens:
+                livro.alterados = []
+
+    # Atalhos para o primeiro FII, o único em mercados de um só ativo
+    @property
+    def livro_ordens(self) -> LivroOrdens:
+        return self.livros_ordens[0]
+
+    @property
+    def medias_moveis(self) -> ServicoMediasMoveis:
+        return self.servicos_medias_moveis[0]
+
+    @property
+    def volatilidade_historica(self) -> float:
+        return float(self.volatilidades[0])
+
+    def _janela_precos(self, investidores: List[Investidor]) -> int:
+        """
+        Preços retidos por série com memória limitada: "janela_precos" ou, na
+        falta dele, a maior janela de média móvel da população mais um preço.
+        Uma "janela_precos" menor que isso falha aqui, antes do primeiro dia,
+        e não quando a série enche e as médias deixam de ser calculáveis.
+        """
+        parametros_investidor = (
+            investidores[0].parametros if investidores else ParametrosInvestidor()
+        )
+        omegas, _, _ = agrupar_janelas_media_movel(
+            [inv.LF for inv in investidores], parametros_investidor.media_movel
+        )
+        minima = max(omegas, default=1) + 1
+        janela = self.configuracao.janela_precos
+        if janela is None:
+            janela = minima
+        elif janela < minima:
+            raise ValueError(
+                f"'mercado.janela_precos' deve ser >= {minima} (a maior média "
+                f"móvel da população mais um preço); recebido {janela!r}"
+            )
+        return max(int(janela), 2)
+
+    def _montar_agenda(self) -> AgendaEventos:
+        """
+        Agenda com os calendários de dividendos e de reavaliação de cada fundo
+        (sem configuração própria, vale a frequência do mercado) e os eventos de
+        "mercado.eventos".
+        """
+        agenda = AgendaEventos()
+        calendarios = (
+            ("dividendos", "dividendos", self.freq_dividendos),
+            ("imoveis", "atualizacao_imoveis", self.freq_atu_imoveis),
+        )
+        for tipo, chave, frequencia_padrao in calendarios:
+            for indice, fundo in enumerate(self.fiis):
+                agenda.agendar_periodico(
+                    Evento(tipo, ativo=indice),
+                    fundo.params.get(f"{chave}_frequencia", frequencia_padrao),
+                    fundo.params.get(f"{chave}_defasagem", 0),
+                )
+        for configurado in self.configuracao.eventos:
+            ativo = None
+            if configurado.fii is not None:
+                if configurado.fii not in self.indice_ativo:
+                    raise ValueError(
+                        f"Evento '{configurado.tipo}' para um FII inexistente: "
+                        f"{configurado.fii!r}"
+                    )
+                ativo = self.indice_ativo[configurado.fii]
+            valores = configurado.juros
+            if configurado.tipo == "choque_noticia":
+                valores = (("valor", configurado.valor),)
+            evento = Evento(configurado.tipo, ativo=ativo, valores=valores)
+            if configurado.dia is not None:
+                agenda.agendar(evento, configurado.dia)
+            else:
+                agenda.agendar_periodico(
+                    evento, configurado.frequencia, configurado.defasagem
+                )
+        return agenda
 
-        if self.dia_atual % self.freq_dividendos == 0:
-            dividendo = self.fii.distribuir_dividendos()
-            for inv in self.investidores:
-                inv.caixa += inv.carteira.get("FII", 0) * dividendo
+    def precos_cota(self) -> np.ndarray:
+        return np.array([fundo.preco_cota for fundo in self.fiis])
 
-        if self.dia_atual % self.freq_atu_imoveis == 0:
-            self.fii.atualizar_imoveis_com_investimento(
-                self.banco_central.expectativa_inflacao
+    def atualizar_preco(self, ativo: str, preco: float) -> None:
+        self.fiis[self.indice_ativo[ativo]].preco_cota = preco
+
+    def _ativos_foco(self) -> np.ndarray:
+        """
+        FII que cada agente avalia e negocia no dia, sorteado com peso para os
+        fundos da carteira (`sortear_ativos_foco`) a partir das cotas e dos
+        fechamentos do início do dia.
+        """
+        if self.num_ativos == 1:
+            return np.zeros(len(self.investidores), dtype=np.int64)
+        precos = precos_fechamento(self.historicos_precos)
+        if self.populacao is not None:
+            return self.populacao.ativos_foco(self.dia_atual, precos)
+        dia_sorteado, ativos = self._foco_do_dia
+        if dia_sorteado != self.dia_atual:
+            ativos = sortear_ativos_foco(
+                self.fluxos.uniforme("ativo", self.dia_atual),
+                matriz_cotas(self.investidores, self.ativos),
+                precos,
+                self.investidores[0].parametros.peso_carteira_foco,
             )
+            self._foco_do_dia = (self.dia_atual, ativos)
+        return ativos
+
+    def _num_negocios(self) -> int:
+        return sum(livro.num_negocios for livro in self.livros_ordens)
 
-        mercado_snap = {
-            "volatilidade_historica": self.volatilidade_historica,
+    def estado(self) -> Dict[str, Any]:
+        """
+        Estado do mercado ao fim do dia corrente, para checkpoints: históricos,
+        livros de ordens, estimadores incrementais e a semente dos sorteios.
+        """
+        if self.fragmentos is not None:
+            medias_moveis = self.fragmentos.estado_medias_moveis()
+        else:
+            medias_moveis = [
+                servico.estado() for servico in self.servicos_medias_moveis
+            ]
+        return {
+            "dia_atual": self.dia_atual,
             "news": self.news,
-            "fii_dividendos_ultimo": self.fii.historico_dividendos[-1],
+            "volatilidades": self.volatilidades.copy(),
+            "semente": self.fluxos.semente,
+            "riqueza": self.historico.riqueza.riqueza.copy(),
+            "precos_total": [serie.total for serie in self.historicos_precos],
+            "decisoes_banco_central": dict(self.banco_central.decisoes),
+            "volatilidade": [
+                estimador.estado() for estimador in self.estimadores_volatilidade
+            ],
+            "medias_moveis": medias_moveis,
+            "livros_ordens": [
+                livro.estado(self.investidores) for livro in self.livros_ordens
+            ],
         }
+
+    def executar_dia(self, parametros_sentimento):
+        """
+        `parametros_sentimento` é um `ParametrosSentimento`; um dicionário é
+        validado e convertido aqui, uma vez por dia em vez de uma vez por agente.
+
+        O dia começa pela notícia e pelos eventos da agenda (choques, decisões
+        de juros, dividendos, reavaliações) e segue com "rodadas_por_dia" rodadas
+        de negociação, cada uma com ordens novas ao preço corrente e um leilão
+        (ou sessão contínua) próprio. O sentimento é calculado na primeira rodada
+        ou, com "sentimento_por_rodada", em todas; fechamento, riqueza e
+        volatilidade continuam diários.
+        """
+        parametros_sentimento = ParametrosSentimento.resolver(parametros_sentimento)
+        self.dia_atual += 1
+        instr = self.instrumentacao
+        instr.iniciar_dia(self.dia_atual)
+        if self.calibrador is not None:
+            self.backend_sentimento, self.executor = self.calibrador.proximo()
+        self.tempo_sentimento = 0.0
+
+        with instr.fase("noticia"):
+            try:
+                self.news = self.midia.gerar_noticia()
+            except StopIteration:
+                self.news = 0
+            self.banco_central.atualizar(self.dia_atual)
+        self._executar_eventos(self.agenda.eventos_do_dia(self.dia_atual))
+
+        with instr.fase("expiracao"):
+            for livro in self.livros_ordens:
+                livro.remover_expiradas(self.dia_atual)
+        dia_expiracao = self.dia_atual + self.validade_ordens - 1
+
+        for rodada in range(self.rodadas_por_dia):
+            self._executar_rodada(parametros_sentimento, rodada, dia_expiracao)
+        if self.calibrador is not None:
+            self.calibrador.registrar(self.tempo_sentimento)
+
+        with instr.fase("historico"):
+            for fundo, servico in zip(self.fiis, self.servicos_medias_moveis):
+                fundo.historico_precos.append(fundo.preco_cota)
+                # Uma série limitada descarta preços que as médias ainda subtraem
+                servico.atualizar()
+            self._registrar_riqueza()
+
+        with instr.fase("volatilidade"):
+            for indice, estimador in enumerate(self.estimadores_volatilidade):
+                estimador.adicionar_preco(self.fiis[indice].preco_cota)
+                volatilidade = estimador.volatilidade
+                if volatilidade is not None:
+                    self.volatilidades[indice] = volatilidade
+
+    def _executar_eventos(self, eventos: List[Evento]) -> None:
+        pagantes, atualizados = [], []
+        for evento in eventos:
+            if evento.tipo == "choque_noticia":
+                self.news = self.midia.aplicar_choque(dict(evento.valores)["valor"])
+            elif evento.tipo == "decisao_juros":
+                self.banco_central.decidir(**dict(evento.valores))
+            else:
+                destino = pagantes if evento.tipo == "dividendos" else atualizados
+                if evento.ativo is None:
+                    destino.extend(range(self.num_ativos))
+                else:
+                    destino.append(evento.ativo)
+
+        instr = self.instrumentacao
+        # Cada fundo paga e reavalia no máximo uma vez por dia, em ordem de ativo
+        if pagantes:
+            with instr.fase("dividendos"):
+                self._distribuir_dividendos(sorted(set(pagantes)))
+        if atualizados:
+            with instr.fase("imoveis"):
+                for indice in sorted(set(atualizados)):
+                    self.fiis[indice].atualizar_imoveis_com_investimento(
+                        self.banco_central.expectativa_inflacao
+                    )
+
+    def _executar_rodada(self, parametros_sentimento, rodada: int, dia_expiracao):
+        self.rodada_atual = rodada
+        for livro in self.livros_ordens:
+            livro.rodada_atual = rodada
+        if rodada == 0 and self.populacao is not None:
+            # Dividendos pagos no início do dia e os negócios da véspera alteram
+            # caixa e cotas, lidos no sorteio dos fundos do dia e nas ordens
+            self.populacao.sincronizar_carteiras(self.investidores)
+        if rodada == 0 or self.sentimento_por_rodada:
+            # Os objetos `Investidor` guardam um sentimento por dia, o da última
+            # rodada em que ele é calculado
+            registrar = not self.sentimento_por_rodada or (
+                rodada == self.rodadas_por_dia - 1
+            )
+            inicio = time.perf_counter()
+            if self.executor is None:
+                self._executar_sentimentos_vetorizado(
+                    parametros_sentimento, rodada, registrar
+                )
+            else:
+                self._executar_sentimentos_agentes(
+                    parametros_sentimento, rodada, registrar
+                )
+            self.tempo_sentimento += time.perf_counter() - inicio
+
+        if self.populacao is not None:
+            self._criar_ordens_vetorizado(parametros_sentimento, dia_expiracao, rodada)
+        else:
+            self._criar_ordens_agentes(parametros_sentimento, dia_expiracao, rodada)
+
+        instr = self.instrumentacao
+        negocios_antes = self._num_negocios()
+        with instr.fase("casamento"):
+            # Os livros não compartilham ordens; são casados um a um, em ordem de
+            # ativo, para que o resultado não dependa de escalonamento
+            for ativo, livro in zip(self.ativos, self.livros_ordens):
+                livro.executar_ordens(ativo, self)
+        instr.contar("negocios", self._num_negocios() - negocios_antes)
+        self.precos_rodadas[rodada] = [fundo.preco_cota for fundo in self.fiis]
+
+    def _distribuir_dividendos(self, pagantes: List[int]) -> None:
+        dividendos = np.array(
+            [self.fiis[indice].distribuir_dividendos() for indice in pagantes]
+        )
+        cotas = matriz_cotas(self.investidores, self.ativos)[:, pagantes]
+        for inv, valor in zip(self.investidores, (cotas @ dividendos).tolist()):
+            inv.caixa += valor
+
+    def _criar_ordens_agentes(self, parametros_sentimento, dia_expiracao, rodada=0):
+        instr = self.instrumentacao
+        with instr.fase("criacao_ordens"):
+            dia = self.dia_atual
+            negociam = np.flatnonzero(
+                self.fluxos.uniforme("negociar", dia, rodada=rodada)
+                < self.prob_negociar_rodada
+            ).tolist()
+            ativos = self._ativos_foco().tolist()
+            compras = self.fluxos.uniforme("quantidade_compra", dia, rodada=rodada)
+            vendas = self.fluxos.uniforme("quantidade_venda", dia, rodada=rodada)
+            compras, vendas = compras.tolist(), vendas.tolist()
+            # Todas as decisões usam o estado de abertura da rodada, como no
+            # motor vetorizado, mesmo que o livro contínuo case ordens na submissão
+            ordens_por_ativo: List[List[Any]] = [[] for _ in self.fiis]
+            for indice in negociam:
+                inv = self.investidores[indice]
+                ativo = ativos[indice]
+                ordem = inv.criar_ordem(
+                    self,
+                    parametros_sentimento,
+                    preco_esperado=inv.preco_esperado,
+                    sorteios=(compras[indice], vendas[indice]),
+                    indice_ativo=ativo,
+                )
+                if ordem:
+                    ordem.dia_expiracao = dia_expiracao
+                    ordens_por_ativo[ativo].append(ordem)
+
+        negocios_antes = self._num_negocios()
+        with instr.fase("submissao_ordens"):
+            for livro, ordens in zip(self.livros_ordens, ordens_por_ativo):
+                for ordem in ordens:
+                    livro.submeter_ordem(ordem, self)
+        instr.contar("ordens_submetidas", sum(map(len, ordens_por_ativo)))
+        instr.contar("negocios", self._num_negocios() - negocios_antes)
+
+    def _registrar_riqueza(self):
+        precos = self.precos_cota()
+        if self.populacao is not None:
+            self.populacao.registrar_riqueza(self.investidores, precos)
+            riqueza = self.populacao.riqueza_recente[:, -1]
+        else:
+            riqueza = riqueza_carteiras(
+                np.array([inv.caixa for inv in self.investidores], dtype=float),
+                matriz_cotas(self.investidores, self.ativos),
+                precos,
+            )
+        self.historico.riqueza.registrar(riqueza)
+        if self.fragmentos is not None:
+            self.fragmentos.registrar_riqueza(riqueza)
+
+    def _executar_sentimentos_agentes(
+        self, parametros_sentimento, rodada=0, registrar=True
+    ):
+        instr = self.instrumentacao
+        with instr.fase("snapshot"):
+            dados_investidores = self._montar_dados_investidores(
+                parametros_sentimento, rodada
+            )
+        if self.executor.nome == "processos" and instr.ativa:
+            instr.contar(
+                "bytes_ipc",
+                sum(
+                    len(pickle.dumps(dados, pickle.HIGHEST_PROTOCOL))
+                    for dados in dados_investidores
+                ),
+            )
+
+        with instr.fase("sentimento"):
+            resultados = self.executor.mapear(_processar_investidor, dados_investidores)
+
+        with instr.fase("mescla_resultados"):
+            investidores_dict = {inv.id: inv for inv in self.investidores}
+            for res in resultados:
+                if res and res["id"] in investidores_dict:
+                    inv = investidores_dict[res["id"]]
+                    inv.sentimento = res["sentimento"]
+                    if registrar:
+                        inv.historico_sentimentos.append(res["sentimento"])
+                    inv.RD = res["RD"]
+                    inv.preco_esperado = res["preco_esperado"]
+            if self.populacao is not None:
+                # No motor "auto", as ordens continuam vetorizadas
+                populacao = self.populacao
+                populacao.sentimento = np.array(
+                    [inv.sentimento for inv in self.investidores], dtype=float
+                )
+                populacao.RD = np.array([inv.RD for inv in self.investidores])
+                populacao.preco_esperado = np.array(
+                    [inv.preco_esperado for inv in self.investidores], dtype=float
+                )
+
+    def _montar_dados_investidores(
+        self, parametros_sentimento, rodada=0
+    ) -> List[Dict[str, Any]]:
+        # Um snapshot e uma série de preços por ativo, compartilhados pelos agentes
+        mercado_snaps = [
+            {
+                "volatilidade_historica": float(self.volatilidades[indice]),
+                "news": self.news,
+                "fii_dividendos_ultimo": fundo.historico_dividendos[-1],
+            }
+            for indice, fundo in enumerate(self.fiis)
+        ]
+        historicos_precos = [serie.tolist() for serie in self.historicos_precos]
         bc_snap = {
             "expectativa_inflacao": self.banco_central.expectativa_inflacao,
             "premio_risco": self.banco_central.premio_risco,
         }
 
-        dados_investidores = [
+        dia = self.dia_atual
+        params_investidor = (
+            self.investidores[0].parametros
+            if self.investidores
+            else ParametrosInvestidor()
+        )
+        ruido_privada = self.fluxos.normal(
+            "ruido_privada", dia, params_investidor.ruido_std_privada, rodada=rodada
+        ).tolist()
+        ruido_preco = self.fluxos.normal(
+            "ruido_preco_esperado",
+            dia,
+            params_investidor.ruido_std_preco_esperado,
+            rodada=rodada,
+        ).tolist()
+        # Depois da primeira rodada, o retorno é medido contra o preço corrente
+        precos_atuais = self.precos_cota().tolist() if rodada else None
+        influencia_social = self.rede_social.influencia_social(
+            np.array([inv.sentimento for inv in self.investidores], dtype=float)
+        ).tolist()
+        ativos = self._ativos_foco().tolist()
+
+        return [
             {
                 "id": inv.id,
                 "literacia_financeira": inv.LF,
                 "sentimento": inv.sentimento,
-                "historico_precos": inv.historico_precos.tolist(),
+                "historico_precos": historicos_precos[ativo],
                 "historico_riqueza": inv.historico_riqueza.tolist(),
-                "vizinhos_sentimentos": [viz.sentimento for viz in inv.vizinhos],
-                "mercado_snapshot": mercado_snap,
+                "influencia_social": influencia_social[indice],
+                "ruido_privada": ruido_privada[indice],
+                "ruido_preco_esperado": ruido_preco[indice],
+                "medias_moveis": (
+                    None
+                    if self.implementacao_referencia
+                    else self.servicos_medias_moveis[ativo].medias_para_lf(inv.LF)
+                ),
+                "mercado_snapshot": mercado_snaps[ativo],
                 "banco_central_snapshot": bc_snap,
                 "parametros_sentimento": parametros_sentimento,
                 "parametros_investidor": inv.parametros,
+                "preco_atual": None if precos_atuais is None else precos_atuais[ativo],
             }
-            for inv in self.investidores
+            for indice, (inv, ativo) in enumerate(zip(self.investidores, ativos))
         ]
 
-        resultados = self.pool.map(_processar_investidor, dados_investidores)
-        investidores_dict = {inv.id: inv for inv in self.investidores}
-        for res in resultados:
-            if res and res["id"] in investidores_dict:
-                inv = investidores_dict[res["id"]]
-                inv.sentimento = res["sentimento"]
-                inv.historico_sentimentos.append(res["sentimento"])
-                inv.RD = res["RD"]
-
-        self.livro_ordens = LivroOrdens()
-        for inv in self.investidores:
-            if random.random() < inv.prob_negociar:
-                ordem = inv.criar_ordem(self, parametros_sentimento)
-                if ordem:
-                    self.livro_ordens.adicionar_ordem(ordem)
+    def _executar_sentimentos_vetorizado(
+        self, parametros_sentimento, rodada=0, registrar=True
+    ):
+        instr = self.instrumentacao
+        motor = self.fragmentos if self.fragmentos is not None else self.populacao
+        if self.num_ativos == 1:
+            historico_precos = self.fii.historico_precos
+            dividendos = self.fii.historico_dividendos[-1]
+            volatilidade = self.volatilidade_historica
+        else:
+            historico_precos = self.historicos_precos
+            dividendos = np.array(
+                [fundo.historico_dividendos[-1] for fundo in self.fiis]
+            )
+            volatilidade = self.volatilidades.copy()
+        with instr.fase("sentimento"):
+            motor.calcular_sentimentos(
+                historico_precos=historico_precos,
+                dividendos=dividendos,
+                expectativa_inflacao=self.banco_central.expectativa_inflacao,
+                premio_risco=self.banco_central.premio_risco,
+                news=self.news,
+                volatilidade=volatilidade,
+                parametros_sentimento=parametros_sentimento,
+                dia=self.dia_atual,
+                rodada=rodada,
+                precos_atuais=self.precos_cota() if rodada else None,
+            )
+        if registrar:
+            with instr.fase("mescla_resultados"):
+                self.populacao.aplicar_em_investidores(self.investidores)
+
+    def _criar_ordens_vetorizado(self, parametros_ordem, dia_expiracao, rodada=0):
+        instr = self.instrumentacao
+        with instr.fase("criacao_ordens"):
+            self._sincronizar_alterados(completo=rodada == 0)
+            indices, ativos, compra, precos_limite, quantidades = (
+                self.populacao.gerar_ordens(
+                    self.precos_cota(),
+                    parametros_ordem,
+                    dia=self.dia_atual,
+                    rodada=rodada,
+                    rodadas_por_dia=self.rodadas_por_dia,
+                )
+            )
 
-        self.livro_ordens.executar_ordens("FII", self)
+        negocios_antes = self._num_negocios()
+        with instr.fase("submissao_ordens"):
+            for ativo, grupo in enumerate(agrupar_por_ativo(ativos, self.num_ativos)):
+                if len(grupo) == 0:
+                    continue
+                self.livros_ordens[ativo].submeter_lote(
+                    self.ativos[ativo],
+                    [self.investidores[i] for i in indices[grupo].tolist()],
+                    compra[grupo],
+                    precos_limite[grupo],
+                    quantidades[grupo],
+                    self,
+                    dia_expiracao=dia_expiracao,
+                )
+        instr.contar("ordens_submetidas", len(indices))
+        instr.contar("negocios", self._num_negocios() - negocios_antes)
+
+    def _sincronizar_alterados(self, completo: bool) -> None:
+        """
+        Atualiza na população caixa e cotas dos agentes que negociaram desde a
+        rodada anterior; depois de uma sincronização completa, apenas descarta
+        o registro.
+        """
+        if self.posicao_investidor is None:
+            return
+        alterados = []
+        for livro in self.livros_ordens:
+            alterados += livro.alterados
+            livro.alterados = []
+        if completo or not alterados:
+            return
+        posicao = self.posicao_investidor
+        self.populacao.sincronizar_agentes(
+            self.investidores, np.unique([posicao[id_] for id_ in alterados])
+        )
 
-        self.fii.historico_precos.append(self.fii.preco_cota)
-        for inv in self.investidores:
-            inv.atualizar_historico(self.fii.preco_cota)
+    def fechar(self) -> None:
+        """
+        Encerra os processos e threads do passo de sentimento; é chamado ao sair
+        de um bloco `with` e pode ser repetido. Os pools dos executores são
+        recriados se o mercado voltar a ser usado; os fragmentos, não.
+        """
+        if self.fragmentos is not None:
+            self.fragmentos.fechar()
+            self.fragmentos = None
+        if self.calibrador is not None:
+            self.calibrador.fechar()
+        elif self.executor is not None:
+            self.executor.fechar()
 
-        if len(self.fii.historico_precos) > 1:
-            precos = np.array(self.fii.historico_precos)
-            precos_validos = precos[precos > 0]
-            if len(precos_validos) > 1:
-                retornos = np.diff(np.log(precos_validos))
-                self.volatilidade_historica = np.std(retornos) * (252**0.5)
+    def __enter__(self) -> "Mercado":
+        return self
 
-    def fechar_pool(self):
-        self.pool.close()
-        self.pool.join()
+    def __exit__(self, *excecao) -> None:
+        self.fechar()
@@ -0,0 +1,307 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .configuracao import carregar_parametros
+
+# Linhas da matriz do cenário, na ordem em que são gravadas em disco
+CAMPOS = ("news", "expectativa_inflacao", "taxa_selic", "premio_risco")
+_PADROES_BANCO_CENTRAL = {
+    "expectativa_inflacao": 0.07,
+    "taxa_selic": 0.15,
+    "premio_risco": 0.08,
+}
+LIMITE_NOTICIAS = 3.0
+
+
+class Cenario:
+    """
+    Trajetórias diárias exógenas da simulação (notícias, expectativa de inflação,
+    Selic e prêmio de risco) em uma única matriz campos × dias.
+
+    A coluna d guarda os valores do dia d; a coluna 0 é o estado inicial. A
+    matriz pode vir de um arquivo .npy aberto com `mmap_mode="r"`, caso em que
+    processos que usam o mesmo cenário compartilham as páginas do arquivo em vez
+    de gerar ou copiar as trajetórias.
+    """
+
+    def __init__(self, dados: np.ndarray):
+        if dados.ndim != 2 or dados.shape[0] != len(CAMPOS):
+            raise ValueError(
+                f"Cenário deve ter forma ({len(CAMPOS)}, dias); recebido {dados.shape}"
+            )
+        self.dados = dados
+
+    @property
+    def num_dias(self) -> int:
+        return self.dados.shape[1] - 1
+
+    @property
+    def news(self) -> np.ndarray:
+        return self.dados[0]
+
+    @property
+    def expectativa_inflacao(self) -> np.ndarray:
+        return self.dados[1]
+
+    @property
+    def taxa_selic(self) -> np.ndarray:
+        return self.dados[2]
+
+    @property
+    def premio_risco(self) -> np.ndarray:
+        return self.dados[3]
+
+    @classmethod
+    def gerar(
+        cls,
+        num_dias: int,
+        parametros_midia: dict,
+        parametros_banco_central: dict,
+        semente: Optional[int] = None,
+        regimes: Iterable[dict] = (),
+    ) -> "Cenario":
+        """
+        Gera todas as trajetórias de uma vez.
+
+        As variáveis do banco central partem dos valores de `parametros_banco_central`
+        e mudam nos dias dos `regimes`; as notícias seguem o passeio aleatório
+        limitado a [-3, 3] da `Midia`, com os choques sorteados em um único vetor
+        por um gerador próprio (independente do gerador global) e os valores de
+        `valores_fixos` impostos nos seus dias. Cada regime é um dicionário com
+        "dia", os novos valores de qualquer campo do banco central ou "sigma" das
+        notícias e, opcionalmente, "transicao_dias" para uma mudança linear em vez
+        de um degrau.
+        """
+        regimes = sorted(regimes, key=lambda regime: regime["dia"])
+        tamanho = num_dias + 1
+        dados = np.empty((len(CAMPOS), tamanho))
+        for linha, campo in enumerate(CAMPOS[1:], start=1):
+            dados[linha] = _trajetoria_regimes(
+                parametros_banco_central.get(campo, _PADROES_BANCO_CENTRAL[campo]),
+                regimes,
+                campo,
+                tamanho,
+            )
+
+        sigmas = _trajetoria_regimes(
+            parametros_midia.get("sigma", 0.1), regimes, "sigma", tamanho
+        )
+        choques = np.random.default_rng(semente).standard_normal(tamanho) * sigmas
+        fixos = {
+            int(dia): valor
+            for dia, valor in parametros_midia.get("valores_fixos", {}).items()
+        }
+        dados[0] = _passeio_noticias(
+            parametros_midia.get("valor_inicial", 0), choques, fixos
+        )
+        return cls(dados)
+
+    def salvar(self, caminho: str, assinatura: Optional[str] = None) -> None:
+        """
+        Grava a matriz em .npy de forma atômica, para que execuções paralelas
+        que geram o mesmo cenário não leiam um arquivo pela metade. Com
+        `assinatura` (de `assinatura_cenario`), grava também, antes da matriz,
+        o arquivo "<caminho>.json" que identifica os parâmetros de geração.
+        """
+        pasta = os.path.dirname(caminho) or "."
+        os.makedirs(pasta, exist_ok=True)
+        if assinatura is not None:
+            descritor, temporario = tempfile.mkstemp(dir=pasta, suffix=".json.tmp")
+            with os.fdopen(descritor, "w", encoding="utf-8") as f:
+                json.dump({"assinatura": assinatura}, f)
+            os.replace(temporario, _caminho_assinatura(caminho))
+        descritor, temporario = tempfile.mkstemp(dir=pasta, suffix=".npy.tmp")
+        try:
+            with os.fdopen(descritor, "wb") as f:
+                np.save(f, np.ascontiguousarray(self.dados, dtype=np.float64))
+            os.replace(temporario, caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    @classmethod
+    def carregar(cls, caminho: str, mapear: bool = True) -> "Cenario":
+        return cls(np.load(caminho, mmap_mode="r" if mapear else None))
+
+
+def _caminho_assinatura(caminho: str) -> str:
+    return caminho + ".json"
+
+
+def ler_assinatura(caminho: str) -> Optional[str]:
+    """
+    Assinatura gravada junto ao cenário em `caminho`, ou None se não houver.
+    """
+    try:
+        with open(_caminho_assinatura(caminho), "r", encoding="utf-8") as f:
+            return json.load(f).get("assinatura")
+    except FileNotFoundError:
+        return None
+
+
+def _trajetoria_regimes(
+    base: float, regimes: List[dict], campo: str, tamanho: int
+) -> np.ndarray:
+    valores = np.full(tamanho, float(base))
+    for regime in regimes:
+        if campo not in regime:
+            continue
+        inicio = int(regime["dia"])
+        if inicio >= tamanho:
+            continue
+        anterior = valores[max(inicio - 1, 0)]
+        alvo = float(regime[campo])
+        valores[inicio:] = alvo
+        transicao = int(regime.get("transicao_dias", 0))
+        if transicao > 0:
+            fim = min(inicio + transicao, tamanho)
+            fracoes = np.arange(1, fim - inicio + 1) / transicao
+            valores[inicio:fim] = anterior + (alvo - anterior) * fracoes
+    return valores
+
+
+def _passeio_noticias(
+    valor_inicial: float, choques: np.ndarray, fixos: Dict[int, float]
+) -> np.ndarray:
+    # O limite torna o passeio dependente do caminho, então o acúmulo é
+    # sequencial; os choques já vêm sorteados em um único vetor
+    noticias = np.empty(len(choques))
+    valor = float(valor_inicial)
+    noticias[0] = valor
+    for dia, choque in enumerate(choques[1:].tolist(), start=1):
+        if dia in fixos:
+            valor = float(fixos[dia])
+        else:
+            valor = min(max(valor + choque, -LIMITE_NOTICIAS), LIMITE_NOTICIAS)
+        noticias[dia] = valor
+    return noticias
+
+
+def _semente_cenario(sim_params: dict, semente: Optional[int]) -> int:
+    if semente is None:
+        semente = sim_params.get("cenario", {}).get("semente")
+    if semente is None:
+        semente = sim_params["geral"].get("random_seed", 42)
+    return semente
+
+
+def gerar_cenario(sim_params: dict, semente: Optional[int] = None) -> Cenario:
+    """
+    Gera o cenário da seção "cenario" (regimes e semente) para os dias da
+    simulação. Sem `semente`, usa a da seção ou, na falta dela, a da rodada.
+    """
+    return Cenario.gerar(
+        sim_params["geral"]["num_dias"],
+        sim_params["midia"],
+        sim_params["banco_central"],
+        semente=_semente_cenario(sim_params, semente),
+        regimes=sim_params.get("cenario", {}).get("regimes", []),
+    )
+
+
+def assinatura_cenario(sim_params: dict, semente: Optional[int] = None) -> str:
+    """
+    Hash dos parâmetros que determinam o cenário de `gerar_cenario`: notícias
+    da mídia, valores do banco central, regimes e semente. O número de dias
+    fica de fora, porque um cenário mais longo começa igual a um mais curto.
+    """
+    midia = sim_params["midia"]
+    banco_central = sim_params["banco_central"]
+    conteudo = json.dumps(
+        {
+            "midia": {
+                "sigma": midia.get("sigma", 0.1),
+                "valor_inicial": midia.get("valor_inicial", 0),
+                "valores_fixos": midia.get("valores_fixos", {}),
+            },
+            "banco_central": {
+                campo: banco_central.get(campo, padrao)
+                for campo, padrao in _PADROES_BANCO_CENTRAL.items()
+            },
+            "regimes": sim_params.get("cenario", {}).get("regimes", []),
+            "semente": _semente_cenario(sim_params, semente),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def sobrescritas_cenario_compartilhado(sim_params: dict) -> Dict[str, Any]:
+    """
+    Sobrescritas que fazem todas as replicações de um conjunto usarem o cenário
+    em "arquivo": sem "semente", a do cenário viria da semente de cada
+    replicação, e cada uma pediria um cenário diferente do gravado. A semente
+    resolvida aqui, antes das sobrescritas das replicações, é fixada em
+    "cenario.semente". Sem cenário ativo em arquivo, não há o que fixar.
+    """
+    cenario_cfg = sim_params.get("cenario", {})
+    if not cenario_cfg.get("ativo", False) or not cenario_cfg.get("arquivo"):
+        return {}
+    return {"cenario.semente": _semente_cenario(sim_params, None)}
+
+
+def cenario_da_configuracao(sim_params: dict) -> Optional[Cenario]:
+    """
+    Cenário pré-calculado descrito pela seção "cenario", ou None quando
+    desativado (a `Midia` então sorteia as notícias dia a dia).
+
+    Com "arquivo", o cenário é lido do disco em modo mapeado; se o arquivo não
+    existir, é gerado e gravado primeiro. Um arquivo gerado com outros
+    parâmetros (mídia, banco central, regimes ou semente) levanta `ValueError`
+    em vez de ser reaproveitado. Conjuntos e varreduras compartilham o arquivo
+    fixando a semente com `sobrescritas_cenario_compartilhado`; sem arquivo,
+    as replicações só compartilham um cenário se "semente" estiver fixada.
+    """
+    cenario_cfg = sim_params.get("cenario", {})
+    if not cenario_cfg.get("ativo", False):
+        return None
+    num_dias = sim_params["geral"]["num_dias"]
+    caminho = cenario_cfg.get("arquivo")
+    assinatura = assinatura_cenario(sim_params)
+    if caminho and os.path.exists(caminho):
+        if ler_assinatura(caminho) != assinatura:
+            raise ValueError(
+                f"Cenário em {caminho} foi gerado com outros parâmetros de mídia, "
+                "banco central, regimes ou semente; remova o arquivo ou indique "
+                "outro 'cenario.arquivo'."
+            )
+        cenario = Cenario.carregar(caminho)
+        if cenario.num_dias < num_dias:
+            raise ValueError(
+                f"Cenário em {caminho} cobre {cenario.num_dias} dias; "
+                f"a simulação precisa de {num_dias}."
+            )
+        return cenario
+
+    cenario = gerar_cenario(sim_params)
+    if not caminho:
+        return cenario
+    cenario.salvar(caminho, assinatura)
+    return Cenario.carregar(caminho)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Gera um cenário exógeno pré-calculado e o grava em .npy."
+    )
+    parser.add_argument("--config", default="config/parametros.json")
+    parser.add_argument("--saida", required=True)
+    parser.add_argument("--semente", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    sim_params = carregar_parametros(args.config)
+    cenario = gerar_cenario(sim_params, semente=args.semente)
+    cenario.salvar(args.saida, assinatura_cenario(sim_params, semente=args.semente))
+    print(f"Cenário de {cenario.num_dias} dias gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
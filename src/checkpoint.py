@@ -0,0 +1,220 @@
+import glob
+import os
+import pickle
+import random
+import tempfile
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from .instrumentos_financeiros import FII, CarteiraImoveis
+from .agentes_economicos import Investidor
+from .ambiente_de_mercado import Mercado
+from .cenarios import cenario_da_configuracao
+from .configuracao import compilar_parametros
+from .fatores_de_ambiente import BancoCentral, Midia
+from .populacao import matriz_cotas
+from .rede_social import RedeSocial
+
+VERSAO_CHECKPOINT = 3
+_PADRAO_ARQUIVO = "checkpoint_dia_{dia:06d}.pkl"
+
+
+def capturar_checkpoint(
+    mercado: Mercado, dia: int, sentimento_medio_diario: List[float]
+) -> Dict[str, Any]:
+    """
+    Reúne o estado completo da simulação ao fim de `dia`: arrays dos agentes,
+    rede, FIIs, mídia, mercado (históricos, livros de ordens, estimadores) e os
+    estados dos geradores aleatórios globais.
+    """
+    investidores = mercado.investidores
+    midia = mercado.midia
+    rede = mercado.rede_social
+    tipo_indice = np.int32 if len(investidores) < 2**31 else np.int64
+    return {
+        "versao": VERSAO_CHECKPOINT,
+        "dia": dia,
+        "investidores": {
+            "lf": np.array([inv.LF for inv in investidores]),
+            "caixa": np.array([inv.caixa for inv in investidores]),
+            "cotas": matriz_cotas(investidores, mercado.ativos),
+            "sentimento": np.array([inv.sentimento for inv in investidores]),
+            "RD": np.array([inv.RD for inv in investidores]),
+            "preco_esperado": np.array(
+                [
+                    np.nan if inv.preco_esperado is None else inv.preco_esperado
+                    for inv in investidores
+                ]
+            ),
+            "historico_sentimentos": np.array(
+                [inv.historico_sentimentos for inv in investidores], dtype=float
+            ),
+        },
+        "rede": {
+            "indptr": rede.indptr,
+            "indices": rede.indices.astype(tipo_indice),
+        },
+        "fiis": [
+            {
+                "nome": fii.nome,
+                "params": fii.params,
+                "num_cotas": fii.num_cotas,
+                "caixa": fii.caixa,
+                "preco_cota": fii.preco_cota,
+                "historico_precos": np.array(fii.historico_precos, dtype=float),
+                "historico_dividendos": list(fii.historico_dividendos),
+                "imoveis": fii.carteira_imoveis.estado(),
+            }
+            for fii in mercado.fiis
+        ],
+        "midia": {
+            "dia_atual": midia.dia_atual,
+            "valor_atual": midia.valor_atual,
+            "historico_valores": list(midia.historico_valores),
+        },
+        "mercado": mercado.estado(),
+        "rng": {"numpy": np.random.get_state(), "python": random.getstate()},
+        "sentimento_medio_diario": list(sentimento_medio_diario),
+    }
+
+
+def restaurar_simulacao(
+    checkpoint: Dict[str, Any], sim_params: dict
+) -> Tuple[Mercado, int, List[float]]:
+    """
+    Reconstrói o mercado a partir de um checkpoint. Parâmetros de configuração
+    (coeficientes, motor, processos, número de dias) vêm de `sim_params`, o que
+    permite derivar variantes de cenário a partir de um mesmo aquecimento; o
+    estado dinâmico e a composição do universo de FIIs vêm do checkpoint.
+
+    Devolve (mercado, último dia simulado, sentimento médio diário até ele).
+    """
+    if checkpoint.get("versao") != VERSAO_CHECKPOINT:
+        raise ValueError(
+            f"Versão de checkpoint não suportada: {checkpoint.get('versao')!r}"
+        )
+    parametros_investidor = compilar_parametros(sim_params).investidor
+
+    # Um FII único usa os parâmetros atuais de "fii"; fundos de um universo
+    # guardam os próprios parâmetros (calendários, taxas) no checkpoint
+    estados_fiis = checkpoint["fiis"]
+    fiis = []
+    for estado_fii in estados_fiis:
+        fii = FII(
+            num_cotas=estado_fii["num_cotas"],
+            caixa=estado_fii["caixa"],
+            params=(
+                sim_params["fii"] if len(estados_fiis) == 1 else estado_fii["params"]
+            ),
+            nome=estado_fii["nome"],
+        )
+        fii.carteira_imoveis = CarteiraImoveis.a_partir_de_estado(estado_fii["imoveis"])
+        fii.preco_cota = estado_fii["preco_cota"]
+        fii.historico_precos = estado_fii["historico_precos"].tolist()
+        fii.historico_dividendos = list(estado_fii["historico_dividendos"])
+        fiis.append(fii)
+    ativos = [fii.nome for fii in fiis]
+
+    estado_inv = checkpoint["investidores"]
+    investidores = []
+    for i, (lf, caixa, cotas) in enumerate(
+        zip(
+            estado_inv["lf"].tolist(),
+            estado_inv["caixa"].tolist(),
+            estado_inv["cotas"].tolist(),
+        )
+    ):
+        investidor = Investidor(
+            id_investidor=i,
+            lf=lf,
+            caixa=caixa,
+            cotas=cotas[0],
+            historico_precos=[],
+            parametros=parametros_investidor,
+            ativo=ativos[0],
+        )
+        for ativo, quantidade in zip(ativos[1:], cotas[1:]):
+            if quantidade:
+                investidor.carteira[ativo] = quantidade
+        investidores.append(investidor)
+    for inv, sentimento, rd, preco_esperado, historico in zip(
+        investidores,
+        estado_inv["sentimento"].tolist(),
+        estado_inv["RD"].tolist(),
+        estado_inv["preco_esperado"].tolist(),
+        estado_inv["historico_sentimentos"].tolist(),
+    ):
+        inv.sentimento = sentimento
+        inv.RD = rd
+        inv.preco_esperado = None if np.isnan(preco_esperado) else preco_esperado
+        inv.historico_sentimentos = historico
+
+    rede = RedeSocial(checkpoint["rede"]["indptr"], checkpoint["rede"]["indices"])
+
+    cenario = cenario_da_configuracao(sim_params)
+    midia = Midia(
+        {**sim_params["midia"], "num_dias": sim_params["geral"]["num_dias"]}, cenario
+    )
+    midia.dia_atual = checkpoint["midia"]["dia_atual"]
+    midia.valor_atual = checkpoint["midia"]["valor_atual"]
+    midia.historico_valores = list(checkpoint["midia"]["historico_valores"])
+
+    banco_central = BancoCentral(sim_params["banco_central"], cenario)
+    banco_central.atualizar(checkpoint["dia"])
+    mercado = Mercado(
+        investidores,
+        fiis,
+        banco_central,
+        midia,
+        sim_params["mercado"],
+        rede_social=rede,
+        estado_restaurado=checkpoint["mercado"],
+    )
+
+    np.random.set_state(checkpoint["rng"]["numpy"])
+    random.setstate(checkpoint["rng"]["python"])
+    return mercado, checkpoint["dia"], list(checkpoint["sentimento_medio_diario"])
+
+
+def salvar_checkpoint(
+    checkpoint: Dict[str, Any], diretorio: str, manter: Optional[int] = None
+) -> str:
+    """
+    Grava o checkpoint de forma atômica (arquivo temporário + rename) e, com
+    `manter`, remove os checkpoints mais antigos além desse número.
+    """
+    if manter is not None and manter < 1:
+        raise ValueError(f"'manter' deve ser >= 1; recebido {manter!r}")
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, _PADRAO_ARQUIVO.format(dia=checkpoint["dia"]))
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix=".pkl.tmp")
+    try:
+        with os.fdopen(descritor, "wb") as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+    if manter is not None:
+        checkpoints = listar_checkpoints(diretorio)
+        for antigo in checkpoints[: len(checkpoints) - manter]:
+            os.remove(antigo)
+    return caminho
+
+
+def listar_checkpoints(diretorio: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(diretorio, "checkpoint_dia_*.pkl")))
+
+
+def checkpoint_mais_recente(diretorio: str) -> Optional[str]:
+    checkpoints = listar_checkpoints(diretorio)
+    return checkpoints[-1] if checkpoints else None
+
+
+def carregar_checkpoint(caminho: str) -> Dict[str, Any]:
+    with open(caminho, "rb") as f:
+        return pickle.load(f)
@@ -1,7 +1,10 @@
 # src/market_components.py
 
+import heapq
+import itertools
+import numpy as np
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Dict, List
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
 
 if TYPE_CHECKING:
     from .agentes_economicos import Agente
@@ -15,6 +18,11 @@ class Ordem:
     ativo: str
     preco_limite: float
     quantidade: int
+    dia_expiracao: Optional[int] = None
+    id: int = -1
+    dia_entrada: int = 0
+    ativa: bool = True
+    rodada_entrada: int = 0
 
 
 @dataclass
@@ -30,69 +38,486 @@ class Transacao:
         self.comprador.caixa -= valor_total
         self.vendedor.caixa += valor_total
 
-        self.comprador.carteira[self.ativo] += self.quantidade
+        carteira_comprador = self.comprador.carteira
+        carteira_comprador[self.ativo] = (
+            carteira_comprador.get(self.ativo, 0) + self.quantidade
+        )
         self.vendedor.carteira[self.ativo] -= self.quantidade
 
 
 class LivroOrdens:
     """
-    Livro de ordens (Order Book) para armazenar e executar ordens de compra e venda.
+    Livro de ordens (Order Book) com prioridade preço-tempo.
+
+    Cada lado de cada ativo é um heap, de modo que inserir e casar uma ordem custa
+    O(log n). Ordens canceladas ou expiradas são removidas de forma preguiçosa e o
+    heap é compactado quando acumula muitas entradas inativas.
+
+    Modos:
+      - "leilao": as ordens do dia são acumuladas e casadas em `executar_ordens`,
+        ao preço médio entre compra e venda (leilão de chamada);
+      - "continuo": `submeter_ordem` casa cada ordem assim que ela chega, ao preço
+        da ordem em repouso no livro.
+    Ordens com `dia_expiracao` permanecem no livro entre dias até expirarem.
+    Com várias rodadas por dia, `rodada_atual` marca a rodada corrente e as
+    ordens de rodadas anteriores são tratadas como as de dias anteriores.
     """
 
-    def __init__(self) -> None:
-        self.ordens_compra: Dict[str, List[Ordem]] = {}
-        self.ordens_venda: Dict[str, List[Ordem]] = {}
+    MODOS = ("leilao", "continuo")
+
+    def __init__(self, modo: str = "leilao") -> None:
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de livro de ordens desconhecido: {modo!r}")
+        self.modo = modo
+        # Entradas: (chave de preço, sequência, ordem); compras usam -preço
+        self._compras: Dict[str, List[Tuple[float, int, Ordem]]] = {}
+        self._vendas: Dict[str, List[Tuple[float, int, Ordem]]] = {}
+        self._inativas: Dict[Tuple[str, str], int] = {}
+        # Ordens agrupadas por dia de expiração e heap com os dias distintos
+        self._expiracoes: Dict[int, List[Ordem]] = {}
+        self._dias_expiracao: List[int] = []
+        self._ordens: Dict[int, Ordem] = {}
+        self._sequencia = itertools.count()
+        self.dia_atual = 0
+        self.rodada_atual = 0
+        # Contadores acumulados de negócios e cotas negociadas
+        self.num_negocios = 0
+        self.cotas_negociadas = 0
+        # Fita de negócios (comprador, vendedor, quantidade, preço), mantida
+        # apenas quando alguém a consome e esvazia; None desativa o registro
+        self.fita: Optional[List[Tuple[int, int, int, float]]] = None
+        # Ids dos agentes cujo caixa ou carteira mudou, mantidos apenas quando
+        # alguém os consome (como a fita); None desativa o registro
+        self.alterados: Optional[List[int]] = None
+
+    @property
+    def ordens_compra(self) -> Dict[str, List[Ordem]]:
+        return {
+            ativo: self._ordens_ativas(heap) for ativo, heap in self._compras.items()
+        }
+
+    @property
+    def ordens_venda(self) -> Dict[str, List[Ordem]]:
+        return {
+            ativo: self._ordens_ativas(heap) for ativo, heap in self._vendas.items()
+        }
+
+    def estado(self, agentes: Sequence["Agente"]) -> Dict[str, object]:
+        """
+        Estado serializável do livro, com os agentes referenciados pela posição
+        em `agentes`. Inclui as entradas inativas ainda nos heaps, de modo que a
+        restauração reproduz exatamente as compactações futuras.
+        """
+        posicao_agente = {id(agente): i for i, agente in enumerate(agentes)}
+        numero_ordem: Dict[int, int] = {}
+        ordens = []
+
+        def numerar(ordem: Ordem) -> int:
+            if id(ordem) not in numero_ordem:
+                numero_ordem[id(ordem)] = len(ordens)
+                ordens.append(
+                    (
+                        ordem.tipo,
+                        posicao_agente[id(ordem.agente)],
+                        ordem.ativo,
+                        ordem.preco_limite,
+                        ordem.quantidade,
+                        ordem.dia_expiracao,
+                        ordem.id,
+                        ordem.dia_entrada,
+                        ordem.ativa,
+                    )
+                )
+            return numero_ordem[id(ordem)]
+
+        def heaps(lado) -> Dict[str, list]:
+            return {
+                ativo: [(chave, seq, numerar(ordem)) for chave, seq, ordem in heap]
+                for ativo, heap in lado.items()
+            }
+
+        proxima_sequencia = next(self._sequencia)
+        self._sequencia = itertools.count(proxima_sequencia)
+        return {
+            "modo": self.modo,
+            "compras": heaps(self._compras),
+            "vendas": heaps(self._vendas),
+            "expiracoes": {
+                dia: [numerar(ordem) for ordem in lista]
+                for dia, lista in self._expiracoes.items()
+            },
+            "ordens_ativas": [numerar(ordem) for ordem in self._ordens.values()],
+            "ordens": ordens,
+            "inativas": dict(self._inativas),
+            "dias_expiracao": list(self._dias_expiracao),
+            "proxima_sequencia": proxima_sequencia,
+            "dia_atual": self.dia_atual,
+            "num_negocios": self.num_negocios,
+            "cotas_negociadas": self.cotas_negociadas,
+        }
+
+    @classmethod
+    def a_partir_de_estado(
+        cls, estado: Dict[str, object], agentes: Sequence["Agente"]
+    ) -> "LivroOrdens":
+        livro = cls(modo=estado["modo"])
+        ordens = []
+        for tipo, agente, ativo, preco, qtd, expiracao, id_, entrada, ativa in estado[
+            "ordens"
+        ]:
+            ordens.append(
+                Ordem(
+                    tipo,
+                    agentes[agente],
+                    ativo,
+                    preco,
+                    qtd,
+                    expiracao,
+                    id_,
+                    entrada,
+                    ativa,
+                )
+            )
+        livro._compras = {
+            ativo: [(chave, seq, ordens[num]) for chave, seq, num in heap]
+            for ativo, heap in estado["compras"].items()
+        }
+        livro._vendas = {
+            ativo: [(chave, seq, ordens[num]) for chave, seq, num in heap]
+            for ativo, heap in estado["vendas"].items()
+        }
+        livro._expiracoes = {
+            dia: [ordens[num] for num in lista]
+            for dia, lista in estado["expiracoes"].items()
+        }
+        livro._ordens = {ordens[num].id: ordens[num] for num in estado["ordens_ativas"]}
+        livro._inativas = dict(estado["inativas"])
+        livro._dias_expiracao = list(estado["dias_expiracao"])
+        livro._sequencia = itertools.count(estado["proxima_sequencia"])
+        livro.dia_atual = estado["dia_atual"]
+        livro.num_negocios = estado["num_negocios"]
+        livro.cotas_negociadas = estado["cotas_negociadas"]
+        return livro
+
+    @staticmethod
+    def _ordens_ativas(heap: List[Tuple[float, int, Ordem]]) -> List[Ordem]:
+        return [ordem for _, _, ordem in sorted(heap) if ordem.ativa]
+
+    def _lado(self, tipo: str) -> Dict[str, List[Tuple[float, int, Ordem]]]:
+        return self._compras if tipo == "compra" else self._vendas
+
+    def num_ordens(self, ativo: Optional[str] = None) -> int:
+        """
+        Número de ordens ativas no livro (para um ativo ou para todos).
+        """
+        if ativo is None:
+            return len(self._ordens)
+        return sum(1 for ordem in self._ordens.values() if ordem.ativo == ativo)
+
+    def melhor_compra(self, ativo: str) -> Optional[Ordem]:
+        return self._topo(self._compras, "compra", ativo)
+
+    def melhor_venda(self, ativo: str) -> Optional[Ordem]:
+        return self._topo(self._vendas, "venda", ativo)
 
     def adicionar_ordem(self, ordem: Ordem) -> None:
         """
         Adiciona uma ordem ao livro, separando entre compra e venda.
         """
-        destino = self.ordens_compra if ordem.tipo == "compra" else self.ordens_venda
-        destino.setdefault(ordem.ativo, []).append(ordem)
+        sequencia = next(self._sequencia)
+        ordem.id = sequencia
+        ordem.dia_entrada = self.dia_atual
+        ordem.rodada_entrada = self.rodada_atual
+        ordem.ativa = True
+        chave = -ordem.preco_limite if ordem.tipo == "compra" else ordem.preco_limite
+        heap = self._lado(ordem.tipo).setdefault(ordem.ativo, [])
+        heapq.heappush(heap, (chave, sequencia, ordem))
+        self._ordens[sequencia] = ordem
+        if ordem.dia_expiracao is not None:
+            self._agendar_expiracao(ordem.dia_expiracao).append(ordem)
+
+    def adicionar_lote(
+        self,
+        ativo: str,
+        agentes: Sequence["Agente"],
+        compra: Sequence[bool],
+        precos_limite: Sequence[float],
+        quantidades: Sequence[int],
+        dia_expiracao: Optional[int] = None,
+    ) -> List[Ordem]:
+        """
+        Adiciona um lote de ordens descrito por arrays paralelos, na ordem dada.
+        Os heaps são reconstruídos uma única vez, em O(n), em vez de uma inserção
+        por ordem; lotes pequenos diante do livro (como os de rodadas
+        intradiárias) são inseridos um a um, em O(k log n).
+        """
+        ordens = [
+            Ordem("compra" if e_compra else "venda", agente, ativo, preco, qtd)
+            for agente, e_compra, preco, qtd in zip(
+                agentes,
+                np.asarray(compra).tolist(),
+                np.asarray(precos_limite, dtype=float).tolist(),
+                np.asarray(quantidades).tolist(),
+            )
+        ]
+        compras = self._compras.setdefault(ativo, [])
+        vendas = self._vendas.setdefault(ativo, [])
+        expiracoes = (
+            self._agendar_expiracao(dia_expiracao)
+            if dia_expiracao is not None
+            else None
+        )
+        # A ordem interna dos heaps não altera a sequência de casamentos: as
+        # chaves (preço, sequência) são únicas
+        tamanho_livro = len(compras) + len(vendas)
+        inserir = (
+            heapq.heappush
+            if len(ordens) * max(tamanho_livro, 2).bit_length() < tamanho_livro
+            else list.append
+        )
+        for ordem in ordens:
+            sequencia = next(self._sequencia)
+            ordem.id = sequencia
+            ordem.dia_entrada = self.dia_atual
+            ordem.rodada_entrada = self.rodada_atual
+            ordem.dia_expiracao = dia_expiracao
+            self._ordens[sequencia] = ordem
+            if ordem.tipo == "compra":
+                inserir(compras, (-ordem.preco_limite, sequencia, ordem))
+            else:
+                inserir(vendas, (ordem.preco_limite, sequencia, ordem))
+            if expiracoes is not None:
+                expiracoes.append(ordem)
+        if inserir is list.append:
+            heapq.heapify(compras)
+            heapq.heapify(vendas)
+        return ordens
+
+    def _agendar_expiracao(self, dia_expiracao: int) -> List[Ordem]:
+        if dia_expiracao not in self._expiracoes:
+            self._expiracoes[dia_expiracao] = []
+            heapq.heappush(self._dias_expiracao, dia_expiracao)
+        return self._expiracoes[dia_expiracao]
+
+    def cancelar_ordem(self, id_ordem: int) -> bool:
+        """
+        Cancela uma ordem ativa. Devolve False se ela não estiver mais no livro.
+        """
+        ordem = self._ordens.get(id_ordem)
+        if ordem is None:
+            return False
+        self._desativar(ordem)
+        return True
+
+    def remover_expiradas(self, dia: int) -> None:
+        """
+        Avança o livro para `dia`, cancelando as ordens cujo `dia_expiracao` é
+        anterior a ele.
+        """
+        self.dia_atual = dia
+        self.rodada_atual = 0
+        afetados = set()
+        while self._dias_expiracao and self._dias_expiracao[0] < dia:
+            for ordem in self._expiracoes.pop(heapq.heappop(self._dias_expiracao)):
+                if ordem.ativa:
+                    self._desativar(ordem, compactar=False)
+                    afetados.add((ordem.tipo, ordem.ativo))
+        for chave in afetados:
+            self._compactar(chave)
+
+    def _desativar(self, ordem: Ordem, compactar: bool = True) -> None:
+        ordem.ativa = False
+        self._ordens.pop(ordem.id, None)
+        chave = (ordem.tipo, ordem.ativo)
+        self._inativas[chave] = self._inativas.get(chave, 0) + 1
+        if compactar:
+            self._compactar(chave)
+
+    def _compactar(self, chave: Tuple[str, str]) -> None:
+        tipo, ativo = chave
+        heap = self._lado(tipo).get(ativo, [])
+        if self._inativas[chave] > 32 and self._inativas[chave] > len(heap) // 2:
+            heap[:] = [entrada for entrada in heap if entrada[2].ativa]
+            heapq.heapify(heap)
+            self._inativas[chave] = 0
+
+    def _topo(self, lado, tipo: str, ativo: str) -> Optional[Ordem]:
+        heap = lado.get(ativo)
+        while heap and not heap[0][2].ativa:
+            heapq.heappop(heap)
+            chave = (tipo, ativo)
+            self._inativas[chave] = max(0, self._inativas.get(chave, 0) - 1)
+        return heap[0][2] if heap else None
+
+    @staticmethod
+    def _pode_honrar(ordem: Ordem, quantidade: int, preco: float) -> bool:
+        if ordem.tipo == "compra":
+            return ordem.agente.caixa >= quantidade * preco
+        return ordem.agente.carteira.get(ordem.ativo, 0) >= quantidade
+
+    def _negociar(
+        self,
+        compra: Ordem,
+        venda: Ordem,
+        preco_execucao: float,
+        mercado: "Mercado",
+    ) -> bool:
+        qtd_exec = min(compra.quantidade, venda.quantidade)
+
+        # Ordens que atravessaram dias (ou rodadas) podem ter ficado sem lastro
+        for ordem in (compra, venda):
+            if (
+                ordem.dia_entrada < self.dia_atual
+                or ordem.rodada_entrada < self.rodada_atual
+            ) and not self._pode_honrar(ordem, qtd_exec, preco_execucao):
+                self._desativar(ordem)
+                return False
+
+        transacao = Transacao(
+            comprador=compra.agente,
+            vendedor=venda.agente,
+            ativo=compra.ativo,
+            quantidade=qtd_exec,
+            preco_execucao=preco_execucao,
+        )
+        transacao.executar()
+        self.num_negocios += 1
+        self.cotas_negociadas += qtd_exec
+        if self.fita is not None:
+            self.fita.append(
+                (compra.agente.id, venda.agente.id, qtd_exec, preco_execucao)
+            )
+        if self.alterados is not None:
+            self.alterados += (compra.agente.id, venda.agente.id)
+
+        # Atualiza o preço do ativo no mercado
+        mercado.atualizar_preco(compra.ativo, preco_execucao)
+
+        # Atualiza quantidades remanescentes
+        compra.quantidade -= qtd_exec
+        venda.quantidade -= qtd_exec
+        for ordem in (compra, venda):
+            if ordem.quantidade == 0:
+                self._desativar(ordem)
+        return True
 
     def executar_ordens(self, ativo: str, mercado: "Mercado") -> None:
         """
         Executa as ordens para um ativo, cruzando ordens de compra e venda.
         """
-        if ativo not in self.ordens_compra or ativo not in self.ordens_venda:
+        while True:
+            melhor_compra = self.melhor_compra(ativo)
+            melhor_venda = self.melhor_venda(ativo)
+            if melhor_compra is None or melhor_venda is None:
+                return
+
+            if melhor_compra.preco_limite < melhor_venda.preco_limite:
+                return  # Não há mais match possível
+
+            preco_execucao = (
+                melhor_compra.preco_limite + melhor_venda.preco_limite
+            ) / 2
+            self._negociar(melhor_compra, melhor_venda, preco_execucao, mercado)
+
+    def submeter_ordem(self, ordem: Ordem, mercado: "Mercado") -> None:
+        """
+        Submete uma ordem. No modo contínuo ela é casada imediatamente contra o
+        lado oposto e o saldo, se houver, fica em repouso no livro.
+        """
+        self.adicionar_ordem(ordem)
+        if self.modo != "continuo":
+            return
+
+        oposta = self.melhor_venda if ordem.tipo == "compra" else self.melhor_compra
+        while ordem.ativa:
+            contraparte = oposta(ordem.ativo)
+            if contraparte is None:
+                return
+            compra, venda = (
+                (ordem, contraparte) if ordem.tipo == "compra" else (contraparte, ordem)
+            )
+            if compra.preco_limite < venda.preco_limite:
+                return
+            self._negociar(compra, venda, contraparte.preco_limite, mercado)
+
+    def submeter_lote(
+        self,
+        ativo: str,
+        agentes: Sequence["Agente"],
+        compra: Sequence[bool],
+        precos_limite: Sequence[float],
+        quantidades: Sequence[int],
+        mercado: "Mercado",
+        dia_expiracao: Optional[int] = None,
+    ) -> None:
+        """
+        Submete um lote de ordens. No leilão o lote entra de uma vez no livro; no
+        modo contínuo cada ordem é casada na ordem de chegada.
+        """
+        if self.modo != "continuo":
+            self.adicionar_lote(
+                ativo, agentes, compra, precos_limite, quantidades, dia_expiracao
+            )
             return
+        for agente, e_compra, preco, qtd in zip(
+            agentes,
+            np.asarray(compra).tolist(),
+            np.asarray(precos_limite, dtype=float).tolist(),
+            np.asarray(quantidades).tolist(),
+        ):
+            ordem = Ordem(
+                "compra" if e_compra else "venda",
+                agente,
+                ativo,
+                preco,
+                qtd,
+                dia_expiracao=dia_expiracao,
+            )
+            self.submeter_ordem(ordem, mercado)
+
 
-        compras = self.ordens_compra[ativo]
-        vendas = self.ordens_venda[ativo]
+class LivroOrdensReferencia(LivroOrdens):
+    """
+    Livro de ordens de referência dos testes diferenciais (`src/diferencial.py`).
+    Guarda as ordens como `LivroOrdens`, mas encontra as melhores ordenando as
+    ordens ativas a cada consulta, como o livro original baseado em listas, sem
+    depender dos heaps. É mais lento; serve para validar o livro otimizado.
+    """
 
-        # Ordena as ordens: compras por maior preço, vendas por menor
-        compras.sort(key=lambda ordem: ordem.preco_limite, reverse=True)
-        vendas.sort(key=lambda ordem: ordem.preco_limite)
+    def _ordenadas(self, tipo: str, ativo: str) -> List[Ordem]:
+        # `_ordens` está em ordem de chegada e a ordenação é estável, o que
+        # preserva a prioridade por tempo entre ordens de mesmo preço
+        ordens = [
+            ordem
+            for ordem in self._ordens.values()
+            if ordem.tipo == tipo and ordem.ativo == ativo
+        ]
+        ordens.sort(key=lambda ordem: ordem.preco_limite, reverse=tipo == "compra")
+        return ordens
 
+    def melhor_compra(self, ativo: str) -> Optional[Ordem]:
+        ordens = self._ordenadas("compra", ativo)
+        return ordens[0] if ordens else None
+
+    def melhor_venda(self, ativo: str) -> Optional[Ordem]:
+        ordens = self._ordenadas("venda", ativo)
+        return ordens[0] if ordens else None
+
+    def executar_ordens(self, ativo: str, mercado: "Mercado") -> None:
+        compras = self._ordenadas("compra", ativo)
+        vendas = self._ordenadas("venda", ativo)
         while compras and vendas:
             melhor_compra = compras[0]
             melhor_venda = vendas[0]
-
             if melhor_compra.preco_limite < melhor_venda.preco_limite:
-                break  # Não há mais match possível
+                break
 
             preco_execucao = (
                 melhor_compra.preco_limite + melhor_venda.preco_limite
             ) / 2
-            qtd_exec = min(melhor_compra.quantidade, melhor_venda.quantidade)
-
-            transacao = Transacao(
-                comprador=melhor_compra.agente,
-                vendedor=melhor_venda.agente,
-                ativo=ativo,
-                quantidade=qtd_exec,
-                preco_execucao=preco_execucao,
-            )
-            transacao.executar()
-
-            # Atualiza o preço do ativo no mercado
-            mercado.fii.preco_cota = preco_execucao
-
-            # Atualiza quantidades remanescentes
-            melhor_compra.quantidade -= qtd_exec
-            melhor_venda.quantidade -= qtd_exec
-
-            if melhor_compra.quantidade == 0:
+            self._negociar(melhor_compra, melhor_venda, preco_execucao, mercado)
+            # Ordens executadas por completo ou sem lastro saem do livro
+            if not melhor_compra.ativa:
                 compras.pop(0)
-            if melhor_venda.quantidade == 0:
+            if not melhor_venda.ativa:
                 vendas.pop(0)
@@ -0,0 +1,554 @@
+import json
+import math
+from dataclasses import dataclass
+from numbers import Real
+from typing import Any, Iterable, Mapping, Optional, Tuple
+
+# Camada de configuração tipada: os dicionários de `config/parametros.json` são
+# validados e convertidos uma única vez, no início da simulação, em objetos
+# imutáveis com todos os valores padrão resolvidos. Os laços diários leem
+# atributos desses objetos em vez de repetir `parametros.get(chave, padrão)`
+# por agente, e um parâmetro inválido falha na partida, não horas depois.
+
+MOTORES_SENTIMENTO = ("agentes", "vetorizado", "fragmentado", "auto")
+EXECUTORES = ("auto", "serial", "threads", "processos")
+MODOS_LIVRO = ("leilao", "continuo")
+MODOS_VOLATILIDADE = ("completo", "janela", "ewma")
+TIPOS_MEDIA_MOVEL = ("sma", "ema")
+# Na ordem em que são executados dentro de um dia
+TIPOS_EVENTO = ("choque_noticia", "decisao_juros", "dividendos", "imoveis")
+CAMPOS_JUROS = ("taxa_selic", "expectativa_inflacao", "premio_risco")
+
+
+def _verificar_chaves(secao: str, dados: Mapping, conhecidas: Iterable[str]) -> None:
+    desconhecidas = sorted(set(dados) - set(conhecidas))
+    if desconhecidas:
+        raise ValueError(
+            f"Parâmetros desconhecidos em '{secao}': {', '.join(desconhecidas)}"
+        )
+
+
+def _numero(
+    secao: str,
+    nome: str,
+    valor: Any,
+    minimo: Optional[float] = None,
+    maximo: Optional[float] = None,
+    inteiro: bool = False,
+):
+    if isinstance(valor, bool) or not isinstance(valor, Real):
+        raise ValueError(f"'{secao}.{nome}' deve ser numérico; recebido {valor!r}")
+    if not math.isfinite(valor):
+        raise ValueError(f"'{secao}.{nome}' deve ser finito; recebido {valor!r}")
+    if inteiro:
+        if int(valor) != valor:
+            raise ValueError(f"'{secao}.{nome}' deve ser inteiro; recebido {valor!r}")
+        valor = int(valor)
+    if minimo is not None and valor < minimo:
+        raise ValueError(f"'{secao}.{nome}' deve ser >= {minimo}; recebido {valor!r}")
+    if maximo is not None and valor > maximo:
+        raise ValueError(f"'{secao}.{nome}' deve ser <= {maximo}; recebido {valor!r}")
+    return valor
+
+
+def _opcao(secao: str, nome: str, valor: Any, opcoes: Tuple[str, ...]) -> str:
+    if valor not in opcoes:
+        raise ValueError(
+            f"'{secao}.{nome}' deve ser um de {', '.join(opcoes)}; recebido {valor!r}"
+        )
+    return valor
+
+
+def _logico(secao: str, nome: str, valor: Any) -> bool:
+    if not isinstance(valor, bool):
+        raise ValueError(f"'{secao}.{nome}' deve ser true ou false; recebido {valor!r}")
+    return valor
+
+
+@dataclass(frozen=True)
+class ParametrosMediaMovel:
+    """
+    Janelas das médias móveis técnicas ("media_movel_params"): `omega` é
+    `int(lf * dias_uteis_ano)` e a janela curta é `omega / janela_curta_divisor`.
+    """
+
+    dias_uteis_ano: int = 252
+    janela_curta_divisor: float = 4
+
+    @classmethod
+    def a_partir_de_dicionario(
+        cls, dados: Optional[Mapping], secao: str = "media_movel_params"
+    ) -> "ParametrosMediaMovel":
+        dados = dados or {}
+        _verificar_chaves(secao, dados, ("dias_uteis_ano", "janela_curta_divisor"))
+        return cls(
+            dias_uteis_ano=_numero(
+                secao,
+                "dias_uteis_ano",
+                dados.get("dias_uteis_ano", 252),
+                minimo=1,
+                inteiro=True,
+            ),
+            janela_curta_divisor=_numero(
+                secao,
+                "janela_curta_divisor",
+                dados.get("janela_curta_divisor", 4),
+                minimo=1,
+            ),
+        )
+
+    @classmethod
+    def resolver(cls, valor) -> "ParametrosMediaMovel":
+        """
+        Aceita o objeto já compilado (sem custo) ou o dicionário da configuração.
+        """
+        if isinstance(valor, cls):
+            return valor
+        return cls.a_partir_de_dicionario(valor)
+
+
+@dataclass(frozen=True)
+class ParametrosInvestidor:
+    """
+    Parâmetros comportamentais dos investidores (seção "agente.params").
+    """
+
+    piso_prob_negociar: float = 0.3
+    fator_lf_prob_negociar: float = 0.9
+    tipo_media_movel: str = "ema"
+    media_movel: ParametrosMediaMovel = ParametrosMediaMovel()
+    peso_retorno_privada: float = 0.6
+    peso_riqueza_privada: float = 0.4
+    ruido_std_privada: float = 0.05
+    ruido_std_preco_esperado: float = 0.1
+    peso_sentimento_inflacao: float = 0.9
+    peso_sentimento_expectativa: float = 0.9
+    peso_carteira_foco: float = 0.5
+
+    @classmethod
+    def a_partir_de_dicionario(
+        cls, dados: Optional[Mapping], secao: str = "agente.params"
+    ) -> "ParametrosInvestidor":
+        dados = dados or {}
+        _verificar_chaves(
+            secao,
+            dados,
+            (
+                "piso_prob_negociar",
+                "fator_lf_prob_negociar",
+                "tipo_media_movel",
+                "media_movel_params",
+                "peso_retorno_privada",
+                "peso_riqueza_privada",
+                "ruido_std_privada",
+                "ruido_std_preco_esperado",
+                "peso_sentimento_inflacao",
+                "peso_sentimento_expectativa",
+                "peso_carteira_foco",
+            ),
+        )
+
+        def numero(nome, padrao, **limites):
+            return _numero(secao, nome, dados.get(nome, padrao), **limites)
+
+        return cls(
+            piso_prob_negociar=numero("piso_prob_negociar", 0.3, minimo=0, maximo=1),
+            fator_lf_prob_negociar=numero("fator_lf_prob_negociar", 0.9, minimo=0),
+            tipo_media_movel=_opcao(
+                secao,
+                "tipo_media_movel",
+                dados.get("tipo_media_movel", "ema"),
+                TIPOS_MEDIA_MOVEL,
+            ),
+            media_movel=ParametrosMediaMovel.a_partir_de_dicionario(
+                dados.get("media_movel_params"), f"{secao}.media_movel_params"
+            ),
+            peso_retorno_privada=numero("peso_retorno_privada", 0.6),
+            peso_riqueza_privada=numero("peso_riqueza_privada", 0.4),
+            ruido_std_privada=numero("ruido_std_privada", 0.05, minimo=0),
+            ruido_std_preco_esperado=numero("ruido_std_preco_esperado", 0.1, minimo=0),
+            peso_sentimento_inflacao=numero("peso_sentimento_inflacao", 0.9),
+            peso_sentimento_expectativa=numero("peso_sentimento_expectativa", 0.9),
+            peso_carteira_foco=numero("peso_carteira_foco", 0.5, minimo=0, maximo=1),
+        )
+
+    @classmethod
+    def resolver(cls, valor) -> "ParametrosInvestidor":
+        if isinstance(valor, cls):
+            return valor
+        return cls.a_partir_de_dicionario(valor)
+
+
+@dataclass(frozen=True)
+class ParametrosSentimento:
+    """
+    Coeficientes do sentimento e regras de ordem (seção
+    "parametros_sentimento_e_ordem"); `a0`, `b0`, `c0` e `beta` são obrigatórios.
+    """
+
+    a0: float
+    b0: float
+    c0: float
+    beta: float
+    peso_preco_esperado: float = 0.35
+    quantidade_compra_min: int = 1
+    quantidade_compra_max: int = 30
+    divisor_quantidade_venda: float = 5
+
+    @classmethod
+    def a_partir_de_dicionario(
+        cls, dados: Optional[Mapping], secao: str = "parametros_sentimento_e_ordem"
+    ) -> "ParametrosSentimento":
+        dados = dados or {}
+        _verificar_chaves(
+            secao,
+            dados,
+            (
+                "a0",
+                "b0",
+                "c0",
+                "beta",
+                "peso_preco_esperado",
+                "quantidade_compra_min",
+                "quantidade_compra_max",
+                "divisor_quantidade_venda",
+            ),
+        )
+        faltando = [nome for nome in ("a0", "b0", "c0", "beta") if nome not in dados]
+        if faltando:
+            raise ValueError(
+                f"Parâmetros obrigatórios ausentes em '{secao}': {', '.join(faltando)}"
+            )
+        quantidade_min = _numero(
+            secao,
+            "quantidade_compra_min",
+            dados.get("quantidade_compra_min", 1),
+            minimo=1,
+            inteiro=True,
+        )
+        return cls(
+            a0=_numero(secao, "a0", dados["a0"]),
+            b0=_numero(secao, "b0", dados["b0"]),
+            c0=_numero(secao, "c0", dados["c0"]),
+            beta=_numero(secao, "beta", dados["beta"]),
+            peso_preco_esperado=_numero(
+                secao, "peso_preco_esperado", dados.get("peso_preco_esperado", 0.35)
+            ),
+            quantidade_compra_min=quantidade_min,
+            quantidade_compra_max=_numero(
+                secao,
+                "quantidade_compra_max",
+                dados.get("quantidade_compra_max", 30),
+                minimo=quantidade_min,
+                inteiro=True,
+            ),
+            divisor_quantidade_venda=_numero(
+                secao,
+                "divisor_quantidade_venda",
+                dados.get("divisor_quantidade_venda", 5),
+                minimo=1,
+            ),
+        )
+
+    @classmethod
+    def resolver(cls, valor) -> "ParametrosSentimento":
+        if isinstance(valor, cls):
+            return valor
+        return cls.a_partir_de_dicionario(valor)
+
+
+@dataclass(frozen=True)
+class ParametrosFII:
+    """
+    Taxas de um FII. Os dicionários de fundo também trazem dados de criação
+    (cotas, caixa, calendários, nome), que não são validados aqui.
+    """
+
+    dividendos_taxa: float = 0.95
+    dividendos_caixa_taxa: float = 0.05
+    investimento_fracao: float = 0.5
+    aluguel_factor_imovel: float = 0.005
+
+    @classmethod
+    def a_partir_de_dicionario(
+        cls, dados: Optional[Mapping], secao: str = "fii"
+    ) -> "ParametrosFII":
+        dados = dados or {}
+
+        def taxa(nome, padrao, maximo=1):
+            return _numero(secao, nome, dados.get(nome, padrao), 0, maximo)
+
+        return cls(
+            dividendos_taxa=taxa("dividendos_taxa", 0.95),
+            dividendos_caixa_taxa=taxa("dividendos_caixa_taxa", 0.05),
+            investimento_fracao=taxa("investimento_fracao", 0.5),
+            aluguel_factor_imovel=taxa("aluguel_factor_imovel", 0.005, None),
+        )
+
+
+@dataclass(frozen=True)
+class ParametrosEvento:
+    """
+    Um evento da agenda do mercado (item de "mercado.eventos"): pontual, no
+    dia `dia`, ou periódico, nos dias em que `dia % frequencia == defasagem`.
+
+      - "choque_noticia": soma `valor` à notícia do dia;
+      - "decisao_juros": fixa `taxa_selic`, `expectativa_inflacao` e/ou
+        `premio_risco` do banco central a partir do dia;
+      - "dividendos" e "imoveis": distribuição extraordinária de dividendos ou
+        reavaliação dos imóveis do FII `fii` (todos, se omitido), além das
+        previstas nos calendários dos fundos.
+    """
+
+    tipo: str
+    dia: Optional[int] = None
+    frequencia: Optional[int] = None
+    defasagem: int = 0
+    fii: Optional[str] = None
+    valor: Optional[float] = None
+    taxa_selic: Optional[float] = None
+    expectativa_inflacao: Optional[float] = None
+    premio_risco: Optional[float] = None
+
+    @property
+    def juros(self) -> Tuple[Tuple[str, float], ...]:
+        """
+        Pares (variável, valor) fixados por uma "decisao_juros".
+        """
+        return tuple(
+            (nome, getattr(self, nome))
+            for nome in CAMPOS_JUROS
+            if getattr(self, nome) is not None
+        )
+
+    @classmethod
+    def a_partir_de_dicionario(
+        cls, dados: Mapping, secao: str = "mercado.eventos"
+    ) -> "ParametrosEvento":
+        if not isinstance(dados, Mapping):
+            raise ValueError(f"'{secao}' deve ser um objeto; recebido {dados!r}")
+        _verificar_chaves(secao, dados, cls.__dataclass_fields__)
+        tipo = _opcao(secao, "tipo", dados.get("tipo"), TIPOS_EVENTO)
+        if ("dia" in dados) == ("frequencia" in dados):
+            raise ValueError(f"Informe 'dia' ou 'frequencia' (apenas um) em '{secao}'.")
+
+        def opcional(nome, minimo=None, inteiro=False):
+            if dados.get(nome) is None:
+                return None
+            return _numero(secao, nome, dados[nome], minimo=minimo, inteiro=inteiro)
+
+        permitidos = {
+            "choque_noticia": ("valor",),
+            "decisao_juros": CAMPOS_JUROS,
+            "dividendos": ("fii",),
+            "imoveis": ("fii",),
+        }[tipo]
+        extras = [
+            nome
+            for nome in ("fii", "valor") + CAMPOS_JUROS
+            if nome in dados and nome not in permitidos
+        ]
+        if extras:
+            raise ValueError(
+                f"Parâmetros sem efeito em um evento '{tipo}' ('{secao}'): "
+                f"{', '.join(extras)}"
+            )
+        fii = dados.get("fii")
+        if fii is not None and not isinstance(fii, str):
+            raise ValueError(
+                f"'{secao}.fii' deve ser o nome de um FII; recebido {fii!r}"
+            )
+        evento = cls(
+            tipo=tipo,
+            dia=opcional("dia", 1, inteiro=True),
+            frequencia=opcional("frequencia", 1, inteiro=True),
+            defasagem=_numero(
+                secao, "defasagem", dados.get("defasagem", 0), 0, inteiro=True
+            ),
+            fii=fii,
+            valor=opcional("valor"),
+            taxa_selic=opcional("taxa_selic", 0),
+            expectativa_inflacao=opcional("expectativa_inflacao"),
+            premio_risco=opcional("premio_risco", 0),
+        )
+        if tipo == "choque_noticia" and evento.valor is None:
+            raise ValueError(f"Informe 'valor' do choque de notícia em '{secao}'.")
+        if tipo == "decisao_juros" and not evento.juros:
+            raise ValueError(
+                f"Informe ao menos um de {', '.join(CAMPOS_JUROS)} em '{secao}'."
+            )
+        return evento
+
+
+@dataclass(frozen=True)
+class ParametrosMercado:
+    """
+    Opções do mercado (seção "mercado").
+    """
+
+    volatilidade_inicial: float = 0.1
+    volatilidade_modo: str = "completo"
+    volatilidade_janela: int = 63
+    volatilidade_lambda_ewma: float = 0.94
+    dividendos_frequencia: int = 21
+    atualizacao_imoveis_frequencia: int = 126
+    num_processos_paralelos: Optional[int] = None
+    motor_sentimento: str = "agentes"
+    executor: str = "auto"
+    tamanho_lote: Optional[int] = None
+    livro_modo: str = "leilao"
+    implementacao_referencia: bool = False
+    validade_ordens_dias: int = 1
+    instrumentacao: bool = False
+    arquivo_trace: Optional[str] = None
+    memoria_limitada: bool = False
+    janela_precos: Optional[int] = None
+    rodadas_por_dia: int = 1
+    sentimento_por_rodada: bool = False
+    eventos: Tuple[ParametrosEvento, ...] = ()
+
+    @classmethod
+    def a_partir_de_dicionario(
+        cls, dados: Optional[Mapping], secao: str = "mercado"
+    ) -> "ParametrosMercado":
+        dados = dados or {}
+        padrao = cls.__dataclass_fields__
+        _verificar_chaves(secao, dados, padrao)
+
+        def valor(nome):
+            return dados.get(nome, padrao[nome].default)
+
+        def inteiro(nome, minimo):
+            return _numero(secao, nome, valor(nome), minimo=minimo, inteiro=True)
+
+        def opcional(nome, minimo):
+            return None if valor(nome) is None else inteiro(nome, minimo)
+
+        arquivo_trace = valor("arquivo_trace")
+        if arquivo_trace is not None and not isinstance(arquivo_trace, str):
+            raise ValueError(f"'{secao}.arquivo_trace' deve ser um caminho ou null")
+        eventos = valor("eventos")
+        if not isinstance(eventos, (list, tuple)):
+            raise ValueError(f"'{secao}.eventos' deve ser uma lista de eventos")
+        implementacao_referencia = _logico(
+            secao, "implementacao_referencia", valor("implementacao_referencia")
+        )
+        if implementacao_referencia and valor("motor_sentimento") != "agentes":
+            raise ValueError(
+                f"'{secao}.implementacao_referencia' exige "
+                "'motor_sentimento' igual a \"agentes\""
+            )
+        return cls(
+            volatilidade_inicial=_numero(
+                secao, "volatilidade_inicial", valor("volatilidade_inicial"), 0
+            ),
+            volatilidade_modo=_opcao(
+                secao,
+                "volatilidade_modo",
+                valor("volatilidade_modo"),
+                MODOS_VOLATILIDADE,
+            ),
+            volatilidade_janela=inteiro("volatilidade_janela", 2),
+            volatilidade_lambda_ewma=_numero(
+                secao,
+                "volatilidade_lambda_ewma",
+                valor("volatilidade_lambda_ewma"),
+                0,
+                1,
+            ),
+            dividendos_frequencia=inteiro("dividendos_frequencia", 1),
+            atualizacao_imoveis_frequencia=inteiro("atualizacao_imoveis_frequencia", 1),
+            num_processos_paralelos=opcional("num_processos_paralelos", 1),
+            motor_sentimento=_opcao(
+                secao, "motor_sentimento", valor("motor_sentimento"), MOTORES_SENTIMENTO
+            ),
+            executor=_opcao(secao, "executor", valor("executor"), EXECUTORES),
+            tamanho_lote=opcional("tamanho_lote", 1),
+            livro_modo=_opcao(secao, "livro_modo", valor("livro_modo"), MODOS_LIVRO),
+            implementacao_referencia=implementacao_referencia,
+            validade_ordens_dias=inteiro("validade_ordens_dias", 1),
+            instrumentacao=_logico(secao, "instrumentacao", valor("instrumentacao")),
+            arquivo_trace=arquivo_trace,
+            memoria_limitada=_logico(
+                secao, "memoria_limitada", valor("memoria_limitada")
+            ),
+            janela_precos=opcional("janela_precos", 2),
+            rodadas_por_dia=inteiro("rodadas_por_dia", 1),
+            sentimento_por_rodada=_logico(
+                secao, "sentimento_por_rodada", valor("sentimento_por_rodada")
+            ),
+            eventos=tuple(
+                ParametrosEvento.a_partir_de_dicionario(
+                    evento, f"{secao}.eventos[{indice}]"
+                )
+                for indice, evento in enumerate(eventos)
+            ),
+        )
+
+    @classmethod
+    def resolver(cls, valor) -> "ParametrosMercado":
+        if isinstance(valor, cls):
+            return valor
+        return cls.a_partir_de_dicionario(valor)
+
+
+@dataclass(frozen=True)
+class ParametrosSimulacao:
+    """
+    Seções da configuração usadas nos laços da simulação, já validadas.
+    """
+
+    num_dias: int
+    num_agentes: int
+    investidor: ParametrosInvestidor
+    sentimento: ParametrosSentimento
+    mercado: ParametrosMercado
+    fiis: Tuple[ParametrosFII, ...]
+
+
+def compilar_parametros(sim_params: Mapping) -> ParametrosSimulacao:
+    """
+    Valida a configuração completa e resolve os valores padrão. Levanta
+    `ValueError` com o caminho do parâmetro problemático.
+    """
+    for secao in ("geral", "agente", "parametros_sentimento_e_ordem", "mercado"):
+        if secao not in sim_params:
+            raise ValueError(f"Seção '{secao}' ausente da configuração.")
+    geral, agente = sim_params["geral"], sim_params["agente"]
+    if "num_dias" not in geral or "num_agentes" not in agente:
+        raise ValueError("Informe 'geral.num_dias' e 'agente.num_agentes'.")
+
+    manter = sim_params.get("checkpoint", {}).get("manter")
+    if manter is not None:
+        _numero("checkpoint", "manter", manter, 1, inteiro=True)
+
+    fii_cfg = sim_params.get("fii", {})
+    fundos_cfg = sim_params.get("fiis") or []
+    return ParametrosSimulacao(
+        num_dias=_numero("geral", "num_dias", geral["num_dias"], 1, inteiro=True),
+        num_agentes=_numero(
+            "agente", "num_agentes", agente["num_agentes"], 1, inteiro=True
+        ),
+        investidor=ParametrosInvestidor.a_partir_de_dicionario(agente.get("params")),
+        sentimento=ParametrosSentimento.a_partir_de_dicionario(
+            sim_params["parametros_sentimento_e_ordem"]
+        ),
+        mercado=ParametrosMercado.a_partir_de_dicionario(sim_params["mercado"]),
+        fiis=tuple(
+            ParametrosFII.a_partir_de_dicionario(
+                {**fii_cfg, **fundo_cfg}, f"fiis[{indice}]"
+            )
+            for indice, fundo_cfg in enumerate(fundos_cfg)
+        )
+        or (ParametrosFII.a_partir_de_dicionario(fii_cfg),),
+    )
+
+
+def carregar_parametros(caminho: str = "config/parametros.json") -> dict:
+    """
+    Lê a configuração e a valida antes de qualquer simulação começar.
+    """
+    with open(caminho, "r", encoding="utf-8") as f:
+        sim_params = json.load(f)
+    compilar_parametros(sim_params)
+    return sim_params
@@ -0,0 +1,621 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .configuracao import carregar_parametros
+from .monte_carlo import aplicar_sobrescritas
+from .rodadas_simuladas import iterar_simulacao
+
+# Implementação de referência: o motor por agente, serial, com as médias móveis
+# recalculadas janela a janela e o livro ordenado a cada casamento, é a
+# formulação mais direta do modelo e não compartilha as otimizações que valida
+REFERENCIA = {
+    "mercado.motor_sentimento": "agentes",
+    "mercado.executor": "serial",
+    "mercado.num_processos_paralelos": 1,
+    "mercado.implementacao_referencia": True,
+}
+# Os candidatos partem da referência com os componentes otimizados
+BASE_CANDIDATO = {"mercado.implementacao_referencia": False}
+# Somas janela a janela e acumuladores incrementais diferem no último bit; os
+# valores contínuos são comparados com esta tolerância (rtol, atol), enquanto
+# decisões, quantidades e a fita (exceto o preço) continuam exatas
+TOLERANCIAS_REFERENCIA = {
+    campo: (1e-9, 1e-12)
+    for campo in (
+        "precos",
+        "volatilidades",
+        "sentimento_medio",
+        "sentimento",
+        "caixa",
+        "riqueza",
+        "fita",
+    )
+}
+CAMPOS_MERCADO = (
+    "precos",
+    "volumes",
+    "negocios",
+    "volatilidades",
+    "sentimento_medio",
+    "news",
+)
+CAMPOS_AGENTES = ("sentimento", "caixa", "cotas", "riqueza")
+CAMPOS_FITA = ("ativo", "comprador", "vendedor", "quantidade", "preco")
+# Painéis gravados só com as mudanças de um dia para o outro
+_PAINEIS_ESPARSOS = ("caixa", "cotas")
+# Agentes, espaçados uniformemente, cujo sentimento vai para a referência gravada
+AMOSTRA_SENTIMENTO = 32
+VERSAO_REFERENCIA = 2
+
+
+def capturar_trajetoria(
+    sim_params: dict,
+    sobrescritas: Optional[Dict[str, Any]] = None,
+    run_id: str = "diferencial",
+) -> Dict[str, np.ndarray]:
+    """
+    Executa a simulação com `sobrescritas` e empilha os `RegistroDia` em arrays
+    com um dia por linha: as séries de `CAMPOS_MERCADO`, os painéis de
+    `CAMPOS_AGENTES` (dias × agentes, e dias × agentes × FIIs para "cotas") e
+    a fita de negócios em colunas "fita_dia" e "fita_<campo>". Checkpoints não
+    são gravados. "sobrescritas" guarda, em JSON, as sobrescritas aplicadas.
+    """
+    sobrescritas = dict(sobrescritas or {})
+    params = aplicar_sobrescritas(sim_params, sobrescritas)
+    params.setdefault("checkpoint", {})["intervalo_dias"] = 0
+
+    colunas: Dict[str, List[Any]] = {
+        nome: [] for nome in ("dia",) + CAMPOS_MERCADO + CAMPOS_AGENTES
+    }
+    fita: Dict[str, List[np.ndarray]] = {nome: [] for nome in ("dia",) + CAMPOS_FITA}
+    for registro in iterar_simulacao(
+        params, run_id, incluir_agentes=True, incluir_fita=True
+    ):
+        colunas["dia"].append(registro.dia)
+        for nome in CAMPOS_MERCADO:
+            colunas[nome].append(getattr(registro, nome))
+        for nome in CAMPOS_AGENTES:
+            colunas[nome].append(registro.agentes[nome])
+        fita["dia"].append(np.full(len(registro.fita["preco"]), registro.dia))
+        for nome in CAMPOS_FITA:
+            fita[nome].append(registro.fita[nome])
+
+    trajetoria = {nome: np.array(valores) for nome, valores in colunas.items()}
+    for nome, partes in fita.items():
+        trajetoria[f"fita_{nome}"] = np.concatenate(partes) if partes else np.empty(0)
+    trajetoria["sobrescritas"] = np.array(_json_sobrescritas(sobrescritas))
+    return trajetoria
+
+
+def _json_sobrescritas(sobrescritas: Dict[str, Any]) -> str:
+    return json.dumps(sobrescritas, sort_keys=True, separators=(",", ":"))
+
+
+@dataclass(frozen=True)
+class Divergencia:
+    """
+    Primeiro ponto em que um campo difere: o dia e, conforme o campo, o agente
+    (índice na população) e o ativo (índice do FII), com os dois valores.
+    """
+
+    campo: str
+    dia: int
+    agente: Optional[int] = None
+    ativo: Optional[int] = None
+    referencia: Any = None
+    candidato: Any = None
+
+    def __str__(self) -> str:
+        local = f"dia {self.dia}"
+        if self.agente is not None:
+            local += f", agente {self.agente}"
+        if self.ativo is not None:
+            local += f", ativo {self.ativo}"
+        return (
+            f"{self.campo}: {local}: referência {self.referencia!r}, "
+            f"candidato {self.candidato!r}"
+        )
+
+
+@dataclass
+class RelatorioDiferencial:
+    """
+    Resultado da comparação de duas trajetórias: a primeira divergência de cada
+    campo, em ordem de dia.
+    """
+
+    divergencias: List[Divergencia] = field(default_factory=list)
+
+    @property
+    def identicas(self) -> bool:
+        return not self.divergencias
+
+    @property
+    def primeira(self) -> Optional[Divergencia]:
+        return self.divergencias[0] if self.divergencias else None
+
+    def formatar(self) -> str:
+        if self.identicas:
+            return "Trajetórias equivalentes."
+        linhas = [f"Primeira divergência: {self.primeira}"]
+        linhas += [f"  {divergencia}" for divergencia in self.divergencias[1:]]
+        return "\n".join(linhas)
+
+
+def _valor(array: np.ndarray, indice) -> Any:
+    return array[indice].item() if np.ndim(array[indice]) == 0 else array[indice]
+
+
+def _diferentes(
+    referencia: np.ndarray, candidata: np.ndarray, tolerancia: Tuple[float, float]
+) -> np.ndarray:
+    rtol, atol = tolerancia
+    if not (rtol or atol) or not np.issubdtype(referencia.dtype, np.inexact):
+        iguais = referencia == candidata
+        if np.issubdtype(referencia.dtype, np.inexact):
+            iguais |= np.isnan(referencia) & np.isnan(candidata)
+        return ~iguais
+    return ~np.isclose(referencia, candidata, rtol=rtol, atol=atol, equal_nan=True)
+
+
+def _comparar_painel(
+    campo: str,
+    dias: np.ndarray,
+    referencia: np.ndarray,
+    candidata: np.ndarray,
+    tolerancia: Tuple[float, float],
+    agentes: Optional[np.ndarray] = None,
+) -> Optional[Divergencia]:
+    """
+    `agentes` traz o índice na população de cada coluna de um painel de
+    agentes amostrado.
+    """
+    num_dias = min(len(referencia), len(candidata))
+    if referencia.shape[1:] != candidata.shape[1:]:
+        return Divergencia(
+            campo, int(dias[0]), referencia=referencia.shape, candidato=candidata.shape
+        )
+    diferentes = _diferentes(
+        referencia[:num_dias], candidata[:num_dias], tolerancia
+    ).reshape(num_dias, -1)
+    dias_divergentes = np.flatnonzero(diferentes.any(axis=1))
+    if len(dias_divergentes) == 0:
+        if len(referencia) == len(candidata):
+            return None
+        # Uma trajetória terminou antes da outra
+        return Divergencia(
+            campo,
+            int(dias[num_dias]),
+            referencia=len(referencia),
+            candidato=len(candidata),
+        )
+
+    linha = int(dias_divergentes[0])
+    posicao = np.unravel_index(
+        int(np.flatnonzero(diferentes[linha])[0]), referencia.shape[1:]
+    )
+    agente = ativo = None
+    if campo in CAMPOS_AGENTES:
+        agente = int(posicao[0] if agentes is None else agentes[posicao[0]])
+        ativo = int(posicao[1]) if len(posicao) > 1 else None
+    elif posicao:
+        ativo = int(posicao[0])
+    indice = (linha,) + tuple(posicao)
+    return Divergencia(
+        campo,
+        int(dias[linha]),
+        agente=agente,
+        ativo=ativo,
+        referencia=_valor(referencia, indice),
+        candidato=_valor(candidata, indice),
+    )
+
+
+def _comparar_fita(
+    referencia: Dict[str, np.ndarray],
+    candidata: Dict[str, np.ndarray],
+    tolerancia: Tuple[float, float],
+) -> Optional[Divergencia]:
+    """
+    Compara as fitas negócio a negócio, na ordem em que foram fechados; a
+    divergência aponta o dia e o comprador do primeiro negócio diferente.
+    """
+    dias_ref, dias_cand = referencia["fita_dia"], candidata["fita_dia"]
+    num_negocios = min(len(dias_ref), len(dias_cand))
+    diferentes = dias_ref[:num_negocios] != dias_cand[:num_negocios]
+    for nome in CAMPOS_FITA:
+        diferentes |= _diferentes(
+            referencia[f"fita_{nome}"][:num_negocios],
+            candidata[f"fita_{nome}"][:num_negocios],
+            tolerancia if nome == "preco" else (0.0, 0.0),
+        )
+    divergentes = np.flatnonzero(diferentes)
+    if len(divergentes):
+        indice = int(divergentes[0])
+    elif len(dias_ref) != len(dias_cand):
+        indice = num_negocios
+    else:
+        return None
+
+    def negocio(fita, dias):
+        if indice >= len(dias):
+            return None
+        return {nome: fita[f"fita_{nome}"][indice].item() for nome in CAMPOS_FITA}
+
+    negocio_ref = negocio(referencia, dias_ref)
+    negocio_cand = negocio(candidata, dias_cand)
+    dia = min(int(dias[indice]) for dias in (dias_ref, dias_cand) if indice < len(dias))
+    primeiro = negocio_ref if negocio_ref is not None else negocio_cand
+    return Divergencia(
+        "fita",
+        dia,
+        agente=int(primeiro["comprador"]),
+        ativo=int(primeiro["ativo"]),
+        referencia=negocio_ref,
+        candidato=negocio_cand,
+    )
+
+
+def comparar_trajetorias(
+    referencia: Dict[str, np.ndarray],
+    candidata: Dict[str, np.ndarray],
+    tolerancias: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> RelatorioDiferencial:
+    """
+    Compara duas trajetórias de `capturar_trajetoria`. Sem tolerância, os
+    valores precisam ser idênticos bit a bit; `tolerancias` associa a um campo
+    (como "precos", "sentimento" ou "fita", que vale para o preço dos
+    negócios) um par (rtol, atol) de `np.isclose`. Quantidades inteiras
+    (volumes, cotas, compradores) são sempre comparadas exatamente. Se a
+    referência traz só uma amostra do sentimento ("sentimento_agentes"), a
+    candidata é comparada nos mesmos agentes.
+    """
+    tolerancias = tolerancias or {}
+    desconhecidos = set(tolerancias) - set(CAMPOS_MERCADO + CAMPOS_AGENTES + ("fita",))
+    if desconhecidos:
+        raise ValueError(f"Campos desconhecidos: {', '.join(sorted(desconhecidos))}")
+    dias = referencia["dia"]
+    if len(candidata["dia"]) > len(dias):
+        dias = candidata["dia"]
+
+    amostra = referencia.get("sentimento_agentes")
+    divergencias = []
+    for campo in CAMPOS_MERCADO + CAMPOS_AGENTES:
+        agentes = amostra if campo == "sentimento" else None
+        painel = candidata[campo]
+        if agentes is not None and "sentimento_agentes" not in candidata:
+            painel = painel[:, agentes]
+        divergencia = _comparar_painel(
+            campo,
+            dias,
+            referencia[campo],
+            painel,
+            tolerancias.get(campo, (0.0, 0.0)),
+            agentes,
+        )
+        if divergencia is not None:
+            divergencias.append(divergencia)
+    divergencia = _comparar_fita(
+        referencia, candidata, tolerancias.get("fita", (0.0, 0.0))
+    )
+    if divergencia is not None:
+        divergencias.append(divergencia)
+    divergencias.sort(key=lambda divergencia: divergencia.dia)
+    return RelatorioDiferencial(divergencias)
+
+
+def executar_diferencial(
+    sim_params: dict,
+    candidato: Dict[str, Any],
+    sementes: Sequence[int] = (42,),
+    referencia: Optional[Dict[str, Any]] = None,
+    tolerancias: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> Dict[int, RelatorioDiferencial]:
+    """
+    Roda a referência (por padrão, `REFERENCIA`) e o candidato, ambos descritos
+    por sobrescritas da configuração, com cada semente, e compara as
+    trajetórias. O candidato parte da referência com `BASE_CANDIDATO`; por
+    exemplo, `{"mercado.motor_sentimento": "vetorizado"}` ou
+    `{"mercado.livro_modo": "continuo"}` somado a uma referência com o mesmo
+    livro. Sem `tolerancias`, usa `TOLERANCIAS_REFERENCIA`; `{}` exige
+    trajetórias idênticas bit a bit, como entre os motores otimizados.
+    """
+    referencia = REFERENCIA if referencia is None else referencia
+    tolerancias = TOLERANCIAS_REFERENCIA if tolerancias is None else tolerancias
+    relatorios = {}
+    for semente in sementes:
+        base = {"geral.random_seed": semente}
+        relatorios[semente] = comparar_trajetorias(
+            capturar_trajetoria(sim_params, {**referencia, **base}),
+            capturar_trajetoria(
+                sim_params, {**referencia, **BASE_CANDIDATO, **candidato, **base}
+            ),
+            tolerancias,
+        )
+    return relatorios
+
+
+def assinatura_configuracao(sim_params: dict) -> str:
+    """
+    Hash da configuração; uma referência gravada só vale para a mesma.
+    """
+    conteudo = json.dumps(sim_params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def _riqueza(trajetoria: Dict[str, np.ndarray]) -> np.ndarray:
+    # Mesma conta de `ColetorRegistros`: caixa + cotas @ preços, dia a dia
+    return np.array(
+        [
+            caixa + cotas @ precos
+            for caixa, cotas, precos in zip(
+                trajetoria["caixa"], trajetoria["cotas"], trajetoria["precos"]
+            )
+        ]
+    ).reshape(trajetoria["caixa"].shape)
+
+
+def gravar_referencia(
+    trajetoria: Dict[str, np.ndarray],
+    caminho: str,
+    sim_params: dict,
+    sobrescritas: Optional[Dict[str, Any]] = None,
+    paineis: bool = False,
+) -> None:
+    """
+    Grava uma trajetória de referência em `.npz` compactado: as séries do
+    mercado, a fita, caixa e cotas esparsos e o sentimento de
+    `AMOSTRA_SENTIMENTO` agentes ou, com `paineis`, de todos. Os metadados
+    registram as sobrescritas com que a trajetória foi capturada; ela precisa
+    ter sido capturada com `REFERENCIA` e, se `sobrescritas` for dado, com
+    exatamente essas sobrescritas, senão `ValueError`. Caixa e cotas
+    mudam só para quem negocia ou recebe dividendos, então são gravados como
+    o primeiro dia mais as mudanças (dia, posição, valor novo); a riqueza, que
+    é caixa + cotas × preço, é recalculada na leitura quando a conta reproduz
+    exatamente os valores gravados. A fita guarda o número de negócios por
+    dia em vez do dia de cada negócio, e inteiros usam o menor tipo que os
+    comporta. Nada disso perde precisão: a leitura devolve os arrays originais.
+    """
+    arrays = dict(trajetoria)
+    aplicadas = json.loads(str(arrays.pop("sobrescritas")))
+    if sobrescritas is not None and _json_sobrescritas(
+        sobrescritas
+    ) != _json_sobrescritas(aplicadas):
+        raise ValueError(
+            f"A trajetória foi capturada com as sobrescritas {aplicadas}, e não "
+            f"com {sobrescritas}."
+        )
+    fora_da_referencia = {
+        chave: valor
+        for chave, valor in REFERENCIA.items()
+        if aplicadas.get(chave) != valor
+    }
+    if fora_da_referencia:
+        raise ValueError(
+            "A trajetória não foi capturada com a implementação de referência: "
+            f"faltam as sobrescritas {fora_da_referencia}."
+        )
+    fita_dia = arrays.pop("fita_dia")
+    arrays["fita_por_dia"] = np.searchsorted(
+        fita_dia, trajetoria["dia"], side="right"
+    ) - np.searchsorted(fita_dia, trajetoria["dia"], side="left")
+    for nome in _PAINEIS_ESPARSOS:
+        painel = arrays.pop(nome)
+        planos = painel.reshape(len(painel), -1)
+        dias, posicoes = np.nonzero(planos[1:] != planos[:-1])
+        arrays[f"{nome}_inicial"] = planos[:1]
+        arrays[f"{nome}_forma"] = np.array(painel.shape)
+        arrays[f"{nome}_dias"] = (dias + 1).astype(np.int32)
+        arrays[f"{nome}_posicoes"] = posicoes.astype(np.int32)
+        arrays[f"{nome}_valores"] = planos[1:][dias, posicoes]
+    if np.array_equal(_riqueza(trajetoria), trajetoria["riqueza"]):
+        del arrays["riqueza"]
+    num_agentes = arrays["sentimento"].shape[1]
+    if not paineis and num_agentes > AMOSTRA_SENTIMENTO:
+        amostra = np.unique(
+            np.linspace(0, num_agentes - 1, AMOSTRA_SENTIMENTO).astype(np.int64)
+        )
+        arrays["sentimento"] = arrays["sentimento"][:, amostra]
+        arrays["sentimento_agentes"] = amostra
+
+    tipos = {}
+    for nome, array in arrays.items():
+        if np.issubdtype(array.dtype, np.integer) and array.size:
+            tipos[nome] = array.dtype.str
+            menor = np.promote_types(
+                np.min_scalar_type(int(array.min())),
+                np.min_scalar_type(int(array.max())),
+            )
+            arrays[nome] = array.astype(menor)
+
+    metadados = {
+        "versao": VERSAO_REFERENCIA,
+        "assinatura": assinatura_configuracao(sim_params),
+        "sobrescritas": aplicadas,
+        "tipos": tipos,
+    }
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    np.savez_compressed(caminho, metadados=np.array(json.dumps(metadados)), **arrays)
+
+
+def carregar_referencia(caminho: str) -> Tuple[Dict[str, np.ndarray], dict]:
+    """
+    Lê uma referência de `gravar_referencia`; devolve a trajetória e os
+    metadados (versão, assinatura da configuração e sobrescritas usadas). Com
+    sentimento amostrado, "sentimento_agentes" traz os agentes da amostra.
+    """
+    with np.load(caminho, allow_pickle=False) as dados:
+        arrays = {nome: dados[nome] for nome in dados.files}
+    metadados = json.loads(str(arrays.pop("metadados")))
+    if metadados["versao"] != VERSAO_REFERENCIA:
+        raise ValueError(
+            f"A referência em {caminho} está no formato {metadados['versao']}, e "
+            f"não no {VERSAO_REFERENCIA}; grave-a novamente com --gravar."
+        )
+    for nome, tipo in metadados["tipos"].items():
+        arrays[nome] = arrays[nome].astype(tipo)
+    arrays["fita_dia"] = np.repeat(arrays["dia"], arrays.pop("fita_por_dia"))
+    for nome in _PAINEIS_ESPARSOS:
+        forma = tuple(arrays.pop(f"{nome}_forma").tolist())
+        inicial = arrays.pop(f"{nome}_inicial")
+        dias, posicoes = arrays.pop(f"{nome}_dias"), arrays.pop(f"{nome}_posicoes")
+        mudancas = np.zeros((forma[0], inicial.shape[1]), dtype=inicial.dtype)
+        mudancas[0] = inicial[0]
+        mudancas[dias, posicoes] = arrays.pop(f"{nome}_valores")
+        # Cada posição repete o valor da sua última mudança até o dia
+        ultima = np.zeros(mudancas.shape, dtype=np.int64)
+        ultima[dias, posicoes] = dias
+        np.maximum.accumulate(ultima, axis=0, out=ultima)
+        planos = np.take_along_axis(mudancas, ultima, axis=0)
+        arrays[nome] = planos.reshape(forma)
+    if "riqueza" not in arrays:
+        arrays["riqueza"] = _riqueza(arrays)
+    return arrays, metadados
+
+
+def comparar_com_referencia(
+    sim_params: dict,
+    caminho: str,
+    candidato: Optional[Dict[str, Any]] = None,
+    tolerancias: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> RelatorioDiferencial:
+    """
+    Roda o candidato (sobrescritas aplicadas sobre as da referência gravada e
+    `BASE_CANDIDATO`) e o compara com a trajetória de `caminho`, sem repetir a
+    simulação de referência. A configuração precisa ser a mesma da gravação.
+    Sem `tolerancias`, usa `TOLERANCIAS_REFERENCIA`.
+    """
+    referencia, metadados = carregar_referencia(caminho)
+    if metadados["assinatura"] != assinatura_configuracao(sim_params):
+        raise ValueError(
+            f"A referência em {caminho} foi gravada com outra configuração; "
+            "grave-a novamente com --gravar."
+        )
+    trajetoria = capturar_trajetoria(
+        sim_params,
+        {**metadados["sobrescritas"], **BASE_CANDIDATO, **(candidato or {})},
+    )
+    tolerancias = TOLERANCIAS_REFERENCIA if tolerancias is None else tolerancias
+    return comparar_trajetorias(referencia, trajetoria, tolerancias)
+
+
+def _sobrescritas(textos: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    "chave=valor" para cada texto; o valor é lido como JSON quando possível.
+    """
+    sobrescritas = {}
+    for texto in textos or []:
+        chave, separador, valor = texto.partition("=")
+        if not separador:
+            raise ValueError(f"Sobrescrita inválida {texto!r}; use chave=valor.")
+        try:
+            sobrescritas[chave] = json.loads(valor)
+        except json.JSONDecodeError:
+            sobrescritas[chave] = valor
+    return sobrescritas
+
+
+def _tolerancias(textos: Optional[List[str]]) -> Dict[str, Tuple[float, float]]:
+    tolerancias = {}
+    for texto in textos or []:
+        campo, _, valores = texto.partition("=")
+        rtol, _, atol = valores.partition(",")
+        tolerancias[campo] = (float(rtol or 0), float(atol or 0))
+    return tolerancias
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compara a trajetória de um motor candidato com a da "
+        "implementação de referência."
+    )
+    parser.add_argument("--config", default="config/parametros.json")
+    parser.add_argument(
+        "--candidato",
+        action="append",
+        metavar="CHAVE=VALOR",
+        help="Sobrescrita que define o candidato, como "
+        "mercado.motor_sentimento=vetorizado (repetível).",
+    )
+    parser.add_argument("--sementes", default=None)
+    parser.add_argument(
+        "--tolerancia",
+        action="append",
+        metavar="CAMPO=RTOL,ATOL",
+        help="Tolerância de um campo, como precos=1e-9,0 (repetível).",
+    )
+    parser.add_argument(
+        "--exato",
+        action="store_true",
+        help="Sem --referencia, compara bit a bit com o motor por agente serial "
+        "otimizado, em vez da implementação de referência com tolerância.",
+    )
+    parser.add_argument(
+        "--referencia",
+        default=None,
+        help="Trajetória de referência gravada; evita repetir a simulação.",
+    )
+    parser.add_argument(
+        "--gravar",
+        default=None,
+        help="Grava a trajetória de referência da configuração neste arquivo.",
+    )
+    parser.add_argument(
+        "--paineis",
+        action="store_true",
+        help="Com --gravar, grava o sentimento de todos os agentes, e não só "
+        f"de uma amostra de {AMOSTRA_SENTIMENTO}.",
+    )
+    args = parser.parse_args(argv)
+
+    sim_params = carregar_parametros(args.config)
+    candidato = _sobrescritas(args.candidato)
+    # As tolerâncias informadas somam-se às da referência; com --exato, são
+    # as únicas
+    tolerancias = _tolerancias(args.tolerancia)
+    if not args.exato:
+        tolerancias = {**TOLERANCIAS_REFERENCIA, **tolerancias}
+    if args.gravar:
+        # O candidato, se houver, entra na gravação, como um livro contínuo
+        sobrescritas = {**REFERENCIA, **candidato}
+        gravar_referencia(
+            capturar_trajetoria(sim_params, sobrescritas),
+            args.gravar,
+            sim_params,
+            sobrescritas,
+            paineis=args.paineis,
+        )
+        print(f"Trajetória de referência gravada em {args.gravar}")
+        return 0
+
+    if args.referencia:
+        relatorios = {
+            "referência gravada": comparar_com_referencia(
+                sim_params, args.referencia, candidato, tolerancias
+            )
+        }
+    else:
+        sementes = (
+            [int(semente) for semente in args.sementes.split(",") if semente]
+            if args.sementes
+            else [sim_params["geral"].get("random_seed", 42)]
+        )
+        referencia = {**REFERENCIA, **BASE_CANDIDATO} if args.exato else None
+        relatorios = executar_diferencial(
+            sim_params, candidato, sementes, referencia, tolerancias
+        )
+    for rotulo, relatorio in relatorios.items():
+        print(f"[{rotulo}] {relatorio.formatar()}")
+    return 0 if all(relatorio.identicas for relatorio in relatorios.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
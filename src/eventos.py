@@ -0,0 +1,76 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .configuracao import TIPOS_EVENTO
+
+
+@dataclass(frozen=True)
+class Evento:
+    """
+    Evento da agenda: `ativo` é o índice do FII afetado (None para todos ou
+    para eventos sem ativo) e `valores` traz os pares (nome, valor) do evento,
+    como ("valor", -1.5) em um choque de notícia ou ("taxa_selic", 0.1) em uma
+    decisão de juros.
+    """
+
+    tipo: str
+    ativo: Optional[int] = None
+    valores: Tuple[Tuple[str, float], ...] = ()
+
+
+class AgendaEventos:
+    """
+    Agenda dos eventos do mercado: periódicos, nos dias em que
+    `dia % frequencia == defasagem`, e pontuais, em um dia fixo.
+
+    Os periódicos de cada tipo ficam em arrays (frequência, defasagem), de modo
+    que saber quais ocorrem no dia custa uma operação numpy por tipo, mesmo com
+    um evento por fundo em universos com centenas de FIIs; os pontuais ficam
+    indexados pelo dia. `eventos_do_dia` devolve os eventos na ordem de
+    `TIPOS_EVENTO` e, dentro de um tipo, na ordem em que foram agendados.
+    """
+
+    def __init__(self):
+        self._periodicos: Dict[str, List[Tuple[int, int, Evento]]] = {
+            tipo: [] for tipo in TIPOS_EVENTO
+        }
+        self._calendarios: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pontuais: Dict[int, List[Evento]] = {}
+
+    def agendar_periodico(
+        self, evento: Evento, frequencia: int, defasagem: int = 0
+    ) -> None:
+        if evento.tipo not in self._periodicos:
+            raise ValueError(f"Tipo de evento desconhecido: {evento.tipo!r}")
+        if frequencia < 1:
+            raise ValueError("A frequência de um evento deve ser de pelo menos 1 dia.")
+        self._periodicos[evento.tipo].append(
+            (int(frequencia), int(defasagem) % int(frequencia), evento)
+        )
+        self._calendarios.pop(evento.tipo, None)
+
+    def agendar(self, evento: Evento, dia: int) -> None:
+        if evento.tipo not in self._periodicos:
+            raise ValueError(f"Tipo de evento desconhecido: {evento.tipo!r}")
+        self._pontuais.setdefault(int(dia), []).append(evento)
+
+    def _calendario(self, tipo: str) -> Tuple[np.ndarray, np.ndarray]:
+        if tipo not in self._calendarios:
+            periodicos = self._periodicos[tipo]
+            self._calendarios[tipo] = (
+                np.array([freq for freq, _, _ in periodicos], dtype=np.int64),
+                np.array([defasagem for _, defasagem, _ in periodicos], dtype=np.int64),
+            )
+        return self._calendarios[tipo]
+
+    def eventos_do_dia(self, dia: int) -> List[Evento]:
+        pontuais = self._pontuais.get(dia, ())
+        eventos = []
+        for tipo, periodicos in self._periodicos.items():
+            if periodicos:
+                frequencias, defasagens = self._calendario(tipo)
+                for indice in np.flatnonzero(dia % frequencias == defasagens).tolist():
+                    eventos.append(periodicos[indice][2])
+            eventos.extend(evento for evento in pontuais if evento.tipo == tipo)
+        return eventos
@@ -0,0 +1,281 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from multiprocessing import Pool
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .configuracao import EXECUTORES
+
+
+def _aplicar_lote(funcao: Callable[[Any], Any], lote: Sequence[Any]) -> List[Any]:
+    return [funcao(item) for item in lote]
+
+
+def _sem_trabalho(item: Any) -> Any:
+    return item
+
+
+class Executor:
+    """
+    Aplica uma função a uma lista de itens e devolve os resultados na ordem dos
+    itens. Esta classe roda tudo no próprio processo; as subclasses distribuem
+    lotes de `tamanho_lote` itens entre `num_trabalhadores` threads ou processos,
+    criados só no primeiro uso e liberados por `fechar()` ou ao sair de um
+    bloco `with`.
+    """
+
+    nome = "serial"
+
+    def __init__(self, num_trabalhadores: int = 1, tamanho_lote: Optional[int] = None):
+        self.num_trabalhadores = max(int(num_trabalhadores), 1)
+        self.tamanho_lote = tamanho_lote
+
+    def lote_para(self, num_itens: int) -> int:
+        """
+        Tamanho de lote usado para `num_itens` itens; sem um valor fixo, quatro
+        lotes por trabalhador, para equilibrar a carga sem multiplicar despachos.
+        """
+        if self.tamanho_lote is not None:
+            return max(int(self.tamanho_lote), 1)
+        return max(math.ceil(num_itens / (4 * self.num_trabalhadores)), 1)
+
+    def mapear(self, funcao: Callable[[Any], Any], itens: Sequence[Any]) -> List[Any]:
+        return [funcao(item) for item in itens]
+
+    def medir_despacho(self) -> float:
+        """
+        Custo, em segundos, de despachar um lote vazio a cada trabalhador,
+        dividido pelo número de trabalhadores: a parte serial de cada despacho.
+        """
+        self.mapear_lotes(_sem_trabalho, list(range(self.num_trabalhadores)), 1)
+        inicio = time.perf_counter()
+        self.mapear_lotes(_sem_trabalho, list(range(self.num_trabalhadores)), 1)
+        return (time.perf_counter() - inicio) / self.num_trabalhadores
+
+    def mapear_lotes(
+        self, funcao: Callable[[Any], Any], itens: Sequence[Any], tamanho_lote: int
+    ) -> List[Any]:
+        return self.mapear(funcao, itens)
+
+    def fechar(self) -> None:
+        pass
+
+    def __enter__(self) -> "Executor":
+        return self
+
+    def __exit__(self, *excecao) -> None:
+        self.fechar()
+
+
+class ExecutorSerial(Executor):
+    nome = "serial"
+
+    def medir_despacho(self) -> float:
+        return 0.0
+
+
+class ExecutorThreads(Executor):
+    """
+    Lotes em um pool de threads. Compensa quando a função passa a maior parte
+    do tempo em código que libera o GIL, como operações numpy grandes.
+    """
+
+    nome = "threads"
+
+    def __init__(self, num_trabalhadores: int = 1, tamanho_lote: Optional[int] = None):
+        super().__init__(num_trabalhadores, tamanho_lote)
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def mapear(self, funcao: Callable[[Any], Any], itens: Sequence[Any]) -> List[Any]:
+        return self.mapear_lotes(funcao, itens, self.lote_para(len(itens)))
+
+    def mapear_lotes(
+        self, funcao: Callable[[Any], Any], itens: Sequence[Any], tamanho_lote: int
+    ) -> List[Any]:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.num_trabalhadores)
+        lotes = [
+            itens[inicio : inicio + tamanho_lote]
+            for inicio in range(0, len(itens), tamanho_lote)
+        ]
+        resultados = []
+        for parcial in self._pool.map(partial(_aplicar_lote, funcao), lotes):
+            resultados.extend(parcial)
+        return resultados
+
+    def fechar(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+class ExecutorProcessos(Executor):
+    """
+    Lotes em um pool de processos (`multiprocessing.Pool`). Itens e resultados
+    são serializados a cada chamada, então só compensa quando o trabalho por
+    item supera com folga o custo de serialização.
+    """
+
+    nome = "processos"
+
+    def __init__(self, num_trabalhadores: int = 1, tamanho_lote: Optional[int] = None):
+        super().__init__(num_trabalhadores, tamanho_lote)
+        self._pool = None
+
+    def mapear(self, funcao: Callable[[Any], Any], itens: Sequence[Any]) -> List[Any]:
+        return self.mapear_lotes(funcao, itens, self.lote_para(len(itens)))
+
+    def mapear_lotes(
+        self, funcao: Callable[[Any], Any], itens: Sequence[Any], tamanho_lote: int
+    ) -> List[Any]:
+        if self._pool is None:
+            self._pool = Pool(processes=self.num_trabalhadores)
+        return self._pool.map(funcao, itens, chunksize=tamanho_lote)
+
+    def fechar(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+_CLASSES_EXECUTOR = {
+    classe.nome: classe
+    for classe in (ExecutorSerial, ExecutorThreads, ExecutorProcessos)
+}
+
+
+def criar_executor(
+    nome: str, num_trabalhadores: int = 1, tamanho_lote: Optional[int] = None
+) -> Executor:
+    """
+    Executor "serial", "threads" ou "processos". Com um único trabalhador, um
+    pool só acrescentaria custo de despacho, então o executor é serial.
+    """
+    if nome not in _CLASSES_EXECUTOR:
+        raise ValueError(
+            f"Executor desconhecido: {nome!r}; use um de {', '.join(EXECUTORES)}"
+        )
+    if num_trabalhadores <= 1:
+        nome = "serial"
+    return _CLASSES_EXECUTOR[nome](num_trabalhadores, tamanho_lote)
+
+
+BACKENDS_CALIBRACAO = ("serial", "vetorizado", "threads", "processos")
+
+
+class CalibradorExecutores:
+    """
+    Modo "auto": nos primeiros dias, executa o passo de sentimento com cada
+    candidato ("vetorizado", "serial", "threads", "processos") durante
+    `dias_por_candidato` dias, guarda o menor tempo de cada um e passa a usar o
+    mais rápido, fechando os demais pools. Como todos os candidatos produzem
+    os mesmos resultados, a calibração não altera a trajetória.
+
+    O custo por agente medido no dia serial é comparado ao custo de despacho
+    de cada pool: se o dia serial inteiro custa menos que `custo_minimo_paralelo`
+    segundos, os pools nem são criados; senão, o lote é o menor com trabalho de
+    pelo menos `razao_lote` vezes o custo de despachá-lo, limitado a um lote
+    por trabalhador.
+    """
+
+    def __init__(
+        self,
+        candidatos: Sequence[str],
+        num_trabalhadores: int,
+        num_itens: int,
+        tamanho_lote: Optional[int] = None,
+        dias_por_candidato: int = 2,
+        custo_minimo_paralelo: float = 0.02,
+        razao_lote: float = 10.0,
+    ):
+        self.num_trabalhadores = max(int(num_trabalhadores), 1)
+        self.num_itens = num_itens
+        self.tamanho_lote = tamanho_lote
+        self.dias_por_candidato = dias_por_candidato
+        self.custo_minimo_paralelo = custo_minimo_paralelo
+        self.razao_lote = razao_lote
+        self.medicoes: Dict[str, List[float]] = {}
+        self.executores: Dict[str, Executor] = {}
+        self.escolhido: Optional[str] = None
+        # O dia serial, quando há, vem primeiro: dele sai o custo por agente
+        self._pendentes = sorted(candidatos, key=BACKENDS_CALIBRACAO.index)
+        if self.num_trabalhadores == 1 or num_itens == 0:
+            self._pendentes = [
+                nome for nome in self._pendentes if nome in ("serial", "vetorizado")
+            ] or ["serial"]
+        self._atual: Optional[str] = None
+        if len(self._pendentes) == 1:
+            self._escolher(self._pendentes[0])
+
+    @property
+    def concluida(self) -> bool:
+        return self.escolhido is not None
+
+    def proximo(self) -> Tuple[str, Optional[Executor]]:
+        """
+        Backend a usar no próximo dia e seu executor (None para "vetorizado").
+        """
+        nome = self.escolhido if self.concluida else self._pendentes[0]
+        self._atual = nome
+        return nome, self._executor(nome)
+
+    def registrar(self, segundos: float) -> None:
+        """
+        Tempo do passo de sentimento no dia executado com o último `proximo()`.
+        """
+        if self.concluida or self._atual is None:
+            return
+        medicoes = self.medicoes.setdefault(self._atual, [])
+        medicoes.append(segundos)
+        if len(medicoes) < self.dias_por_candidato:
+            return
+        self._pendentes.pop(0)
+        if self._atual == "serial":
+            self._descartar_paralelos(min(medicoes))
+        if not self._pendentes:
+            self._escolher(
+                min(self.medicoes, key=lambda nome: min(self.medicoes[nome]))
+            )
+
+    def _executor(self, nome: str) -> Optional[Executor]:
+        if nome == "vetorizado":
+            return None
+        if nome not in self.executores:
+            self.executores[nome] = criar_executor(
+                nome, self.num_trabalhadores, self.tamanho_lote
+            )
+            if self.tamanho_lote is None and nome != "serial":
+                self.executores[nome].tamanho_lote = self._lote_calibrado(
+                    self.executores[nome]
+                )
+        return self.executores[nome]
+
+    def _lote_calibrado(self, executor: Executor) -> int:
+        custo_item = self._custo_serial() / max(self.num_itens, 1)
+        lote_maximo = max(math.ceil(self.num_itens / self.num_trabalhadores), 1)
+        if custo_item <= 0:
+            return executor.lote_para(self.num_itens)
+        despacho = executor.medir_despacho()
+        lote = math.ceil(self.razao_lote * despacho / custo_item)
+        return min(max(lote, 1), lote_maximo)
+
+    def _custo_serial(self) -> float:
+        return min(self.medicoes.get("serial", [0.0]))
+
+    def _descartar_paralelos(self, custo_serial: float) -> None:
+        if custo_serial < self.custo_minimo_paralelo:
+            self._pendentes = [
+                nome for nome in self._pendentes if nome not in ("threads", "processos")
+            ]
+
+    def _escolher(self, nome: str) -> None:
+        self.escolhido = nome
+        for outro in list(self.executores):
+            if outro != nome:
+                self.executores.pop(outro).fechar()
+
+    def fechar(self) -> None:
+        for executor in self.executores.values():
+            executor.fechar()
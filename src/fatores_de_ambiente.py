@@ -1,23 +1,70 @@
 # src/environment_factors.py
 import numpy as np
+from typing import Dict, Optional
+
+from .cenarios import Cenario
+from .configuracao import CAMPOS_JUROS
 
 
 class BancoCentral:
-    def __init__(self, parametros: dict):
+    """
+    Variáveis macroeconômicas da simulação. Sem cenário, são constantes; com um
+    `Cenario`, `atualizar(dia)` lê os valores do dia nas trajetórias pré-calculadas.
+    Decisões de política (`decidir`) fixam variáveis e prevalecem sobre o cenário.
+    """
+
+    def __init__(self, parametros: dict, cenario: Optional[Cenario] = None):
         self.taxa_selic = parametros.get("taxa_selic", 0.15)
         self.expectativa_inflacao = parametros.get("expectativa_inflacao", 0.07)
         self.premio_risco = parametros.get("premio_risco", 0.08)
+        self.cenario = cenario
+        self.decisoes: Dict[str, float] = {}
+        if cenario is not None:
+            self.atualizar(0)
+
+    def atualizar(self, dia: int) -> None:
+        if self.cenario is None:
+            return
+        dia = min(dia, self.cenario.num_dias)
+        self.taxa_selic = float(self.cenario.taxa_selic[dia])
+        self.expectativa_inflacao = float(self.cenario.expectativa_inflacao[dia])
+        self.premio_risco = float(self.cenario.premio_risco[dia])
+        for nome, valor in self.decisoes.items():
+            setattr(self, nome, valor)
+
+    def decidir(self, **valores: float) -> None:
+        """
+        Aplica uma decisão de política, como `decidir(taxa_selic=0.1375)`; as
+        variáveis informadas mantêm o valor até uma nova decisão.
+        """
+        for nome, valor in valores.items():
+            if nome not in CAMPOS_JUROS:
+                raise ValueError(f"Variável do banco central desconhecida: {nome!r}")
+            self.decisoes[nome] = float(valor)
+            setattr(self, nome, float(valor))
 
 
 class Midia:
     """
     Classe responsável por simular a influência da mídia ao longo dos dias de simulação.
     Pode receber valores fixos ou gerar ruído normalmente distribuído com sigma.
+    Com um `Cenario`, apenas lê a trajetória de notícias pré-calculada, que já
+    inclui os valores fixos.
     """
 
-    def __init__(self, parametros: dict):
+    def __init__(self, parametros: dict, cenario: Optional[Cenario] = None):
         self.total_dias = parametros.get("num_dias", 252)
-        self.valor_atual = parametros.get("valor_inicial", 0)
+        self.cenario = cenario
+        if cenario is not None and cenario.num_dias < self.total_dias:
+            raise ValueError(
+                f"Cenário cobre {cenario.num_dias} dias; "
+                f"a simulação precisa de {self.total_dias}."
+            )
+        self.valor_atual = (
+            parametros.get("valor_inicial", 0)
+            if cenario is None
+            else float(cenario.news[0])
+        )
         self.sigma = parametros.get("sigma", 0.1)
 
         # Dicionário com valores fixos da mídia em determinados dias
@@ -35,8 +82,10 @@ class Midia:
 
         self.dia_atual += 1
 
+        if self.cenario is not None:
+            self.valor_atual = float(self.cenario.news[self.dia_atual])
         # Se houver valor fixo para o dia, utiliza-o
-        if self.dia_atual in self.valores_fixos:
+        elif self.dia_atual in self.valores_fixos:
             self.valor_atual = self.valores_fixos[self.dia_atual]
         else:
             variacao = np.random.normal(0, self.sigma)
@@ -44,3 +93,12 @@ class Midia:
 
         self.historico_valores.append(self.valor_atual)
         return self.valor_atual
+
+    def aplicar_choque(self, valor: float) -> float:
+        """
+        Soma um choque à notícia do dia, limitada a [-3, 3]. Sem cenário, o
+        passeio aleatório dos dias seguintes parte do valor chocado.
+        """
+        self.valor_atual = float(np.clip(self.valor_atual + valor, -3, 3))
+        self.historico_valores[-1] = self.valor_atual
+        return self.valor_atual
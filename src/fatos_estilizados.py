@@ -0,0 +1,171 @@
+import numpy as np
+from typing import Dict
+
+# As funções operam sobre o último eixo, de modo que um vetor (um dia por
+# posição) e uma matriz replicações × dias são tratados da mesma forma. Valores
+# NaN (por exemplo, retornos de preços não positivos ou de séries mais curtas
+# em um conjunto) são ignorados.
+
+
+def retornos_log(precos: np.ndarray) -> np.ndarray:
+    """
+    Retornos logarítmicos entre dias consecutivos; NaN quando algum dos dois
+    preços não é positivo.
+    """
+    precos = np.asarray(precos, dtype=float)
+    anteriores, atuais = precos[..., :-1], precos[..., 1:]
+    retornos = np.full(atuais.shape, np.nan)
+    validos = (anteriores > 0) & (atuais > 0)
+    retornos[validos] = np.log(atuais[validos]) - np.log(anteriores[validos])
+    return retornos
+
+
+def _media_validos(valores: np.ndarray, validos: np.ndarray) -> np.ndarray:
+    # Média por série sem avisos para séries sem nenhum valor válido
+    soma = np.where(validos, valores, 0.0).sum(axis=-1, keepdims=True)
+    return soma / np.maximum(validos.sum(axis=-1, keepdims=True), 1)
+
+
+def _desvios_da_media(valores: np.ndarray):
+    validos = ~np.isnan(valores)
+    return np.where(validos, valores - _media_validos(valores, validos), 0.0), validos
+
+
+def _somas_acumuladas(valores: np.ndarray) -> np.ndarray:
+    # Prefixo com zero: somas[..., j] - somas[..., i] soma as posições [i, j)
+    zeros = np.zeros(valores.shape[:-1] + (1,))
+    return np.concatenate([zeros, np.cumsum(valores, axis=-1)], axis=-1)
+
+
+def volatilidade_rolante(
+    retornos: np.ndarray, janela: int, dias_uteis_ano: int = 252
+) -> np.ndarray:
+    """
+    Desvio-padrão anualizado dos `janela` retornos anteriores a cada dia: a
+    posição i usa os retornos [i - janela, i) e as primeiras `janela` posições
+    ficam NaN. Usa somas acumuladas de x e x², em O(n) independentemente da
+    janela; os retornos são centrados antes para reduzir o cancelamento.
+    """
+    retornos = np.asarray(retornos, dtype=float)
+    resultado = np.full(retornos.shape, np.nan)
+    if retornos.shape[-1] <= janela:
+        return resultado
+
+    desvios, validos = _desvios_da_media(retornos)
+    s1 = _somas_acumuladas(desvios)
+    s2 = _somas_acumuladas(desvios * desvios)
+    contagem = _somas_acumuladas(validos.astype(float))
+
+    fim = np.arange(janela, retornos.shape[-1])
+    n = contagem[..., fim] - contagem[..., fim - janela]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = (s1[..., fim] - s1[..., fim - janela]) / n
+        variancia = (s2[..., fim] - s2[..., fim - janela]) / n - media * media
+    variancia = np.where(n >= 2, np.maximum(variancia, 0.0), np.nan)
+    resultado[..., janela:] = np.sqrt(variancia) * dias_uteis_ano**0.5
+    return resultado
+
+
+def curtose(retornos: np.ndarray) -> np.ndarray:
+    """
+    Curtose em excesso (0 para a normal) de cada série.
+    """
+    desvios, validos = _desvios_da_media(np.asarray(retornos, dtype=float))
+    n = validos.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        m2 = (desvios**2).sum(axis=-1) / n
+        m4 = (desvios**4).sum(axis=-1) / n
+        return m4 / (m2 * m2) - 3.0
+
+
+def autocorrelacao(valores: np.ndarray, max_defasagem: int = 20) -> np.ndarray:
+    """
+    Autocorrelação amostral das defasagens 0..`max_defasagem` de cada série,
+    com o estimador usual (autocovariância dividida por n e normalizada pela
+    variância). Todas as defasagens saem de uma única FFT, em O(n log n).
+    """
+    valores = np.asarray(valores, dtype=float)
+    centrados, _ = _desvios_da_media(valores)
+    n = valores.shape[-1]
+    tamanho = 1 << int(2 * n - 1).bit_length()
+    espectro = np.fft.rfft(centrados, n=tamanho, axis=-1)
+    autocovariancia = np.fft.irfft(espectro * np.conj(espectro), n=tamanho, axis=-1)
+    autocovariancia = autocovariancia[..., : max_defasagem + 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return autocovariancia / autocovariancia[..., :1]
+
+
+def agrupamento_volatilidade(
+    retornos: np.ndarray, max_defasagem: int = 20
+) -> np.ndarray:
+    """
+    Intensidade do agrupamento de volatilidade: média da autocorrelação dos
+    retornos absolutos nas defasagens 1..`max_defasagem`. Fica próxima de zero
+    para retornos independentes e positiva quando dias agitados se sucedem.
+    """
+    acf = autocorrelacao(np.abs(retornos), max_defasagem)
+    return acf[..., 1:].mean(axis=-1)
+
+
+def drawdowns(precos: np.ndarray) -> np.ndarray:
+    """
+    Queda relativa de cada dia em relação ao maior preço anterior (valores <= 0).
+    """
+    precos = np.asarray(precos, dtype=float)
+    picos = np.fmax.accumulate(precos, axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return precos / picos - 1.0
+
+
+def drawdown_maximo(precos: np.ndarray) -> np.ndarray:
+    return np.nanmin(drawdowns(precos), axis=-1)
+
+
+def indice_cauda(retornos: np.ndarray, fracao: float = 0.05) -> np.ndarray:
+    """
+    Estimador de Hill do índice de cauda dos retornos absolutos, usando os
+    `fracao` maiores valores de cada série. Caudas mais pesadas dão índices
+    menores; retornos de ações costumam ficar entre 2 e 5.
+    """
+    absolutos = np.abs(np.asarray(retornos, dtype=float))
+    absolutos = np.where(np.isnan(absolutos), 0.0, absolutos)
+    n = absolutos.shape[-1]
+    k = max(int(fracao * n), 1)
+    if n <= k:
+        return np.full(absolutos.shape[:-1], np.nan)
+    # Só as k + 1 maiores observações importam, então basta uma partição O(n)
+    maiores = np.partition(absolutos, n - k - 1, axis=-1)[..., n - k - 1 :]
+    limiar = maiores[..., :1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media_log = np.log(maiores[..., 1:] / limiar).mean(axis=-1)
+        indice = 1.0 / media_log
+    return np.where(limiar[..., 0] > 0, indice, np.nan)
+
+
+def resumo_fatos_estilizados(
+    precos: np.ndarray,
+    max_defasagem: int = 20,
+    fracao_cauda: float = 0.05,
+    dias_uteis_ano: int = 252,
+) -> Dict[str, np.ndarray]:
+    """
+    Estatísticas usuais de validação de modelos de mercado, uma por série de
+    preços: volatilidade anualizada, curtose, autocorrelação dos retornos e dos
+    retornos absolutos na defasagem 1, agrupamento de volatilidade, drawdown
+    máximo e índice de cauda.
+    """
+    retornos = retornos_log(precos)
+    acf_retornos = autocorrelacao(retornos, 1)
+    acf_absolutos = autocorrelacao(np.abs(retornos), 1)
+    desvios, validos = _desvios_da_media(retornos)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        desvio = np.sqrt((desvios**2).sum(axis=-1) / validos.sum(axis=-1))
+    return {
+        "volatilidade": desvio * dias_uteis_ano**0.5,
+        "curtose": curtose(retornos),
+        "acf_retornos_1": acf_retornos[..., 1],
+        "acf_absolutos_1": acf_absolutos[..., 1],
+        "agrupamento_volatilidade": agrupamento_volatilidade(retornos, max_defasagem),
+        "drawdown_maximo": drawdown_maximo(precos),
+        "indice_cauda": indice_cauda(retornos, fracao_cauda),
+    }
@@ -0,0 +1,366 @@
+import pickle
+import traceback
+import numpy as np
+from multiprocessing import Pipe, Process
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Union
+
+from .aleatoriedade import FluxosAleatorios
+from .configuracao import ParametrosInvestidor, ParametrosSentimento
+from .historico_de_mercado import HistoricoPrecos, num_precos, precos_desde
+from .instrumentacao import Instrumentacao
+from .populacao import PopulacaoInvestidores, precos_fechamento
+from .rede_social import RedeSocial
+from .utils import ServicoMediasMoveis
+
+
+class _ArraysCompartilhados:
+    """
+    Conjunto de arrays float64 alocados em memória compartilhada.
+
+    O processo principal cria os blocos; os trabalhadores se conectam pelos nomes.
+    """
+
+    FORMATOS = {
+        # Buffer duplo: o dia d lê a linha d % 2 e escreve a linha (d + 1) % 2,
+        # de modo que nenhum trabalhador sobrescreve sentimentos ainda em leitura.
+        "sentimento": lambda n: (2, n),
+        "RD": lambda n: (n,),
+        "preco_esperado": lambda n: (n,),
+        "riqueza": lambda n: (n,),
+        # Fundo do dia de cada agente, sorteado pelo processo principal, que
+        # conhece as carteiras
+        "ativo_foco": lambda n: (n,),
+    }
+
+    def __init__(self, num_agentes: int, nomes: Optional[Dict[str, str]] = None):
+        self.num_agentes = num_agentes
+        self.blocos: Dict[str, SharedMemory] = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        for chave, formato in self.FORMATOS.items():
+            shape = formato(num_agentes)
+            if nomes is None:
+                tamanho = max(1, int(np.prod(shape)) * 8)
+                bloco = SharedMemory(create=True, size=tamanho)
+            else:
+                bloco = SharedMemory(name=nomes[chave])
+            self.blocos[chave] = bloco
+            self.arrays[chave] = np.ndarray(shape, dtype=np.float64, buffer=bloco.buf)
+
+    @property
+    def nomes(self) -> Dict[str, str]:
+        return {chave: bloco.name for chave, bloco in self.blocos.items()}
+
+    def __getitem__(self, chave: str) -> np.ndarray:
+        return self.arrays[chave]
+
+    def fechar(self, remover: bool = False) -> None:
+        self.arrays.clear()
+        for bloco in self.blocos.values():
+            bloco.close()
+            if remover:
+                bloco.unlink()
+        self.blocos.clear()
+
+
+def _executar_fragmento(
+    conexao,
+    nomes: Dict[str, str],
+    num_agentes: int,
+    inicio: int,
+    fim: int,
+    lf: np.ndarray,
+    rede: RedeSocial,
+    parametros: ParametrosInvestidor,
+    historicos_precos: List[HistoricoPrecos],
+    historico_riqueza: np.ndarray,
+    num_registros_riqueza: int,
+    semente: int,
+    ativos: List[str],
+    estados_medias_moveis: Optional[List[Dict[str, Any]]] = None,
+) -> None:
+    """
+    Laço de um trabalhador: mantém seu fragmento de agentes e as séries de
+    preços de cada ativo durante toda a simulação e processa um broadcast por dia.
+    """
+    compartilhados = _ArraysCompartilhados(num_agentes, nomes)
+    try:
+        fragmento = PopulacaoInvestidores(
+            lf=lf,
+            caixa=np.zeros(fim - inicio),
+            cotas=np.zeros((fim - inicio, len(ativos))),
+            rede=rede,
+            parametros=parametros,
+            historico_riqueza=historico_riqueza,
+            num_registros_riqueza=num_registros_riqueza,
+            fluxos=FluxosAleatorios(semente, num_agentes),
+            primeiro_agente=inicio,
+            ativos=ativos,
+        )
+        fragmento.sentimento[:] = compartilhados["sentimento"][0, inicio:fim]
+        precos = historicos_precos
+        fragmento.servicos_medias_moveis = [
+            ServicoMediasMoveis(
+                serie,
+                fragmento.parametros.tipo_media_movel,
+                fragmento.parametros.media_movel,
+            )
+            for serie in precos
+        ]
+        for indice, servico in enumerate(fragmento.servicos_medias_moveis):
+            if estados_medias_moveis is not None:
+                servico.restaurar_estado(estados_medias_moveis[indice])
+            servico.registrar_janelas(fragmento.LF)
+        parametros_sentimento: Optional[ParametrosSentimento] = None
+
+        while True:
+            mensagem = conexao.recv()
+            if mensagem is None:
+                break
+            if mensagem == "estado":
+                conexao.send(
+                    [servico.estado() for servico in fragmento.servicos_medias_moveis]
+                )
+                continue
+            try:
+                for serie, servico, novos in zip(
+                    precos, fragmento.servicos_medias_moveis, mensagem["precos_novos"]
+                ):
+                    for preco in novos:
+                        serie.append(preco)
+                        servico.atualizar()
+                if mensagem["registrar_riqueza"]:
+                    fragmento.empilhar_riqueza(compartilhados["riqueza"][inicio:fim])
+                if mensagem["parametros_sentimento"] is not None:
+                    parametros_sentimento = mensagem["parametros_sentimento"]
+
+                if len(precos) > 1:
+                    fragmento.definir_ativos_foco(
+                        mensagem["dia_mercado"],
+                        compartilhados["ativo_foco"][inicio:fim].astype(np.int64),
+                    )
+                leitura = mensagem["dia"] % 2
+                sentimentos = compartilhados["sentimento"]
+                fragmento.calcular_sentimentos(
+                    historico_precos=(
+                        precos[0].precos
+                        if len(precos) == 1
+                        else [serie.precos for serie in precos]
+                    ),
+                    dividendos=mensagem["dividendos"],
+                    expectativa_inflacao=mensagem["expectativa_inflacao"],
+                    premio_risco=mensagem["premio_risco"],
+                    news=mensagem["news"],
+                    volatilidade=mensagem["volatilidade"],
+                    parametros_sentimento=parametros_sentimento,
+                    sentimentos_vizinhanca=sentimentos[leitura],
+                    dia=mensagem["dia_mercado"],
+                    rodada=mensagem["rodada"],
+                    precos_atuais=mensagem["precos_atuais"],
+                )
+                sentimentos[1 - leitura, inicio:fim] = fragmento.sentimento
+                compartilhados["RD"][inicio:fim] = fragmento.RD
+                compartilhados["preco_esperado"][inicio:fim] = fragmento.preco_esperado
+                conexao.send(True)
+            except Exception:
+                traceback.print_exc()
+                conexao.send(False)
+    finally:
+        compartilhados.fechar()
+        conexao.close()
+
+
+def _copia_compacta(serie) -> HistoricoPrecos:
+    # Só os preços retidos seguem para o trabalhador, com a mesma janela e a
+    # mesma contagem absoluta usada pelas médias móveis
+    return HistoricoPrecos(
+        serie, janela=getattr(serie, "janela", None), total=num_precos(serie)
+    )
+
+
+class ExecutorFragmentado:
+    """
+    Executa o passo de sentimento em processos persistentes, cada um dono de um
+    fragmento fixo da população durante toda a simulação.
+
+    A cada dia os trabalhadores recebem apenas um broadcast pequeno (notícia,
+    expectativas do BC, preços novos e volatilidade de cada ativo); os
+    sentimentos dos vizinhos e os resultados trafegam por memória compartilhada.
+    """
+
+    def __init__(
+        self,
+        populacao: PopulacaoInvestidores,
+        historicos_precos: List[List[float]],
+        num_processos: int,
+    ):
+        """
+        `historicos_precos` traz uma série de preços por ativo da população.
+        """
+        self.populacao = populacao
+        self.instrumentacao = Instrumentacao(ativa=False)
+        n = populacao.num_agentes
+        num_processos = max(1, min(num_processos, n))
+
+        self.compartilhados = _ArraysCompartilhados(n)
+        self.compartilhados["sentimento"][0] = populacao.sentimento
+        self._dia = 0
+        self._precos_enviados = [num_precos(serie) for serie in historicos_precos]
+        self._riqueza_pendente = False
+        self._parametros_enviados: Optional[ParametrosSentimento] = None
+
+        limites = np.linspace(0, n, num_processos + 1).astype(int)
+        # Todos os fragmentos derivam os sorteios da mesma semente, indexados
+        # pelo agente global, como no motor vetorizado
+        if populacao.fluxos is not None:
+            semente = populacao.fluxos.semente
+        else:
+            semente = int(np.random.randint(0, 2**31 - 1))
+        estados_medias_moveis = (
+            [servico.estado() for servico in populacao.servicos_medias_moveis]
+            if populacao.servicos_medias_moveis is not None
+            else None
+        )
+        self.conexoes = []
+        self.processos = []
+        for k in range(num_processos):
+            inicio, fim = int(limites[k]), int(limites[k + 1])
+            conexao_local, conexao_remota = Pipe()
+            processo = Process(
+                target=_executar_fragmento,
+                args=(
+                    conexao_remota,
+                    self.compartilhados.nomes,
+                    n,
+                    inicio,
+                    fim,
+                    populacao.LF[inicio:fim],
+                    populacao.rede.fatia(inicio, fim),
+                    populacao.parametros,
+                    [_copia_compacta(serie) for serie in historicos_precos],
+                    populacao.riqueza_recente[inicio:fim],
+                    populacao.num_registros_riqueza,
+                    semente,
+                    populacao.ativos,
+                    estados_medias_moveis,
+                ),
+                daemon=True,
+            )
+            processo.start()
+            conexao_remota.close()
+            self.conexoes.append(conexao_local)
+            self.processos.append(processo)
+
+    def calcular_sentimentos(
+        self,
+        historico_precos,
+        dividendos,
+        expectativa_inflacao: float,
+        premio_risco: float,
+        news: float,
+        volatilidade,
+        parametros_sentimento: Union[ParametrosSentimento, Dict[str, Any]],
+        dia: int = 0,
+        rodada: int = 0,
+        precos_atuais: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Envia o broadcast do dia (ou da rodada), aguarda os fragmentos e copia os
+        resultados da memória compartilhada para a população do processo
+        principal. Os argumentos seguem `PopulacaoInvestidores.calcular_sentimentos`.
+        """
+        series = (
+            [historico_precos]
+            if self.populacao.num_ativos == 1
+            else list(historico_precos)
+        )
+        if self.populacao.num_ativos > 1:
+            self.compartilhados["ativo_foco"][:] = self.populacao.ativos_foco(
+                dia, precos_fechamento(series)
+            )
+        parametros_sentimento = ParametrosSentimento.resolver(parametros_sentimento)
+        enviar_parametros = parametros_sentimento != self._parametros_enviados
+        mensagem = {
+            "dia": self._dia,
+            "dia_mercado": dia,
+            "rodada": rodada,
+            "precos_atuais": precos_atuais,
+            "precos_novos": [
+                precos_desde(serie, enviados).tolist()
+                for serie, enviados in zip(series, self._precos_enviados)
+            ],
+            "registrar_riqueza": self._riqueza_pendente,
+            "dividendos": dividendos,
+            "expectativa_inflacao": expectativa_inflacao,
+            "premio_risco": premio_risco,
+            "news": news,
+            "volatilidade": volatilidade,
+            "parametros_sentimento": (
+                parametros_sentimento if enviar_parametros else None
+            ),
+        }
+        if self.instrumentacao.ativa:
+            self.instrumentacao.contar(
+                "bytes_ipc",
+                len(pickle.dumps(mensagem, pickle.HIGHEST_PROTOCOL))
+                * len(self.conexoes),
+            )
+        for conexao in self.conexoes:
+            conexao.send(mensagem)
+        respostas = [conexao.recv() for conexao in self.conexoes]
+        if not all(respostas):
+            raise RuntimeError("Falha no processamento de um fragmento de agentes.")
+
+        if enviar_parametros:
+            self._parametros_enviados = parametros_sentimento
+        self._precos_enviados = [num_precos(serie) for serie in series]
+        self._riqueza_pendente = False
+        escrita = 1 - self._dia % 2
+        self._dia += 1
+
+        self.populacao.sentimento = self.compartilhados["sentimento"][escrita].copy()
+        self.populacao.RD = self.compartilhados["RD"].copy()
+        self.populacao.preco_esperado = self.compartilhados["preco_esperado"].copy()
+
+    def estado_medias_moveis(self) -> List[Dict[str, Any]]:
+        """
+        União, por ativo, dos acumuladores de médias móveis dos fragmentos.
+        Todos processaram as mesmas séries de preços, então uma janela presente
+        em mais de um fragmento tem o mesmo valor em todos.
+        """
+        for conexao in self.conexoes:
+            conexao.send("estado")
+        estados = [conexao.recv() for conexao in self.conexoes]
+        uniao = []
+        for estados_ativo in zip(*estados):
+            acumuladores = {}
+            for estado in estados_ativo:
+                acumuladores.update(estado["acumuladores"])
+            uniao.append(
+                {
+                    "num_processados": estados_ativo[0]["num_processados"],
+                    "acumuladores": acumuladores,
+                }
+            )
+        return uniao
+
+    def registrar_riqueza(self, riqueza: np.ndarray) -> None:
+        """
+        Publica a riqueza do dia; os fragmentos a incorporam no próximo broadcast.
+        """
+        self.compartilhados["riqueza"][:] = riqueza
+        self._riqueza_pendente = True
+
+    def fechar(self) -> None:
+        for conexao in self.conexoes:
+            try:
+                conexao.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for processo in self.processos:
+            processo.join()
+        for conexao in self.conexoes:
+            conexao.close()
+        self.conexoes = []
+        self.processos = []
+        self.compartilhados.fechar(remover=True)
@@ -0,0 +1,197 @@
+import numpy as np
+from typing import Dict, Iterable, Optional
+
+
+class HistoricoPrecos:
+    """
+    Série de preços do mercado em um buffer pré-alocado que cresce por duplicação.
+
+    Acréscimos diários não copiam o histórico; leituras devolvem views do buffer.
+    Suporta a interface de lista usada pelo restante do modelo (`append`, `len`,
+    índices e fatias) e pode ser passado diretamente para funções numpy.
+
+    Com `janela`, apenas os últimos `janela` preços são mantidos, em um buffer
+    fixo de 2 × `janela` posições que é compactado quando enche (uma cópia a
+    cada `janela` acréscimos). `len` e as leituras se referem aos preços
+    retidos; `total` conta todos os preços já acrescentados, para quem acompanha
+    a série por posição absoluta.
+    """
+
+    def __init__(
+        self,
+        precos_iniciais: Iterable[float] = (),
+        capacidade: int = 0,
+        janela: Optional[int] = None,
+        total: Optional[int] = None,
+    ):
+        precos_iniciais = np.asarray(list(precos_iniciais), dtype=float)
+        self.total = len(precos_iniciais) if total is None else int(total)
+        self.janela = janela
+        if janela is not None:
+            precos_iniciais = precos_iniciais[max(len(precos_iniciais) - janela, 0) :]
+            capacidade = 2 * janela
+        capacidade = max(capacidade, len(precos_iniciais), 1)
+        self._dados = np.empty(capacidade, dtype=float)
+        self._inicio = 0
+        self._fim = len(precos_iniciais)
+        self._dados[: self._fim] = precos_iniciais
+
+    @property
+    def precos(self) -> np.ndarray:
+        return self._dados[self._inicio : self._fim]
+
+    def append(self, preco: float) -> None:
+        if self._fim == len(self._dados):
+            if self.janela is None:
+                novo = np.empty(2 * len(self._dados), dtype=float)
+                novo[: self._fim] = self._dados[: self._fim]
+                self._dados = novo
+            else:
+                manter = self.janela - 1
+                self._dados[:manter] = self._dados[self._fim - manter : self._fim]
+                self._inicio, self._fim = 0, manter
+        self._dados[self._fim] = preco
+        self._fim += 1
+        self.total += 1
+        if self.janela is not None and self._fim - self._inicio > self.janela:
+            self._inicio += 1
+
+    def desde(self, total_anterior: int) -> np.ndarray:
+        """
+        Preços acrescentados depois que a série tinha `total_anterior` preços.
+        """
+        novos = self.total - total_anterior
+        if novos > len(self):
+            raise ValueError("Preços pedidos já saíram da janela retida.")
+        return self.precos[len(self) - novos :]
+
+    def tolist(self) -> list:
+        return self.precos.tolist()
+
+    def __len__(self) -> int:
+        return self._fim - self._inicio
+
+    def __getitem__(self, indice):
+        return self.precos[indice]
+
+    def __iter__(self):
+        return iter(self.precos)
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return np.array(self.precos, dtype=dtype)
+        return np.asarray(self.precos, dtype=dtype)
+
+
+def num_precos(serie) -> int:
+    """
+    Total de preços já observados em `serie`, retidos ou não.
+    """
+    return getattr(serie, "total", len(serie))
+
+
+def precos_desde(serie, total_anterior: int) -> np.ndarray:
+    if isinstance(serie, HistoricoPrecos):
+        return serie.desde(total_anterior)
+    return np.asarray(serie[total_anterior:], dtype=float)
+
+
+class HistoricoRiqueza:
+    """
+    Riqueza de todos os agentes em uma matriz agentes × dias pré-alocada.
+
+    O registro diário escreve uma coluna inteira; cada agente lê sua linha como
+    view. Com `janela`, apenas os últimos `janela` registros são mantidos, como
+    em `HistoricoPrecos`.
+    """
+
+    def __init__(
+        self,
+        riqueza_inicial: np.ndarray,
+        capacidade_dias: int = 0,
+        janela: Optional[int] = None,
+    ):
+        riqueza_inicial = np.asarray(riqueza_inicial, dtype=float)
+        if riqueza_inicial.ndim == 1:
+            riqueza_inicial = riqueza_inicial[:, np.newaxis]
+        self.janela = janela
+        if janela is not None:
+            riqueza_inicial = riqueza_inicial[
+                :, max(riqueza_inicial.shape[1] - janela, 0) :
+            ]
+            capacidade_dias = 2 * janela
+        self.num_agentes, self._fim = riqueza_inicial.shape
+        self._inicio = 0
+        capacidade = max(capacidade_dias, self._fim, 1)
+        self._dados = np.empty((self.num_agentes, capacidade), dtype=float)
+        self._dados[:, : self._fim] = riqueza_inicial
+
+    @property
+    def riqueza(self) -> np.ndarray:
+        return self._dados[:, self._inicio : self._fim]
+
+    def linha(self, indice: int) -> np.ndarray:
+        return self._dados[indice, self._inicio : self._fim]
+
+    def registrar(self, riqueza: np.ndarray) -> None:
+        if self._fim == self._dados.shape[1]:
+            if self.janela is None:
+                novo = np.empty(
+                    (self.num_agentes, 2 * self._dados.shape[1]), dtype=float
+                )
+                novo[:, : self._fim] = self._dados[:, : self._fim]
+                self._dados = novo
+            else:
+                manter = self.janela - 1
+                self._dados[:, :manter] = self._dados[:, self._fim - manter : self._fim]
+                self._inicio, self._fim = 0, manter
+        self._dados[:, self._fim] = riqueza
+        self._fim += 1
+        if self.janela is not None and self._fim - self._inicio > self.janela:
+            self._inicio += 1
+
+    def __len__(self) -> int:
+        return self._fim - self._inicio
+
+
+class HistoricoMercado:
+    """
+    Históricos compartilhados por todos os agentes de um mercado: uma série de
+    preços por FII e a matriz de riqueza, lidas pelos investidores através de
+    views. `precos` é a série do primeiro FII.
+    Com `janela_precos` e `janela_riqueza`, ambos ficam limitados a essas janelas.
+    """
+
+    def __init__(
+        self,
+        precos_iniciais: Iterable[float],
+        riqueza_inicial: np.ndarray,
+        capacidade_dias: Optional[int] = None,
+        janela_precos: Optional[int] = None,
+        janela_riqueza: Optional[int] = None,
+        total_precos: Optional[int] = None,
+    ):
+        precos_iniciais = list(precos_iniciais)
+        capacidade_dias = capacidade_dias or 0
+        self.precos = HistoricoPrecos(
+            precos_iniciais,
+            capacidade=len(precos_iniciais) + capacidade_dias,
+            janela=janela_precos,
+            total=total_precos,
+        )
+        self.riqueza = HistoricoRiqueza(
+            riqueza_inicial, capacidade_dias + 1, janela=janela_riqueza
+        )
+        self._precos_ativos: Dict[str, HistoricoPrecos] = {}
+
+    def adicionar_ativo(self, ativo: str, serie: HistoricoPrecos) -> None:
+        """
+        Registra a série de preços do FII `ativo`, lida por `precos_de`.
+        """
+        self._precos_ativos[ativo] = serie
+
+    def precos_de(self, ativo: str) -> np.ndarray:
+        """
+        Preços do FII `ativo`; sem uma série registrada para ele, os do mercado.
+        """
+        return self._precos_ativos.get(ativo, self.precos).precos
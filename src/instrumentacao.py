@@ -0,0 +1,140 @@
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+_SEM_MEDICAO = nullcontext()
+
+
+class _Fase:
+    __slots__ = ("instrumentacao", "nome", "inicio")
+
+    def __init__(self, instrumentacao: "Instrumentacao", nome: str):
+        self.instrumentacao = instrumentacao
+        self.nome = nome
+
+    def __enter__(self) -> None:
+        self.inicio = time.perf_counter_ns()
+
+    def __exit__(self, *excecao) -> None:
+        fim = time.perf_counter_ns()
+        instrumentacao = self.instrumentacao
+        instrumentacao._eventos.append(
+            (instrumentacao.dia, self.nome, self.inicio, fim - self.inicio)
+        )
+
+
+class Instrumentacao:
+    """
+    Tempos por fase e contadores por dia do `Mercado`, habilitados sob demanda.
+
+    Desativada, `fase()` devolve sempre o mesmo contexto vazio e `contar()`
+    retorna imediatamente, de modo que o custo no laço diário é uma chamada de
+    método. Ativada, cada fase vira um evento (dia, fase, início, duração) e os
+    contadores são somados por dia. Os dados ficam disponíveis como tabela
+    (`tabela()`) e podem ser gravados no formato Chrome Trace Event
+    (`salvar_trace()`), lido por chrome://tracing e pelo Perfetto.
+    """
+
+    def __init__(self, ativa: bool = True):
+        self.ativa = ativa
+        self.dia = 0
+        self._eventos: List[Tuple[int, str, int, int]] = []
+        self._contadores: Dict[int, Dict[str, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        self._origem = time.perf_counter_ns()
+
+    def iniciar_dia(self, dia: int) -> None:
+        self.dia = dia
+
+    def fase(self, nome: str):
+        if not self.ativa:
+            return _SEM_MEDICAO
+        return _Fase(self, nome)
+
+    def contar(self, nome: str, valor: float = 1) -> None:
+        if self.ativa:
+            self._contadores[self.dia][nome] += valor
+
+    def tabela(self) -> pd.DataFrame:
+        """
+        Uma linha por dia: tempo de cada fase em segundos (`tempo_<fase>`),
+        tempo total medido e os contadores do dia.
+        """
+        linhas: Dict[int, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for dia, nome, _, duracao in self._eventos:
+            linhas[dia][f"tempo_{nome}"] += duracao / 1e9
+        for dia, contadores in self._contadores.items():
+            linhas[dia].update(contadores)
+        tabela = pd.DataFrame.from_dict(
+            {dia: dict(valores) for dia, valores in linhas.items()}, orient="index"
+        ).sort_index()
+        tabela.index.name = "dia"
+        tabela = tabela.fillna(0)
+        colunas_tempo = [c for c in tabela.columns if c.startswith("tempo_")]
+        tabela["tempo_total"] = tabela[colunas_tempo].sum(axis=1)
+        return tabela
+
+    def resumo_fases(self) -> pd.DataFrame:
+        """
+        Tempo total, médio por dia e fração do tempo medido de cada fase.
+        """
+        tabela = self.tabela()
+        colunas = [c for c in tabela.columns if c.startswith("tempo_")]
+        colunas.remove("tempo_total")
+        totais = tabela[colunas].sum()
+        resumo = pd.DataFrame(
+            {
+                "total_s": totais,
+                "media_por_dia_s": tabela[colunas].mean(),
+                "fracao": totais / totais.sum() if totais.sum() > 0 else 0.0,
+            }
+        )
+        resumo.index = [c[len("tempo_") :] for c in colunas]
+        return resumo.sort_values("total_s", ascending=False)
+
+    def eventos_trace(self) -> List[dict]:
+        pid = os.getpid()
+        eventos = [
+            {
+                "name": nome,
+                "cat": "fase",
+                "ph": "X",
+                "ts": (inicio - self._origem) / 1e3,
+                "dur": duracao / 1e3,
+                "pid": pid,
+                "tid": 0,
+                "args": {"dia": dia},
+            }
+            for dia, nome, inicio, duracao in self._eventos
+        ]
+        # Contadores no início de cada dia, como séries do trace
+        inicio_dia: Dict[int, int] = {}
+        for dia, _, inicio, _ in self._eventos:
+            inicio_dia.setdefault(dia, inicio)
+        for dia, contadores in sorted(self._contadores.items()):
+            ts = (inicio_dia.get(dia, self._origem) - self._origem) / 1e3
+            for nome, valor in contadores.items():
+                eventos.append(
+                    {
+                        "name": nome,
+                        "cat": "contador",
+                        "ph": "C",
+                        "ts": ts,
+                        "pid": pid,
+                        "args": {nome: valor},
+                    }
+                )
+        return eventos
+
+    def salvar_trace(self, caminho: str) -> None:
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.eventos_trace(), "displayTimeUnit": "ms"}, f)
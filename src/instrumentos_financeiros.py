@@ -1,8 +1,176 @@
 import numpy as np
-from typing import List
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .configuracao import ParametrosFII
+
+
+class CarteiraImoveis:
+    """
+    Imóveis de um FII em arrays paralelos: valor, vacância, custo de manutenção,
+    fator de aluguel, desvio do ruído de vacância e aluguel corrente.
+
+    Cada campo é uma linha de uma matriz pré-alocada que cresce por duplicação,
+    de modo que fluxo de aluguel, valor total e reavaliação são operações
+    vetorizadas sobre todos os imóveis, com um único sorteio de ruído por fluxo.
+    """
+
+    CAMPOS = (
+        "valor",
+        "vacancia",
+        "custo_manutencao",
+        "aluguel_fator",
+        "desvio_normal",
+        "aluguel",
+    )
+
+    def __init__(self, capacidade: int = 0):
+        self._dados = np.empty((len(self.CAMPOS), max(capacidade, 1)))
+        self._tamanho = 0
+        self.params: List[dict] = []
+
+    def __len__(self) -> int:
+        return self._tamanho
+
+    def _campo(self, indice_campo: int) -> np.ndarray:
+        return self._dados[indice_campo, : self._tamanho]
+
+    @property
+    def valor(self) -> np.ndarray:
+        return self._campo(0)
+
+    @property
+    def vacancia(self) -> np.ndarray:
+        return self._campo(1)
+
+    @property
+    def custo_manutencao(self) -> np.ndarray:
+        return self._campo(2)
+
+    @property
+    def aluguel_fator(self) -> np.ndarray:
+        return self._campo(3)
+
+    @property
+    def desvio_normal(self) -> np.ndarray:
+        return self._campo(4)
+
+    @property
+    def aluguel(self) -> np.ndarray:
+        return self._campo(5)
+
+    def adicionar_lote(
+        self,
+        valores: Sequence[float],
+        vacancias: Sequence[float],
+        custos_manutencao: Sequence[float],
+        params: Optional[Sequence[dict]] = None,
+    ) -> None:
+        """
+        Acrescenta vários imóveis de uma vez. Fator de aluguel e desvio do ruído
+        vêm de `params` de cada imóvel, como em `Imovel`.
+        """
+        valores = np.asarray(valores, dtype=float)
+        quantidade = len(valores)
+        params = [p or {} for p in params] if params else [{} for _ in valores]
+        fatores = np.array([p.get("aluguel_factor", 0.005) for p in params])
+        bloco = self._reservar(quantidade)
+        bloco[0] = valores
+        bloco[1] = vacancias
+        bloco[2] = custos_manutencao
+        bloco[3] = fatores
+        bloco[4] = [p.get("desvio_normal", 0.1) for p in params]
+        bloco[5] = valores * fatores
+        self.params.extend(params)
+
+    def adicionar(self, campos: Sequence[float], params: dict) -> int:
+        """
+        Acrescenta um imóvel com os valores de `CAMPOS` e devolve seu índice.
+        """
+        self._reservar(1)[:, 0] = campos
+        self.params.append(params)
+        return self._tamanho - 1
+
+    def _reservar(self, quantidade: int) -> np.ndarray:
+        novo_tamanho = self._tamanho + quantidade
+        if novo_tamanho > self._dados.shape[1]:
+            capacidade = max(novo_tamanho, 2 * self._dados.shape[1])
+            novo = np.empty((len(self.CAMPOS), capacidade))
+            novo[:, : self._tamanho] = self._dados[:, : self._tamanho]
+            self._dados = novo
+        bloco = self._dados[:, self._tamanho : novo_tamanho]
+        self._tamanho = novo_tamanho
+        return bloco
+
+    def gerar_fluxo_aluguel(self) -> np.ndarray:
+        """
+        Fluxo de aluguel de cada imóvel no período, com vacância ruidosa.
+        """
+        ruido = np.random.normal(0, self.desvio_normal)
+        vacancia_ajustada = self.vacancia * (1 + ruido)
+        return self.aluguel * (1 - vacancia_ajustada)
+
+    def valor_total(self) -> float:
+        return float(np.sum(self.valor))
+
+    def reavaliar(
+        self, inflacao: float, investimento_unitario: float, fator_aluguel: float
+    ) -> None:
+        """
+        Corrige os valores pela inflação, soma o reinvestimento de cada imóvel e
+        recalcula os aluguéis com o novo fator.
+        """
+        valor = self.valor
+        valor *= 1 + inflacao
+        valor += investimento_unitario
+        self.aluguel[:] = valor * fator_aluguel
+
+    def estado(self) -> Dict[str, Any]:
+        return {
+            "dados": self._dados[:, : self._tamanho].copy(),
+            "params": list(self.params),
+        }
+
+    @classmethod
+    def a_partir_de_estado(cls, estado: Dict[str, Any]) -> "CarteiraImoveis":
+        dados = np.asarray(estado["dados"], dtype=float)
+        carteira = cls(capacidade=dados.shape[1])
+        carteira._dados[:, : dados.shape[1]] = dados
+        carteira._tamanho = dados.shape[1]
+        carteira.params = list(estado["params"])
+        return carteira
+
+
+def _campo_imovel(nome: str) -> property:
+    indice_campo = CarteiraImoveis.CAMPOS.index(nome)
+
+    def ler(self) -> float:
+        if self._carteira is None:
+            return self._valores[indice_campo]
+        return float(self._carteira._dados[indice_campo, self._indice])
+
+    def escrever(self, valor: float) -> None:
+        if self._carteira is None:
+            self._valores[indice_campo] = valor
+        else:
+            self._carteira._dados[indice_campo, self._indice] = valor
+
+    return property(ler, escrever)
 
 
 class Imovel:
+    """
+    Um imóvel. Ao ser adicionado a um FII passa a ser uma view da linha
+    correspondente em `FII.carteira_imoveis`: leituras e escritas dos atributos
+    refletem os arrays do fundo.
+    """
+
+    valor = _campo_imovel("valor")
+    vacancia = _campo_imovel("vacancia")
+    custo_manutencao = _campo_imovel("custo_manutencao")
+    aluguel_fator = _campo_imovel("aluguel_fator")
+    desvio_normal = _campo_imovel("desvio_normal")
+    aluguel = _campo_imovel("aluguel")
+
     def __init__(
         self,
         valor: float,
@@ -10,13 +178,26 @@ class Imovel:
         custo_manutencao: float,
         params: dict = None,
     ):
-        self.valor = valor
-        self.vacancia = vacancia
-        self.custo_manutencao = custo_manutencao
         self.params = params or {}
-        self.aluguel_fator = self.params.get("aluguel_factor", 0.005)
-        self.desvio_normal = self.params.get("desvio_normal", 0.1)
-        self.aluguel = self.valor * self.aluguel_fator
+        self._carteira: Optional[CarteiraImoveis] = None
+        self._indice = -1
+        aluguel_fator = self.params.get("aluguel_factor", 0.005)
+        self._valores = [
+            valor,
+            vacancia,
+            custo_manutencao,
+            aluguel_fator,
+            self.params.get("desvio_normal", 0.1),
+            valor * aluguel_fator,
+        ]
+
+    @classmethod
+    def _vista(cls, carteira: CarteiraImoveis, indice: int) -> "Imovel":
+        imovel = cls.__new__(cls)
+        imovel.params = carteira.params[indice]
+        imovel._carteira = carteira
+        imovel._indice = indice
+        return imovel
 
     def gerar_fluxo_aluguel(self) -> float:
         vacancia_ajustada = self.vacancia * (
@@ -26,30 +207,62 @@ class Imovel:
 
 
 class FII:
-    def __init__(self, num_cotas: int, caixa: float, params: dict = None):
+    def __init__(
+        self, num_cotas: int, caixa: float, params: dict = None, nome: str = "FII"
+    ):
+        self.nome = nome
         self.num_cotas = num_cotas
         self.caixa = caixa
-        self.params = params or {}
-        self.imoveis: List[Imovel] = []
+        self.params = params
+        self.carteira_imoveis = CarteiraImoveis()
         self.preco_cota = 0.0
         self.historico_precos: List[float] = []
         self.historico_dividendos: List[float] = []
 
+    @property
+    def params(self) -> dict:
+        """
+        Parâmetros do fundo como vieram da configuração; as taxas usadas nos
+        eventos do fundo ficam resolvidas em `self.taxas`.
+        """
+        return self._params
+
+    @params.setter
+    def params(self, params: Optional[dict]) -> None:
+        self._params = params or {}
+        self.taxas = ParametrosFII.a_partir_de_dicionario(self._params, self.nome)
+
+    @property
+    def imoveis(self) -> Tuple[Imovel, ...]:
+        """
+        Views `Imovel` sobre a carteira de imóveis do fundo. A tupla é só de
+        leitura: imóveis entram no fundo por `adicionar_imovel`.
+        """
+        return tuple(
+            Imovel._vista(self.carteira_imoveis, indice)
+            for indice in range(len(self.carteira_imoveis))
+        )
+
     def adicionar_imovel(self, imovel: Imovel) -> None:
-        self.imoveis.append(imovel)
+        """
+        Copia o imóvel para a carteira do fundo e o transforma em uma view dela.
+        """
+        campos = [getattr(imovel, nome) for nome in CarteiraImoveis.CAMPOS]
+        imovel._indice = self.carteira_imoveis.adicionar(campos, imovel.params)
+        imovel._carteira = self.carteira_imoveis
 
     def valor_patrimonial_por_cota(self) -> float:
-        valor_imoveis = sum(imovel.valor for imovel in self.imoveis)
+        valor_imoveis = self.carteira_imoveis.valor_total()
         total_patrimonio = self.caixa + valor_imoveis
         return total_patrimonio / self.num_cotas if self.num_cotas > 0 else 0
 
     def calcular_fluxo_total_aluguel(self) -> float:
-        return sum(imovel.gerar_fluxo_aluguel() for imovel in self.imoveis)
+        return float(np.sum(self.carteira_imoveis.gerar_fluxo_aluguel()))
 
     def distribuir_dividendos(self) -> float:
         fluxo_total = self.calcular_fluxo_total_aluguel()
-        taxa_dividendo = self.params.get("dividendos_taxa", 0.95)
-        taxa_caixa = self.params.get("dividendos_caixa_taxa", 0.05)
+        taxa_dividendo = self.taxas.dividendos_taxa
+        taxa_caixa = self.taxas.dividendos_caixa_taxa
 
         dividendos_por_cota = (
             fluxo_total * taxa_dividendo / self.num_cotas if self.num_cotas > 0 else 0
@@ -59,20 +272,18 @@ class FII:
         return dividendos_por_cota
 
     def atualizar_imoveis_com_investimento(self, inflacao: float) -> None:
-        fracao_investimento = self.params.get("investimento_fracao", 0.50)
+        fracao_investimento = self.taxas.investimento_fracao
         valor_investimento = fracao_investimento * self.caixa
         self.caixa -= valor_investimento
 
-        if not self.imoveis:
+        if len(self.carteira_imoveis) == 0:
             return
 
-        investimento_unitario = valor_investimento / len(self.imoveis)
-        novo_aluguel_fator = self.params.get("aluguel_factor_imovel", 0.005)
-
-        for imovel in self.imoveis:
-            imovel.valor *= 1 + inflacao
-            imovel.valor += investimento_unitario
-            imovel.aluguel = imovel.valor * novo_aluguel_fator
+        investimento_unitario = valor_investimento / len(self.carteira_imoveis)
+        novo_aluguel_fator = self.taxas.aluguel_factor_imovel
+        self.carteira_imoveis.reavaliar(
+            inflacao, investimento_unitario, novo_aluguel_fator
+        )
 
     def inicializar_historico_precos(self, dias: int = 30) -> List[float]:
         vp = self.valor_patrimonial_por_cota()
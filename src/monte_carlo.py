@@ -0,0 +1,296 @@
+import argparse
+import copy
+import heapq
+import json
+import os
+import zlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .cenarios import cenario_da_configuracao, sobrescritas_cenario_compartilhado
+from .configuracao import carregar_parametros, compilar_parametros
+from .fatos_estilizados import resumo_fatos_estilizados, retornos_log
+from .rodadas_simuladas import run_single_simulation
+
+SERIES_RESUMO = ("precos", "retornos", "sentimento_medio")
+
+
+def aplicar_sobrescritas(sim_params: dict, sobrescritas: Dict[str, Any]) -> dict:
+    """
+    Devolve uma cópia de `sim_params` com as sobrescritas aplicadas. As chaves
+    usam pontos para navegar nas seções, como em "parametros_sentimento_e_ordem.a0".
+    """
+    resolvido = copy.deepcopy(sim_params)
+    for caminho, valor in sobrescritas.items():
+        destino = resolvido
+        chaves = caminho.split(".")
+        for chave in chaves[:-1]:
+            if chave not in destino:
+                raise KeyError(f"Seção de configuração inexistente em {caminho!r}")
+            destino = destino[chave]
+        destino[chaves[-1]] = valor
+    return resolvido
+
+
+def gerar_sementes(semente_base: int, quantidade: int) -> List[int]:
+    """
+    Sementes independentes derivadas de `semente_base` via `SeedSequence.spawn`.
+    """
+    filhas = np.random.SeedSequence(semente_base).spawn(quantidade)
+    return [int(filha.generate_state(1)[0]) for filha in filhas]
+
+
+def resumir_simulacao(resultados: dict, num_dias: int) -> Dict[str, np.ndarray]:
+    """
+    Extrai arrays compactos de uma simulação: preços, retornos logarítmicos
+    alinhados por dia (NaN quando algum preço não é positivo) e sentimento médio.
+    """
+    precos = np.asarray(resultados["historico_precos_fii"], dtype=float)
+    return {
+        "precos": precos[-num_dias:],
+        "retornos": retornos_log(precos),
+        "sentimento_medio": np.asarray(
+            resultados["sentimento_medio_diario"], dtype=float
+        ),
+    }
+
+
+def _executar_replicacao(
+    sim_params: dict, run_id: str, indice_variante: int
+) -> Dict[str, Any]:
+    resultados = run_single_simulation(sim_params, run_id, verbose=False)
+    resumo = resumir_simulacao(resultados, sim_params["geral"]["num_dias"])
+    resumo["indice_variante"] = indice_variante
+    resumo["run_id"] = run_id
+    return resumo
+
+
+class EstatisticasConjunto:
+    """
+    Agrega os resumos das replicações à medida que chegam, com memória limitada.
+
+    Média e desvio-padrão de cada dia são acumulados pelo algoritmo de Welford,
+    em O(dias) por variável. Os quantis vêm de uma amostra de no máximo
+    `capacidade_quantis` replicações: são exatos enquanto o conjunto não passa
+    dessa capacidade e, acima dela, estimados sobre a amostra, escolhida pelo
+    hash do `run_id` para não depender da ordem de chegada. Os fatos
+    estilizados são calculados por replicação na chegada e guardados como um
+    valor por replicação. A memória fica em O(capacidade × dias) em vez de
+    O(replicações × dias).
+    """
+
+    def __init__(
+        self,
+        quantis: Sequence[float] = (0.05, 0.5, 0.95),
+        capacidade_quantis: int = 1000,
+        opcoes_fatos: Optional[Dict[str, Any]] = None,
+    ):
+        if capacidade_quantis < 1:
+            raise ValueError("capacidade_quantis deve ser pelo menos 1.")
+        self.quantis = tuple(quantis)
+        self.capacidade_quantis = capacidade_quantis
+        self.opcoes_fatos = opcoes_fatos or {}
+        self.run_ids: List[str] = []
+        self._contagens = {nome: np.zeros(0, dtype=np.int64) for nome in SERIES_RESUMO}
+        self._medias = {nome: np.zeros(0) for nome in SERIES_RESUMO}
+        self._m2 = {nome: np.zeros(0) for nome in SERIES_RESUMO}
+        # Heap das replicações amostradas: (-prioridade, ordem, séries)
+        self._amostra: List[Tuple[int, int, Dict[str, np.ndarray]]] = []
+        self._fatos: Dict[str, List[float]] = {}
+
+    def adicionar(self, resumo: Dict[str, Any]) -> None:
+        series = {nome: np.asarray(resumo[nome], dtype=float) for nome in SERIES_RESUMO}
+        for nome, serie in series.items():
+            self._acumular(nome, serie)
+
+        prioridade = zlib.crc32(resumo["run_id"].encode("utf-8"))
+        item = (-prioridade, self.num_replicacoes, series)
+        if len(self._amostra) < self.capacidade_quantis:
+            heapq.heappush(self._amostra, item)
+        elif prioridade < -self._amostra[0][0]:
+            heapq.heapreplace(self._amostra, item)
+
+        if len(series["precos"]):
+            fatos = resumo_fatos_estilizados(series["precos"], **self.opcoes_fatos)
+            for nome, valor in fatos.items():
+                self._fatos.setdefault(nome, []).append(float(valor))
+        self.run_ids.append(resumo["run_id"])
+
+    def _acumular(self, nome: str, serie: np.ndarray) -> None:
+        tamanho = len(serie)
+        if tamanho > len(self._medias[nome]):
+            extra = tamanho - len(self._medias[nome])
+            self._contagens[nome] = np.concatenate(
+                (self._contagens[nome], np.zeros(extra, dtype=np.int64))
+            )
+            self._medias[nome] = np.concatenate((self._medias[nome], np.zeros(extra)))
+            self._m2[nome] = np.concatenate((self._m2[nome], np.zeros(extra)))
+        validos = ~np.isnan(serie)
+        contagem = self._contagens[nome][:tamanho]
+        media = self._medias[nome][:tamanho]
+        contagem += validos
+        delta = np.where(validos, serie - media, 0.0)
+        media += np.divide(delta, contagem, out=np.zeros(tamanho), where=validos)
+        self._m2[nome][:tamanho] += np.where(validos, delta * (serie - media), 0.0)
+
+    @property
+    def num_replicacoes(self) -> int:
+        return len(self.run_ids)
+
+    def amostra(self, nome: str) -> np.ndarray:
+        """
+        Matriz replicações amostradas × dias da variável, completada com NaN, na
+        ordem de chegada; contém todas as replicações até `capacidade_quantis`.
+        """
+        series = [item[2][nome] for item in sorted(self._amostra, key=lambda i: i[1])]
+        if not series:
+            return np.empty((0, 0))
+        tamanho = max(len(serie) for serie in series)
+        matriz = np.full((len(series), tamanho), np.nan)
+        for i, serie in enumerate(series):
+            matriz[i, : len(serie)] = serie
+        return matriz
+
+    def resumo(self) -> Dict[str, Dict[str, np.ndarray]]:
+        estatisticas = {}
+        for nome in SERIES_RESUMO:
+            contagem = self._contagens[nome]
+            if contagem.size == 0:
+                continue
+            with np.errstate(invalid="ignore", divide="ignore"):
+                media = np.where(contagem > 0, self._medias[nome], np.nan)
+                desvio = np.sqrt(self._m2[nome] / contagem)
+            estatisticas[nome] = {
+                "media": media,
+                "desvio": desvio,
+                "quantis": np.nanquantile(self.amostra(nome), self.quantis, axis=0),
+            }
+        return estatisticas
+
+    def fatos_estilizados(self) -> Dict[str, np.ndarray]:
+        """
+        Fatos estilizados de cada replicação (um valor por replicação e
+        estatística), na ordem de chegada.
+        """
+        return {nome: np.array(valores) for nome, valores in self._fatos.items()}
+
+
+def executar_conjunto(
+    sim_params: dict,
+    num_rodadas: int,
+    variantes: Optional[List[Dict[str, Any]]] = None,
+    num_processos: Optional[int] = None,
+    semente_base: Optional[int] = None,
+    quantis: Sequence[float] = (0.05, 0.5, 0.95),
+    capacidade_quantis: int = 1000,
+) -> List[EstatisticasConjunto]:
+    """
+    Executa `num_rodadas` replicações de cada variante de parâmetros em um pool de
+    processos, cada uma com sua própria semente, e agrega os resumos por variante.
+
+    Dentro de cada replicação o mercado roda com um único processo, já que o
+    paralelismo fica no nível das replicações. Um cenário exógeno em arquivo
+    ("cenario.arquivo") é gerado aqui, uma única vez, com a semente fixada para
+    todas as replicações, que o abrem mapeado em memória. Os quantis de cada
+    variante usam no máximo `capacidade_quantis` replicações (ver
+    `EstatisticasConjunto`).
+    """
+    variantes = variantes or [{}]
+    if semente_base is None:
+        semente_base = sim_params["geral"].get("random_seed", 42)
+    num_processos = num_processos or os.cpu_count() or 1
+    cenario_compartilhado = sobrescritas_cenario_compartilhado(sim_params)
+    sim_params = aplicar_sobrescritas(sim_params, cenario_compartilhado)
+    cenario_da_configuracao(sim_params)
+
+    sementes = gerar_sementes(semente_base, num_rodadas)
+    tarefas = []
+    for indice_variante, sobrescritas in enumerate(variantes):
+        for rodada, semente in enumerate(sementes):
+            params = aplicar_sobrescritas(
+                sim_params,
+                {
+                    **sobrescritas,
+                    "geral.random_seed": semente,
+                    "mercado.num_processos_paralelos": 1,
+                },
+            )
+            # Erros de configuração aparecem aqui, antes de abrir o pool, assim
+            # como variantes que alteram o cenário compartilhado em arquivo
+            compilar_parametros(params)
+            if cenario_compartilhado:
+                cenario_da_configuracao(params)
+            tarefas.append((params, f"v{indice_variante}_r{rodada}", indice_variante))
+
+    estatisticas = [
+        EstatisticasConjunto(quantis, capacidade_quantis) for _ in variantes
+    ]
+    if num_processos <= 1:
+        for tarefa in tarefas:
+            resumo = _executar_replicacao(*tarefa)
+            estatisticas[resumo["indice_variante"]].adicionar(resumo)
+        return estatisticas
+
+    with ProcessPoolExecutor(max_workers=num_processos) as executor:
+        futuros = [executor.submit(_executar_replicacao, *tarefa) for tarefa in tarefas]
+        for futuro in as_completed(futuros):
+            resumo = futuro.result()
+            estatisticas[resumo["indice_variante"]].adicionar(resumo)
+    return estatisticas
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Executa um conjunto de replicações Monte Carlo da simulação."
+    )
+    parser.add_argument("--config", default="config/parametros.json")
+    parser.add_argument("--rodadas", type=int, default=10)
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--semente", type=int, default=None)
+    parser.add_argument(
+        "--variantes",
+        default=None,
+        help="Arquivo JSON com uma lista de sobrescritas (chaves com pontos).",
+    )
+    parser.add_argument(
+        "--amostra-quantis",
+        type=int,
+        default=1000,
+        help="Máximo de replicações guardadas por variante para os quantis.",
+    )
+    parser.add_argument("--saida", default="results/conjunto.npz")
+    args = parser.parse_args(argv)
+
+    sim_params = carregar_parametros(args.config)
+    variantes = None
+    if args.variantes:
+        with open(args.variantes, "r", encoding="utf-8") as f:
+            variantes = json.load(f)
+
+    estatisticas = executar_conjunto(
+        sim_params,
+        args.rodadas,
+        variantes=variantes,
+        num_processos=args.processos,
+        semente_base=args.semente,
+        capacidade_quantis=args.amostra_quantis,
+    )
+
+    arrays = {}
+    for indice, est in enumerate(estatisticas):
+        for nome, valores in est.resumo().items():
+            for estatistica, array in valores.items():
+                arrays[f"v{indice}_{nome}_{estatistica}"] = array
+        for nome, valores in est.fatos_estilizados().items():
+            arrays[f"v{indice}_fatos_{nome}"] = valores
+        print(f"Variante {indice}: {est.num_replicacoes} replicações concluídas.")
+    pasta = os.path.dirname(args.saida)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    np.savez_compressed(args.saida, quantis=np.array(estatisticas[0].quantis), **arrays)
+    print(f"Estatísticas salvas em: {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
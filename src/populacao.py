@@ -0,0 +1,526 @@
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+from .agentes_economicos import Investidor, calcular_precos_esperados_populacao
+from .aleatoriedade import FluxosAleatorios, inteiros_uniformes
+from .configuracao import ParametrosInvestidor, ParametrosSentimento
+from .historico_de_mercado import num_precos
+from .rede_social import RedeSocial
+from .utils import ServicoMediasMoveis, agrupar_janelas_media_movel
+
+
+def matriz_cotas(investidores: List[Investidor], ativos: List[str]) -> np.ndarray:
+    """
+    Cotas de cada investidor em cada FII (agentes × ativos), lidas das carteiras.
+    """
+    indice = {nome: j for j, nome in enumerate(ativos)}
+    cotas = np.zeros((len(investidores), len(ativos)), dtype=np.int64)
+    for i, inv in enumerate(investidores):
+        for nome, quantidade in inv.carteira.items():
+            cotas[i, indice[nome]] = quantidade
+    return cotas
+
+
+def riqueza_carteiras(caixa: np.ndarray, cotas: np.ndarray, precos) -> np.ndarray:
+    """
+    Caixa mais o valor das cotas de cada agente aos preços de cada ativo.
+    """
+    precos = np.atleast_1d(np.asarray(precos, dtype=float))
+    if cotas.shape[1] == 1:
+        return caixa + cotas[:, 0] * precos[0]
+    return caixa + cotas @ precos
+
+
+def precos_fechamento(historicos_precos) -> np.ndarray:
+    """
+    Último preço de cada série de `historicos_precos` (zero se vazia).
+    """
+    return np.array(
+        [serie[-1] if len(serie) > 0 else 0.0 for serie in historicos_precos],
+        dtype=float,
+    )
+
+
+def agrupar_por_ativo(ativos: np.ndarray, num_ativos: int) -> List[np.ndarray]:
+    """
+    Índices dos agentes de cada ativo, em ordem crescente dentro do grupo, com
+    uma única ordenação estável em vez de uma comparação por ativo.
+    """
+    ordem = np.argsort(ativos, kind="stable")
+    limites = np.searchsorted(ativos[ordem], np.arange(num_ativos + 1))
+    return [ordem[limites[a] : limites[a + 1]] for a in range(num_ativos)]
+
+
+def sortear_ativos_foco(
+    uniformes: np.ndarray, cotas: np.ndarray, precos, peso_carteira: float
+) -> np.ndarray:
+    """
+    Índice do FII que cada agente avalia e negocia no dia. Com peso
+    `peso_carteira`, a escolha segue o valor de cada posição (cotas × preço);
+    no restante, e para quem não tem cotas, é uniforme entre os fundos. Assim
+    quem tem cotas volta com frequência aos fundos que pode vender sem deixar
+    de avaliar fundos novos para comprar. Com peso zero, o sorteio é o uniforme.
+    """
+    num_ativos = cotas.shape[1]
+    if peso_carteira == 0:
+        return inteiros_uniformes(uniformes, 0, num_ativos - 1)
+    precos = np.maximum(np.atleast_1d(np.asarray(precos, dtype=float)), 0.0)
+    valor = cotas * precos
+    total = valor.sum(axis=1)
+    probabilidades = np.full(valor.shape, 1.0 / num_ativos)
+    posicionados = total > 0
+    probabilidades[posicionados] = (
+        1 - peso_carteira
+    ) / num_ativos + peso_carteira * valor[posicionados] / total[posicionados, None]
+    # A última coluna da acumulada (~1) fica de fora: um sorteio acima de
+    # todas as anteriores cai no último fundo, sem depender de arredondamento
+    acumuladas = np.cumsum(probabilidades[:, :-1], axis=1)
+    return (acumuladas <= uniformes[:, None]).sum(axis=1)
+
+
+class PopulacaoInvestidores:
+    """
+    Representação vetorizada (struct-of-arrays) da população de investidores.
+
+    Mantém LF, sentimento, RD, caixa e cotas em arrays contíguos e a vizinhança
+    em uma `RedeSocial` esparsa, permitindo calcular o passo diário de sentimento de todos os
+    agentes em uma única passada numpy, com o mesmo modelo de
+    `_processar_investidor`.
+
+    Com vários FIIs, `cotas` é uma matriz agentes × ativos e cada agente avalia
+    e negocia a cada dia um único fundo, sorteado no fluxo "ativo" com peso
+    para os fundos da carteira (`sortear_ativos_foco`); as grandezas por ativo
+    (preços, dividendos, volatilidade) são arrays indexados pelo ativo.
+    """
+
+    JANELA_RIQUEZA = 5
+
+    def __init__(
+        self,
+        lf: np.ndarray,
+        caixa: np.ndarray,
+        cotas: np.ndarray,
+        rede: RedeSocial,
+        parametros: Union[ParametrosInvestidor, Dict[str, Any]],
+        historico_riqueza: np.ndarray,
+        num_registros_riqueza: Optional[int] = None,
+        fluxos: Optional[FluxosAleatorios] = None,
+        primeiro_agente: int = 0,
+        ativos: Optional[List[str]] = None,
+    ):
+        self.LF = np.ascontiguousarray(lf, dtype=float)
+        self.num_agentes = self.LF.shape[0]
+        self.caixa = np.ascontiguousarray(caixa, dtype=float)
+        # Uma coluna de cotas por ativo; um vetor equivale a um único FII
+        self.cotas = np.ascontiguousarray(cotas, dtype=np.int64).reshape(
+            self.num_agentes, -1
+        )
+        self.num_ativos = self.cotas.shape[1]
+        if ativos is None:
+            if self.num_ativos != 1:
+                raise ValueError("Informe os nomes dos ativos da matriz de cotas.")
+            ativos = ["FII"]
+        self.ativos = list(ativos)
+        self.rede = rede
+        self.parametros = parametros = ParametrosInvestidor.resolver(parametros)
+        self.prob_negociar = np.clip(
+            parametros.piso_prob_negociar
+            + parametros.fator_lf_prob_negociar * ((1 - self.LF) ** 2),
+            0.1,
+            1.0,
+        )
+        # Janelas de média móvel distintas e a de cada agente, fixas durante
+        # toda a simulação: (omegas, janelas curtas, índice da janela do agente)
+        self.janelas_media_movel = agrupar_janelas_media_movel(
+            self.LF, parametros.media_movel
+        )
+
+        self.sentimento = np.zeros(self.num_agentes)
+        self.RD = np.zeros(self.num_agentes)
+        self.preco_esperado = np.zeros(self.num_agentes)
+        self.servicos_medias_moveis: Optional[List[ServicoMediasMoveis]] = None
+        # Médias por janela de cada ativo, válidas enquanto a série não muda
+        # (entre rodadas de um mesmo dia): ativo -> (serviço, preços, curtas, longas)
+        self._medias_calculadas: Dict[int, Tuple[Any, int, np.ndarray, np.ndarray]] = {}
+        self._ativos_foco: Tuple[Optional[int], Optional[np.ndarray]] = (None, None)
+
+        # Sem `fluxos`, os sorteios usam o gerador global do numpy. Com eles, o
+        # agente local i usa o fluxo do agente global `primeiro_agente + i`.
+        self.fluxos = fluxos
+        self.primeiro_agente = primeiro_agente
+
+        # Janela deslizante com as últimas riquezas (colunas em ordem cronológica)
+        historico_riqueza = np.asarray(historico_riqueza, dtype=float).reshape(
+            self.num_agentes, -1
+        )
+        self.num_registros_riqueza = (
+            historico_riqueza.shape[1]
+            if num_registros_riqueza is None
+            else num_registros_riqueza
+        )
+        self.riqueza_recente = np.zeros((self.num_agentes, self.JANELA_RIQUEZA))
+        ultimos = historico_riqueza[:, -self.JANELA_RIQUEZA :]
+        if ultimos.shape[1] > 0:
+            self.riqueza_recente[:, -ultimos.shape[1] :] = ultimos
+
+    def _normal(
+        self, finalidade: str, dia: int, desvio: float, rodada: int = 0
+    ) -> np.ndarray:
+        if self.fluxos is None:
+            return np.random.normal(0, desvio, self.num_agentes)
+        return self.fluxos.normal(
+            finalidade,
+            dia,
+            desvio,
+            self.primeiro_agente,
+            self.primeiro_agente + self.num_agentes,
+            rodada,
+        )
+
+    def _uniforme(self, finalidade: str, dia: int, rodada: int = 0) -> np.ndarray:
+        if self.fluxos is None:
+            return np.random.random(self.num_agentes)
+        return self.fluxos.uniforme(
+            finalidade,
+            dia,
+            self.primeiro_agente,
+            self.primeiro_agente + self.num_agentes,
+            rodada,
+        )
+
+    @property
+    def servico_medias_moveis(self) -> Optional[ServicoMediasMoveis]:
+        if self.servicos_medias_moveis is None:
+            return None
+        return self.servicos_medias_moveis[0]
+
+    @servico_medias_moveis.setter
+    def servico_medias_moveis(self, servico: Optional[ServicoMediasMoveis]) -> None:
+        self.servicos_medias_moveis = None if servico is None else [servico]
+
+    def _medias_moveis(
+        self, ativo: int, indices: Optional[np.ndarray] = None
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Médias (curtas, longas) de cada agente (ou dos agentes `indices`) no
+        serviço do ativo, espalhadas a partir das janelas pré-agrupadas.
+        """
+        if self.servicos_medias_moveis is None:
+            return None
+        omegas, janelas_curtas, janela_agente = self.janelas_media_movel
+        servico = self.servicos_medias_moveis[ativo]
+        total = num_precos(servico.precos)
+        calculadas = self._medias_calculadas.get(ativo)
+        if calculadas is None or calculadas[0] is not servico or calculadas[1] != total:
+            curtas, longas = servico.medias_para_janelas(omegas, janelas_curtas)
+            self._medias_calculadas[ativo] = (servico, total, curtas, longas)
+        else:
+            curtas, longas = calculadas[2], calculadas[3]
+        if indices is not None:
+            janela_agente = janela_agente[indices]
+        return curtas[janela_agente], longas[janela_agente]
+
+    def ativos_foco(self, dia: int, precos=None) -> np.ndarray:
+        """
+        Índice do FII que cada agente avalia e negocia no dia, sorteado por
+        `sortear_ativos_foco` com as cotas atuais e os `precos` de fechamento.
+        O sorteio é feito uma vez por dia e reaproveitado entre o passo de
+        sentimento e o de ordens.
+        """
+        if self.num_ativos == 1:
+            return np.zeros(self.num_agentes, dtype=np.int64)
+        dia_sorteado, ativos = self._ativos_foco
+        if dia_sorteado != dia:
+            ativos = sortear_ativos_foco(
+                self._uniforme("ativo", dia),
+                self.cotas,
+                precos,
+                self.parametros.peso_carteira_foco,
+            )
+            self._ativos_foco = (dia, ativos)
+        return ativos
+
+    def definir_ativos_foco(self, dia: int, ativos: np.ndarray) -> None:
+        """
+        Usa no dia os fundos `ativos` sorteados fora da população, como nos
+        fragmentos, que não guardam as cotas dos seus agentes.
+        """
+        self._ativos_foco = (dia, np.asarray(ativos, dtype=np.int64))
+
+    @classmethod
+    def a_partir_de_investidores(
+        cls,
+        investidores: List[Investidor],
+        rede: Optional[RedeSocial] = None,
+        fluxos: Optional[FluxosAleatorios] = None,
+        ativos: Optional[List[str]] = None,
+    ) -> "PopulacaoInvestidores":
+        """
+        Monta a população a partir dos objetos `Investidor`. Sem `rede`, a
+        vizinhança é lida das listas `Investidor.vizinhos`; sem `ativos`, a
+        carteira tem um único FII.
+        """
+        ativos = ["FII"] if ativos is None else list(ativos)
+        if rede is None:
+            posicao = {inv.id: idx for idx, inv in enumerate(investidores)}
+            rede = RedeSocial.a_partir_de_listas(
+                [[posicao[viz.id] for viz in inv.vizinhos] for inv in investidores]
+            )
+        num_registros = min(len(inv.historico_riqueza) for inv in investidores)
+        janela = min(num_registros, cls.JANELA_RIQUEZA)
+        historico_riqueza = np.array(
+            [
+                inv.historico_riqueza[len(inv.historico_riqueza) - janela :]
+                for inv in investidores
+            ]
+        )
+        populacao = cls(
+            lf=np.array([inv.LF for inv in investidores]),
+            caixa=np.array([inv.caixa for inv in investidores]),
+            cotas=matriz_cotas(investidores, ativos),
+            rede=rede,
+            parametros=investidores[0].parametros,
+            historico_riqueza=historico_riqueza,
+            num_registros_riqueza=num_registros,
+            fluxos=fluxos,
+            ativos=ativos,
+        )
+        populacao.sentimento[:] = [inv.sentimento for inv in investidores]
+        populacao.RD[:] = [inv.RD for inv in investidores]
+        return populacao
+
+    def calcular_sentimentos(
+        self,
+        historico_precos,
+        dividendos,
+        expectativa_inflacao: float,
+        premio_risco: float,
+        news: float,
+        volatilidade,
+        parametros_sentimento: Union[ParametrosSentimento, Dict[str, Any]],
+        sentimentos_vizinhanca: Optional[np.ndarray] = None,
+        dia: int = 0,
+        rodada: int = 0,
+        precos_atuais: Optional[np.ndarray] = None,
+    ) -> None:
+        """
+        Atualiza sentimento, RD e preço esperado de todos os agentes de uma vez.
+
+        Com um único FII, `historico_precos` é a série de preços e `dividendos` e
+        `volatilidade` são escalares; com vários, são respectivamente a lista de
+        séries e arrays indexados pelo ativo, e cada agente usa os do seu fundo
+        do dia (`ativos_foco`).
+
+        `sentimentos_vizinhanca` é o vetor de sentimentos indexado pelas colunas
+        de `self.rede`; por padrão é o próprio sentimento da população, mas um
+        fragmento da população recebe o vetor global. `dia` e `rodada` selecionam
+        os fluxos aleatórios quando a população usa `FluxosAleatorios`.
+
+        `precos_atuais` (um por ativo) substitui o último fechamento no
+        componente de retorno, para rodadas intradiárias que reavaliam o
+        sentimento ao preço corrente; as médias móveis e o preço esperado
+        continuam ancorados nos fechamentos diários.
+        """
+        lf = self.LF
+        sentimento_ant = self.sentimento
+        params = self.parametros
+        parametros_sentimento = ParametrosSentimento.resolver(parametros_sentimento)
+
+        peso_si = params.peso_sentimento_inflacao
+        exp_inflacao = expectativa_inflacao * (1 - sentimento_ant * peso_si)
+
+        peso_sp = params.peso_sentimento_expectativa
+        exp_premio = premio_risco * (1 - sentimento_ant * peso_sp)
+
+        if sentimentos_vizinhanca is None:
+            sentimentos_vizinhanca = sentimento_ant
+        i_social = self.rede.influencia_social(sentimentos_vizinhanca)
+
+        ruido_preco = self._normal(
+            "ruido_preco_esperado", dia, params.ruido_std_preco_esperado, rodada
+        )
+        if self.num_ativos == 1:
+            historico_precos = np.asarray(historico_precos, dtype=float)
+            self.preco_esperado = calcular_precos_esperados_populacao(
+                lf,
+                parametros_sentimento.beta,
+                dividendos,
+                historico_precos,
+                exp_inflacao,
+                exp_premio,
+                params,
+                ruido=ruido_preco,
+                medias_moveis=self._medias_moveis(0),
+            )
+            if precos_atuais is not None:
+                preco_atual = np.full(self.num_agentes, float(precos_atuais[0]))
+            else:
+                preco_atual = np.full(
+                    self.num_agentes,
+                    historico_precos[-1] if len(historico_precos) > 0 else 0.0,
+                )
+        else:
+            ativos = self.ativos_foco(dia, precos_fechamento(historico_precos))
+            self.preco_esperado = np.zeros(self.num_agentes)
+            preco_atual = np.zeros(self.num_agentes)
+            for ativo, indices in enumerate(agrupar_por_ativo(ativos, self.num_ativos)):
+                if len(indices) == 0:
+                    continue
+                serie = np.asarray(historico_precos[ativo], dtype=float)
+                self.preco_esperado[indices] = calcular_precos_esperados_populacao(
+                    lf[indices],
+                    parametros_sentimento.beta,
+                    dividendos[ativo],
+                    serie,
+                    exp_inflacao[indices],
+                    exp_premio[indices],
+                    params,
+                    ruido=ruido_preco[indices],
+                    medias_moveis=self._medias_moveis(ativo, indices),
+                )
+                if precos_atuais is not None:
+                    preco_atual[indices] = precos_atuais[ativo]
+                else:
+                    preco_atual[indices] = serie[-1] if len(serie) > 0 else 0.0
+            volatilidade = np.asarray(volatilidade, dtype=float)[ativos]
+
+        comp_retorno = np.zeros(self.num_agentes)
+        valido = (preco_atual > 0) & (self.preco_esperado > 0)
+        comp_retorno[valido] = np.log(self.preco_esperado[valido] / preco_atual[valido])
+
+        comp_riqueza = np.zeros(self.num_agentes)
+        if self.num_registros_riqueza >= self.JANELA_RIQUEZA:
+            riqueza_base = self.riqueza_recente[:, 0]
+            base_valida = riqueza_base != 0
+            comp_riqueza[base_valida] = (
+                self.riqueza_recente[base_valida, -1] - riqueza_base[base_valida]
+            ) / riqueza_base[base_valida]
+
+        peso_r = params.peso_retorno_privada
+        peso_w = params.peso_riqueza_privada
+        ruido = self._normal("ruido_privada", dia, params.ruido_std_privada, rodada)
+        i_privado = peso_r * comp_retorno + peso_w * comp_riqueza + ruido
+
+        a0 = parametros_sentimento.a0
+        b0 = parametros_sentimento.b0
+        c0 = parametros_sentimento.c0
+        sentimento_bruto = (
+            a0 * lf * i_privado + b0 * (1 - lf) * i_social + c0 * (1 - lf) * news
+        )
+        self.sentimento = np.clip(sentimento_bruto, -1, 1)
+        self.RD = (self.sentimento + 1) / 2 * volatilidade
+
+    def gerar_ordens(
+        self,
+        precos_mercado,
+        parametros: Union[ParametrosSentimento, Dict[str, Any]],
+        dia: int = 0,
+        rodada: int = 0,
+        rodadas_por_dia: int = 1,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Gera as ordens de todos os agentes que negociam no dia em uma passada,
+        com as mesmas regras de `Investidor.criar_ordem`, reaproveitando os preços
+        esperados calculados no passo de sentimento. `precos_mercado` é o preço
+        de cada ativo (ou um escalar, com um único FII).
+
+        Com `rodadas_por_dia` > 1, a probabilidade de negociar é dividida entre
+        as rodadas, mantendo o número esperado de ordens por dia.
+
+        Devolve os arrays (índices dos agentes, índice do ativo, é_compra, preço
+        limite, quantidade).
+        """
+        parametros = ParametrosSentimento.resolver(parametros)
+        precos_ativos = np.atleast_1d(np.asarray(precos_mercado, dtype=float))
+        ativos = self.ativos_foco(dia, precos_ativos)
+
+        # As regras são avaliadas só para quem negocia, o que importa quando a
+        # probabilidade é dividida entre muitas rodadas
+        negocia = self._uniforme("negociar", dia, rodada) < (
+            self.prob_negociar / rodadas_por_dia
+        )
+        candidatos = np.flatnonzero(negocia & (precos_ativos[ativos] > 0))
+        ativos_candidatos = ativos[candidatos]
+        preco_mercado = precos_ativos[ativos_candidatos]
+        preco_esperado = self.preco_esperado[candidatos]
+        cotas = self.cotas[candidatos, ativos_candidatos]
+
+        qtd_min = parametros.quantidade_compra_min
+        qtd_max = parametros.quantidade_compra_max
+        cotas_desejadas = inteiros_uniformes(
+            self._uniforme("quantidade_compra", dia, rodada)[candidatos],
+            qtd_min,
+            qtd_max,
+        )
+        compra = (preco_mercado < preco_esperado) & (
+            self.caixa[candidatos] >= preco_mercado * cotas_desejadas
+        )
+
+        divisor = parametros.divisor_quantidade_venda
+        qtd_max_venda = np.maximum(1, (cotas / divisor).astype(np.int64))
+        cotas_venda = inteiros_uniformes(
+            self._uniforme("quantidade_venda", dia, rodada)[candidatos],
+            1,
+            qtd_max_venda,
+        )
+        venda = (preco_mercado > preco_esperado) & (cotas > 0)
+
+        selecionados = compra | venda
+        indices = candidatos[selecionados]
+        peso_preco_esperado = parametros.peso_preco_esperado
+        precos_limite = (1 - peso_preco_esperado) * preco_mercado[selecionados] + (
+            peso_preco_esperado * preco_esperado[selecionados]
+        )
+        compra = compra[selecionados]
+        quantidades = np.where(
+            compra, cotas_desejadas[selecionados], cotas_venda[selecionados]
+        )
+        return indices, ativos[indices], compra, precos_limite, quantidades
+
+    def aplicar_em_investidores(self, investidores: List[Investidor]) -> None:
+        """
+        Copia sentimento e RD calculados de volta para os objetos `Investidor`.
+        """
+        for inv, sentimento, rd in zip(
+            investidores, self.sentimento.tolist(), self.RD.tolist()
+        ):
+            inv.sentimento = sentimento
+            inv.historico_sentimentos.append(sentimento)
+            inv.RD = rd
+
+    def registrar_riqueza(self, investidores: List[Investidor], precos) -> None:
+        """
+        Sincroniza caixa e cotas com os investidores (alterados pelas transações)
+        e registra a riqueza do dia na janela deslizante. `precos` é o preço de
+        cada ativo (ou um escalar, com um único FII).
+        """
+        self.sincronizar_carteiras(investidores)
+        self.empilhar_riqueza(riqueza_carteiras(self.caixa, self.cotas, precos))
+
+    def sincronizar_carteiras(self, investidores: List[Investidor]) -> None:
+        self.caixa[:] = [inv.caixa for inv in investidores]
+        if self.num_ativos == 1:
+            self.cotas[:, 0] = [
+                inv.carteira.get(self.ativos[0], 0) for inv in investidores
+            ]
+        else:
+            self.cotas[:] = matriz_cotas(investidores, self.ativos)
+
+    def sincronizar_agentes(
+        self, investidores: List[Investidor], indices: np.ndarray
+    ) -> None:
+        """
+        Como `sincronizar_carteiras`, mas só para os agentes `indices`, por
+        exemplo os que negociaram desde a última sincronização.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            return
+        agentes = [investidores[i] for i in indices.tolist()]
+        self.caixa[indices] = [inv.caixa for inv in agentes]
+        self.cotas[indices] = matriz_cotas(agentes, self.ativos)
+
+    def empilhar_riqueza(self, riqueza: np.ndarray) -> None:
+        self.riqueza_recente[:, :-1] = self.riqueza_recente[:, 1:]
+        self.riqueza_recente[:, -1] = riqueza
+        self.num_registros_riqueza += 1
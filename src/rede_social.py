@@ -0,0 +1,280 @@
+import numpy as np
+from scipy import sparse
+from typing import List, Optional
+
+
+class RedeSocial:
+    """
+    Rede de vizinhança entre investidores em formato CSR (compressed sparse row).
+
+    A linha i lista os agentes observados pelo agente i. A influência social de
+    todos os agentes (média do sentimento dos vizinhos) é um único produto
+    matriz-vetor esparso. Linhas podem ser um subconjunto da população (fragmento)
+    enquanto as colunas continuam indexando a população inteira.
+    """
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        num_colunas: Optional[int] = None,
+    ):
+        self.indptr = np.ascontiguousarray(indptr, dtype=np.int64)
+        self.indices = np.ascontiguousarray(indices, dtype=np.int64)
+        self.num_linhas = len(self.indptr) - 1
+        self.num_colunas = self.num_linhas if num_colunas is None else num_colunas
+        self.graus = np.diff(self.indptr)
+
+        pesos = np.zeros(self.num_linhas)
+        np.divide(1.0, self.graus, out=pesos, where=self.graus > 0)
+        self.matriz_influencia = sparse.csr_matrix(
+            (np.repeat(pesos, self.graus), self.indices, self.indptr),
+            shape=(self.num_linhas, self.num_colunas),
+        )
+
+    @classmethod
+    def a_partir_de_listas(
+        cls, listas: List[List[int]], num_colunas: Optional[int] = None
+    ) -> "RedeSocial":
+        graus = np.array([len(lista) for lista in listas], dtype=np.int64)
+        indptr = np.concatenate(([0], np.cumsum(graus)))
+        indices = (
+            np.concatenate([np.asarray(lista, dtype=np.int64) for lista in listas])
+            if len(listas) and indptr[-1] > 0
+            else np.zeros(0, dtype=np.int64)
+        )
+        return cls(indptr, indices, num_colunas or len(listas))
+
+    @classmethod
+    def a_partir_de_arestas(
+        cls, origens: np.ndarray, destinos: np.ndarray, num_agentes: int
+    ) -> "RedeSocial":
+        """
+        Constrói a rede a partir de arestas dirigidas, removendo laços e duplicatas.
+        """
+        origens = np.asarray(origens, dtype=np.int64)
+        destinos = np.asarray(destinos, dtype=np.int64)
+        validas = origens != destinos
+        chaves = np.sort(origens[validas] * num_agentes + destinos[validas])
+        if len(chaves):
+            chaves = chaves[np.concatenate(([True], chaves[1:] != chaves[:-1]))]
+        origens, destinos = np.divmod(chaves, num_agentes)
+        graus = np.bincount(origens, minlength=num_agentes)
+        indptr = np.concatenate(([0], np.cumsum(graus)))
+        return cls(indptr, destinos, num_agentes)
+
+    def vizinhos_de(self, agente: int) -> np.ndarray:
+        return self.indices[self.indptr[agente] : self.indptr[agente + 1]]
+
+    def listas(self) -> List[np.ndarray]:
+        return np.split(self.indices, self.indptr[1:-1])
+
+    def fatia(self, inicio: int, fim: int) -> "RedeSocial":
+        """
+        Sub-rede com as linhas [inicio, fim), mantendo os índices globais nas colunas.
+        """
+        indptr = self.indptr[inicio : fim + 1]
+        indices = self.indices[indptr[0] : indptr[-1]]
+        return RedeSocial(indptr - indptr[0], indices, self.num_colunas)
+
+    def influencia_social(self, sentimentos: np.ndarray) -> np.ndarray:
+        """
+        Média do sentimento dos vizinhos de cada agente (0 para quem não tem vizinhos).
+        """
+        return self.matriz_influencia @ np.nan_to_num(sentimentos)
+
+
+def _rede_aleatoria(num_agentes: int, num_vizinhos: int) -> RedeSocial:
+    # Cada agente observa `num_vizinhos` outros agentes distintos, sorteados
+    # uniformemente (rede dirigida, como em `Investidor.definir_vizinhos`).
+    k = min(num_vizinhos, num_agentes - 1)
+    if k <= 0:
+        return RedeSocial(np.zeros(num_agentes + 1), np.zeros(0), num_agentes)
+
+    linhas = np.arange(num_agentes)[:, np.newaxis]
+    if 2 * k >= num_agentes:
+        # Rede densa: permutação aleatória dos demais agentes em cada linha
+        ordem = np.argsort(np.random.random((num_agentes, num_agentes - 1)), axis=1)
+        destinos = ordem[:, :k]
+    else:
+        destinos = np.random.randint(0, num_agentes - 1, size=(num_agentes, k))
+        while True:
+            ordenados = np.sort(destinos, axis=1)
+            repetidos = np.flatnonzero((ordenados[:, 1:] == ordenados[:, :-1]).any(1))
+            if len(repetidos) == 0:
+                break
+            destinos[repetidos] = np.random.randint(
+                0, num_agentes - 1, size=(len(repetidos), k)
+            )
+    # Sorteio em [0, n - 1) deslocado para pular o próprio agente
+    destinos = destinos + (destinos >= linhas)
+    indptr = np.arange(num_agentes + 1) * k
+    return RedeSocial(indptr, destinos.ravel(), num_agentes)
+
+
+def _rede_k_regular(num_agentes: int, num_vizinhos: int) -> RedeSocial:
+    """
+    Rede não dirigida em que todo agente tem exatamente `num_vizinhos` vizinhos,
+    que precisa ser par e menor que o número de agentes.
+
+    É a união de k/2 ciclos hamiltonianos aleatórios, cada um somando grau 2.
+    Uma aresta sorteada em mais de um ciclo é trocada com outra aresta sorteada
+    (u-v e x-y viram u-x e v-y), o que preserva os graus. As repetições são da
+    ordem de k², então as trocas custam pouco perto da geração dos ciclos.
+    """
+    if num_vizinhos % 2 or not 0 < num_vizinhos < num_agentes:
+        raise ValueError(
+            "A rede k_regular exige 'num_vizinhos' par, positivo e menor que o "
+            f"número de agentes ({num_agentes}); recebido {num_vizinhos}."
+        )
+    if num_vizinhos == num_agentes - 1:
+        # Rede completa: não há outra com esses graus
+        origens, destinos = np.nonzero(~np.eye(num_agentes, dtype=bool))
+        return RedeSocial.a_partir_de_arestas(origens, destinos, num_agentes)
+    while True:
+        ciclos = np.array(
+            [np.random.permutation(num_agentes) for _ in range(num_vizinhos // 2)]
+        )
+        arestas = np.stack(
+            (ciclos.ravel(), np.roll(ciclos, -1, axis=1).ravel()), axis=1
+        )
+        if _separar_arestas_repetidas(arestas, num_agentes):
+            break
+    return RedeSocial.a_partir_de_arestas(
+        np.concatenate((arestas[:, 0], arestas[:, 1])),
+        np.concatenate((arestas[:, 1], arestas[:, 0])),
+        num_agentes,
+    )
+
+
+def _separar_arestas_repetidas(
+    arestas: np.ndarray, num_agentes: int, tentativas: int = 1000
+) -> bool:
+    # Troca cada cópia repetida de uma aresta com uma aresta sorteada, no lugar.
+    # Devolve False se alguma cópia não achar troca válida (redes quase
+    # completas), e a rede é sorteada de novo.
+    def chave(a: int, b: int) -> int:
+        return min(a, b) * num_agentes + max(a, b)
+
+    chaves = np.minimum(arestas[:, 0], arestas[:, 1]) * num_agentes + np.maximum(
+        arestas[:, 0], arestas[:, 1]
+    )
+    ordenadas = np.sort(chaves)
+    repetidas = set(ordenadas[1:][ordenadas[1:] == ordenadas[:-1]].tolist())
+    if not repetidas:
+        return True
+    # A primeira ocorrência de cada aresta repetida fica; as demais são trocadas
+    ocorrencias = np.flatnonzero(np.isin(chaves, list(repetidas)))
+    _, primeiras = np.unique(chaves[ocorrencias], return_index=True)
+    copias = np.delete(ocorrencias, primeiras)
+    # Arestas existentes: as chaves ordenadas mais os ajustes das trocas, sem
+    # montar um conjunto com todas as arestas
+    adicionadas, removidas = set(), set()
+
+    def existe(c: int) -> bool:
+        if c in adicionadas:
+            return True
+        posicao = np.searchsorted(ordenadas, c)
+        return (
+            c not in removidas and posicao < len(ordenadas) and ordenadas[posicao] == c
+        )
+
+    for i in copias.tolist():
+        u, v = arestas[i].tolist()
+        for _ in range(tentativas):
+            j = np.random.randint(len(arestas))
+            x, y = arestas[j].tolist()
+            if np.random.random() < 0.5:
+                x, y = y, x
+            novas = (chave(u, x), chave(v, y))
+            if (
+                len({u, v, x, y}) == 4
+                and chave(x, y) not in repetidas
+                and not existe(novas[0])
+                and not existe(novas[1])
+            ):
+                break
+        else:
+            return False
+        adicionadas.discard(chave(x, y))
+        removidas.add(chave(x, y))
+        removidas.difference_update(novas)
+        adicionadas.update(novas)
+        arestas[i] = (u, x)
+        arestas[j] = (v, y)
+    return True
+
+
+def _rede_pequeno_mundo(
+    num_agentes: int, num_vizinhos: int, prob_religacao: float
+) -> RedeSocial:
+    # Watts-Strogatz: anel com k/2 vizinhos de cada lado e religação aleatória
+    metade = max(1, num_vizinhos // 2)
+    origens = np.repeat(np.arange(num_agentes), metade)
+    destinos = (origens + np.tile(np.arange(1, metade + 1), num_agentes)) % num_agentes
+    religar = np.random.random(len(destinos)) < prob_religacao
+    destinos[religar] = np.random.randint(0, num_agentes, size=int(religar.sum()))
+    return RedeSocial.a_partir_de_arestas(
+        np.concatenate((origens, destinos)),
+        np.concatenate((destinos, origens)),
+        num_agentes,
+    )
+
+
+def _rede_livre_de_escala(num_agentes: int, num_vizinhos: int) -> RedeSocial:
+    # Barabási-Albert aproximado em blocos: os agentes de cada bloco se ligam a
+    # `m` extremidades sorteadas das arestas já existentes (anexação preferencial,
+    # pois um agente aparece tantas vezes quanto seu grau). O tamanho do bloco
+    # dobra a cada passo, então a geração custa O(log n) operações numpy.
+    m = max(1, num_vizinhos // 2)
+    inicial = min(num_agentes, m + 1)
+    nucleo = np.arange(inicial)
+    pares = np.array(
+        [(i, j) for i in range(inicial) for j in range(i + 1, inicial)], dtype=np.int64
+    ).reshape(-1, 2)
+    origens = [pares[:, 0]]
+    destinos = [pares[:, 1]]
+    extremidades = np.concatenate((pares[:, 0], pares[:, 1], nucleo))
+
+    inicio = inicial
+    while inicio < num_agentes:
+        fim = min(num_agentes, 2 * inicio)
+        novos = np.repeat(np.arange(inicio, fim), m)
+        alvos = extremidades[np.random.randint(0, len(extremidades), size=len(novos))]
+        origens.append(novos)
+        destinos.append(alvos)
+        extremidades = np.concatenate((extremidades, novos, alvos))
+        inicio = fim
+
+    origens = np.concatenate(origens)
+    destinos = np.concatenate(destinos)
+    return RedeSocial.a_partir_de_arestas(
+        np.concatenate((origens, destinos)),
+        np.concatenate((destinos, origens)),
+        num_agentes,
+    )
+
+
+TOPOLOGIAS = ("aleatoria", "k_regular", "pequeno_mundo", "livre_de_escala")
+
+
+def gerar_rede(
+    num_agentes: int,
+    num_vizinhos: int,
+    topologia: str = "aleatoria",
+    prob_religacao: float = 0.1,
+) -> RedeSocial:
+    """
+    Gera a rede social da população com a topologia escolhida. "k_regular"
+    levanta `ValueError` se `num_vizinhos` for ímpar ou não for menor que
+    `num_agentes`.
+    """
+    if topologia == "aleatoria":
+        return _rede_aleatoria(num_agentes, num_vizinhos)
+    if topologia == "k_regular":
+        return _rede_k_regular(num_agentes, num_vizinhos)
+    if topologia == "pequeno_mundo":
+        return _rede_pequeno_mundo(num_agentes, num_vizinhos, prob_religacao)
+    if topologia == "livre_de_escala":
+        return _rede_livre_de_escala(num_agentes, num_vizinhos)
+    raise ValueError(f"Topologia de rede desconhecida: {topologia!r}")
@@ -0,0 +1,119 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional
+
+from .populacao import matriz_cotas
+
+if TYPE_CHECKING:
+    from .ambiente_de_mercado import Mercado
+
+
+@dataclass
+class RegistroDia:
+    """
+    Estado compacto do mercado ao fim de um dia, com uma posição por FII nos
+    arrays. `agentes`, quando pedido, traz arrays por investidor: "sentimento",
+    "caixa", "cotas" (investidores × FIIs) e "riqueza". `fita`, quando pedida,
+    traz os negócios do dia em colunas: "ativo" (índice do FII), "comprador",
+    "vendedor", "quantidade" e "preco". Com várias rodadas por dia,
+    `precos_rodadas` traz o preço de cada FII ao fim de cada rodada (rodadas ×
+    FIIs).
+    """
+
+    dia: int
+    precos: np.ndarray
+    volumes: np.ndarray
+    negocios: np.ndarray
+    volatilidades: np.ndarray
+    sentimento_medio: float
+    news: float
+    agentes: Optional[Dict[str, np.ndarray]] = None
+    fita: Optional[Dict[str, np.ndarray]] = None
+    precos_rodadas: Optional[np.ndarray] = None
+
+    @property
+    def preco(self) -> float:
+        return float(self.precos[0])
+
+    @property
+    def volume(self) -> int:
+        return int(self.volumes.sum())
+
+    @property
+    def volatilidade(self) -> float:
+        return float(self.volatilidades[0])
+
+
+class ColetorRegistros:
+    """
+    Monta os `RegistroDia` de um mercado. Os livros de ordens só guardam totais
+    acumulados de negócios e cotas; o coletor guarda os totais do dia anterior
+    para obter os valores de cada dia por diferença.
+    """
+
+    def __init__(
+        self,
+        mercado: "Mercado",
+        incluir_agentes: bool = False,
+        incluir_fita: bool = False,
+    ):
+        self.mercado = mercado
+        self.incluir_agentes = incluir_agentes
+        self.incluir_fita = incluir_fita
+        self._cotas_anteriores, self._negocios_anteriores = self._totais()
+        if incluir_fita:
+            for livro in mercado.livros_ordens:
+                livro.fita = []
+
+    def _totais(self):
+        livros = self.mercado.livros_ordens
+        return (
+            np.array([livro.cotas_negociadas for livro in livros], dtype=np.int64),
+            np.array([livro.num_negocios for livro in livros], dtype=np.int64),
+        )
+
+    def registrar(self, sentimento_medio: float) -> RegistroDia:
+        mercado = self.mercado
+        cotas, negocios = self._totais()
+        precos = mercado.precos_cota()
+        registro = RegistroDia(
+            dia=mercado.dia_atual,
+            precos=precos,
+            volumes=cotas - self._cotas_anteriores,
+            negocios=negocios - self._negocios_anteriores,
+            volatilidades=np.array(mercado.volatilidades, dtype=float),
+            sentimento_medio=float(sentimento_medio),
+            news=float(mercado.news),
+        )
+        self._cotas_anteriores, self._negocios_anteriores = cotas, negocios
+        if mercado.rodadas_por_dia > 1:
+            registro.precos_rodadas = mercado.precos_rodadas.copy()
+
+        if self.incluir_agentes:
+            investidores = mercado.investidores
+            caixa = np.array([inv.caixa for inv in investidores], dtype=float)
+            carteiras = matriz_cotas(investidores, mercado.ativos)
+            registro.agentes = {
+                "sentimento": np.array([inv.sentimento for inv in investidores]),
+                "caixa": caixa,
+                "cotas": carteiras,
+                "riqueza": caixa + carteiras @ precos,
+            }
+        if self.incluir_fita:
+            registro.fita = self._esvaziar_fita()
+        return registro
+
+    def _esvaziar_fita(self) -> Dict[str, np.ndarray]:
+        ativos, negocios = [], []
+        for indice, livro in enumerate(self.mercado.livros_ordens):
+            ativos.extend([indice] * len(livro.fita))
+            negocios.extend(livro.fita)
+            livro.fita = []
+        colunas = np.array(negocios, dtype=float).reshape(-1, 4)
+        return {
+            "ativo": np.array(ativos, dtype=np.int32),
+            "comprador": colunas[:, 0].astype(np.int64),
+            "vendedor": colunas[:, 1].astype(np.int64),
+            "quantidade": colunas[:, 2].astype(np.int64),
+            "preco": colunas[:, 3],
+        }
@@ -1,31 +1,50 @@
+import asyncio
+import os
+from contextlib import nullcontext
+from functools import partial
 import numpy as np
 import random
+from typing import AsyncIterator, Callable, Iterator, List, Optional
 
 from .instrumentos_financeiros import FII, Imovel
 from .agentes_economicos import Investidor
 from .ambiente_de_mercado import Mercado
+from .cenarios import cenario_da_configuracao
+from .configuracao import ParametrosSentimento, compilar_parametros
 from .fatores_de_ambiente import BancoCentral, Midia
-from . import utils
+from .rede_social import gerar_rede
+from .registros import ColetorRegistros, RegistroDia
+from .saida_colunar import EscritorResultados
+from .checkpoint import (
+    capturar_checkpoint,
+    carregar_checkpoint,
+    checkpoint_mais_recente,
+    restaurar_simulacao,
+    salvar_checkpoint,
+)
+from . import fatos_estilizados, utils
 
 
-def run_single_simulation(sim_params: dict, run_id: str):
-    print(f"--- Iniciando Simulação: {run_id} ---")
+def run_single_simulation(sim_params: dict, run_id: str, verbose: bool = True):
+    if verbose:
+        print(f"--- Iniciando Simulação: {run_id} ---")
+    mercado = _criar_mercado(sim_params)
+    return _executar_simulacao(mercado, sim_params, run_id, verbose, 1, [])
 
+
+def _criar_mercado(sim_params: dict) -> Mercado:
+    # Valida toda a configuração antes de criar qualquer objeto
+    parametros = compilar_parametros(sim_params)
     seed = sim_params["geral"].get("random_seed", 42)
     random.seed(seed)
     np.random.seed(seed)
 
-    # Inicialização do FII e imóveis
-    fii_cfg = sim_params["fii"]
-    fii = FII(
-        num_cotas=fii_cfg["num_cotas"], caixa=fii_cfg["caixa_inicial"], params=fii_cfg
-    )
-    for imovel_cfg in sim_params["imoveis_lista"]:
-        fii.adicionar_imovel(Imovel(**imovel_cfg))
-
-    hist_precos_inicial = fii.inicializar_historico_precos(dias=30)
+    # Inicialização dos FIIs e imóveis
+    fiis = _criar_fiis(sim_params)
+    hist_precos_iniciais = [fii.inicializar_historico_precos(dias=30) for fii in fiis]
 
-    # Inicialização dos investidores
+    # Inicialização dos investidores; cada um começa com cotas de um único fundo,
+    # distribuídos em rodízio pelo universo
     investidores = []
     investidor_cfg = sim_params["agente"]
     for i in range(investidor_cfg["num_agentes"]):
@@ -34,6 +53,7 @@ def run_single_simulation(sim_params: dict, run_id: str):
             if i == 0
             else investidor_cfg["cotas_iniciais_outros"]
         )
+        indice_fii = i % len(fiis)
         investidor = Investidor(
             id_investidor=i,
             lf=utils.gerar_literacia_financeira(
@@ -44,48 +64,375 @@ def run_single_simulation(sim_params: dict, run_id: str):
             ),
             caixa=investidor_cfg["caixa_inicial"],
             cotas=cotas_iniciais,
-            historico_precos=hist_precos_inicial,
-            parametros=investidor_cfg.get("params", {}),
+            historico_precos=hist_precos_iniciais[indice_fii],
+            parametros=parametros.investidor,
+            ativo=fiis[indice_fii].nome,
         )
         investidores.append(investidor)
-    for inv in investidores:
-        inv.definir_vizinhos(investidores, num_vizinhos=investidor_cfg["num_vizinhos"])
 
-    # Fatores ambientais
-    bc = BancoCentral(sim_params["banco_central"])
-    midia = Midia({**sim_params["midia"], "num_dias": sim_params["geral"]["num_dias"]})
-    mercado = Mercado(investidores, fii, bc, midia, sim_params["mercado"])
+    # Rede social em formato esparso; as listas de objetos só são necessárias
+    # para o motor por agente
+    rede = gerar_rede(
+        len(investidores),
+        investidor_cfg["num_vizinhos"],
+        topologia=investidor_cfg.get("topologia_rede", "aleatoria"),
+        prob_religacao=investidor_cfg.get("prob_religacao_rede", 0.1),
+    )
+    if parametros.mercado.motor_sentimento == "agentes":
+        for inv, vizinhos in zip(investidores, rede.listas()):
+            inv.vizinhos = [investidores[j] for j in vizinhos.tolist()]
+
+    # Fatores ambientais, lidos de um cenário pré-calculado quando configurado
+    cenario = cenario_da_configuracao(sim_params)
+    bc = BancoCentral(sim_params["banco_central"], cenario)
+    midia = Midia(
+        {**sim_params["midia"], "num_dias": sim_params["geral"]["num_dias"]}, cenario
+    )
+    return Mercado(
+        investidores,
+        fiis,
+        bc,
+        midia,
+        sim_params["mercado"],
+        rede_social=rede,
+        semente=seed,
+    )
+
+
+def _criar_fiis(sim_params: dict) -> List[FII]:
+    """
+    Universo de FIIs da simulação, em ordem de prioridade:
+      - "fiis": lista explícita de fundos, cada um com "nome", "imoveis_lista" e
+        parâmetros próprios que sobrepõem os da seção "fii";
+      - "universo_fiis" com "num_fundos" > 1: fundos sintéticos com imóveis
+        sorteados nas faixas configuradas e calendários de dividendos escalonados;
+      - caso contrário, o FII único descrito por "fii" e "imoveis_lista".
+    """
+    fii_cfg = sim_params["fii"]
+    fundos_cfg = sim_params.get("fiis")
+    universo_cfg = sim_params.get("universo_fiis", {})
+    if not fundos_cfg and universo_cfg.get("num_fundos", 1) > 1:
+        fundos_cfg = _gerar_universo_fiis(
+            universo_cfg,
+            sim_params["mercado"].get("dividendos_frequencia", 21),
+        )
+    if not fundos_cfg:
+        fundos_cfg = [{"nome": "FII", "imoveis_lista": sim_params["imoveis_lista"]}]
+
+    fiis = []
+    for fundo_cfg in fundos_cfg:
+        params = {**fii_cfg, **fundo_cfg}
+        imoveis = params.pop("imoveis_lista", sim_params["imoveis_lista"])
+        fii = FII(
+            num_cotas=params["num_cotas"],
+            caixa=params["caixa_inicial"],
+            params=params,
+            nome=params.pop("nome"),
+        )
+        for imovel_cfg in imoveis:
+            fii.adicionar_imovel(Imovel(**imovel_cfg))
+        fiis.append(fii)
+    return fiis
+
+
+def _gerar_universo_fiis(universo_cfg: dict, freq_dividendos: int) -> List[dict]:
+    num_fundos = universo_cfg["num_fundos"]
+    min_imoveis, max_imoveis = universo_cfg.get("imoveis_por_fundo", [1, 5])
+    faixa_valor = universo_cfg.get("valor_imovel", [500_000, 5_000_000])
+    faixa_vacancia = universo_cfg.get("vacancia", [0.0, 0.3])
+    faixa_custo = universo_cfg.get("custo_manutencao", [100, 1_000])
+    params_imovel = universo_cfg.get("params_imovel", {})
+    fundos = []
+    for k in range(num_fundos):
+        num_imoveis = np.random.randint(min_imoveis, max_imoveis + 1)
+        fundos.append(
+            {
+                "nome": f"FII{k:03d}",
+                "dividendos_defasagem": k % freq_dividendos,
+                "imoveis_lista": [
+                    {
+                        "valor": float(np.random.uniform(*faixa_valor)),
+                        "vacancia": float(np.random.uniform(*faixa_vacancia)),
+                        "custo_manutencao": float(np.random.uniform(*faixa_custo)),
+                        "params": dict(params_imovel),
+                    }
+                    for _ in range(num_imoveis)
+                ],
+            }
+        )
+    return fundos
+
+
+def resume_simulation(
+    sim_params: dict,
+    run_id: str,
+    caminho_checkpoint: Optional[str] = None,
+    verbose: bool = True,
+):
+    """
+    Continua uma simulação a partir de um checkpoint (por padrão, o mais recente
+    de `run_id`) e devolve os mesmos resultados de `run_single_simulation`.
+    Com os mesmos parâmetros, a trajetória é idêntica à de uma execução sem
+    interrupção; com parâmetros alterados, o checkpoint serve de aquecimento
+    comum para variantes do cenário.
+    """
+    caminho_checkpoint = _localizar_checkpoint(sim_params, run_id, caminho_checkpoint)
+    if verbose:
+        print(f"--- Retomando Simulação: {run_id} ({caminho_checkpoint}) ---")
+
+    mercado, ultimo_dia, sentimento_medio_diario = restaurar_simulacao(
+        carregar_checkpoint(caminho_checkpoint), sim_params
+    )
+    return _executar_simulacao(
+        mercado, sim_params, run_id, verbose, ultimo_dia + 1, sentimento_medio_diario
+    )
+
+
+def _localizar_checkpoint(
+    sim_params: dict, run_id: str, caminho_checkpoint: Optional[str]
+) -> str:
+    if caminho_checkpoint is None:
+        caminho_checkpoint = checkpoint_mais_recente(
+            _diretorio_checkpoints(sim_params, run_id)
+        )
+        if caminho_checkpoint is None:
+            raise FileNotFoundError(f"Nenhum checkpoint encontrado para {run_id!r}.")
+    return caminho_checkpoint
+
+
+def _diretorio_checkpoints(sim_params: dict, run_id: str) -> str:
+    diretorio = sim_params.get("checkpoint", {}).get("diretorio", "results/checkpoints")
+    return os.path.join(diretorio, run_id)
+
+
+def _simular_dias(
+    mercado: Mercado,
+    sim_params: dict,
+    run_id: str,
+    verbose: bool,
+    dia_inicial: int,
+    sentimento_medio_diario: List[float],
+    ao_fim_do_dia: Optional[Callable[[int, bool], None]] = None,
+) -> Iterator[int]:
+    """
+    Laço de simulação: executa um dia por passo, grava os checkpoints
+    configurados e devolve o dia concluído. O mercado é fechado (`fechar`) ao
+    fim do laço ou quando o gerador é encerrado antes disso.
+
+    `ao_fim_do_dia(dia, checkpoint)` roda antes da gravação do checkpoint do
+    dia, para que saídas em disco cheguem até ele antes que o checkpoint exista.
+    """
+    cfg_checkpoint = sim_params.get("checkpoint", {})
+    intervalo_checkpoint = cfg_checkpoint.get("intervalo_dias", 0)
+    diretorio_checkpoint = _diretorio_checkpoints(sim_params, run_id)
 
-    # Loop de simulação
     num_dias = sim_params["geral"]["num_dias"]
-    sentimento_medio_diario = []
-    for dia in range(1, num_dias + 1):
-        print(f"Executando Dia {dia}/{num_dias}")
-        mercado.executar_dia(sim_params["parametros_sentimento_e_ordem"])
-        sentimento_medio_diario.append(
-            utils.calcular_sentimento_medio(mercado.investidores)
+    parametros_sentimento = ParametrosSentimento.a_partir_de_dicionario(
+        sim_params["parametros_sentimento_e_ordem"]
+    )
+    try:
+        for dia in range(dia_inicial, num_dias + 1):
+            if verbose:
+                print(f"Executando Dia {dia}/{num_dias}")
+            mercado.executar_dia(parametros_sentimento)
+            sentimento_medio_diario.append(
+                utils.calcular_sentimento_medio(mercado.investidores)
+            )
+            checkpoint = bool(
+                intervalo_checkpoint
+                and dia % intervalo_checkpoint == 0
+                and dia < num_dias
+            )
+            if ao_fim_do_dia is not None:
+                ao_fim_do_dia(dia, checkpoint)
+            if checkpoint:
+                salvar_checkpoint(
+                    capturar_checkpoint(mercado, dia, sentimento_medio_diario),
+                    diretorio_checkpoint,
+                    manter=cfg_checkpoint.get("manter", 2),
+                )
+            yield dia
+    finally:
+        mercado.fechar()
+
+
+def iterar_simulacao(
+    sim_params: dict,
+    run_id: str,
+    incluir_agentes: bool = False,
+    caminho_checkpoint: Optional[str] = None,
+    verbose: bool = False,
+    incluir_fita: bool = False,
+) -> Iterator[RegistroDia]:
+    """
+    Executa a simulação devolvendo um `RegistroDia` ao fim de cada dia (preços,
+    volumes, volatilidades, sentimento médio e, com `incluir_agentes`, arrays
+    por investidor e, com `incluir_fita`, os negócios do dia), em vez de
+    acumular tudo até o fim.
+
+    Os registros não são guardados, então quem consome decide o que manter, e
+    interromper a iteração (por exemplo, com `break` quando a trajetória
+    diverge) encerra a simulação e libera os processos. Com
+    `caminho_checkpoint`, a iteração continua a partir desse checkpoint.
+    """
+    if caminho_checkpoint is None:
+        mercado = _criar_mercado(sim_params)
+        dia_inicial, sentimento_medio_diario = 1, []
+    else:
+        mercado, ultimo_dia, sentimento_medio_diario = restaurar_simulacao(
+            carregar_checkpoint(caminho_checkpoint), sim_params
+        )
+        dia_inicial = ultimo_dia + 1
+
+    with mercado:
+        coletor = ColetorRegistros(mercado, incluir_agentes, incluir_fita)
+        dias = _simular_dias(
+            mercado, sim_params, run_id, verbose, dia_inicial, sentimento_medio_diario
         )
+        try:
+            for _ in dias:
+                yield coletor.registrar(sentimento_medio_diario[-1])
+        finally:
+            dias.close()
 
-    mercado.fechar_pool()
 
-    # Coleta de resultados brutos
+async def iterar_simulacao_async(
+    sim_params: dict,
+    run_id: str,
+    incluir_agentes: bool = False,
+    caminho_checkpoint: Optional[str] = None,
+    incluir_fita: bool = False,
+) -> AsyncIterator[RegistroDia]:
+    """
+    Variante assíncrona de `iterar_simulacao`: cada dia roda em uma thread do
+    executor padrão do laço de eventos, que fica livre para outras tarefas
+    (um painel, um servidor) enquanto a simulação avança.
+    """
+    laco = asyncio.get_running_loop()
+    registros = iterar_simulacao(
+        sim_params,
+        run_id,
+        incluir_agentes,
+        caminho_checkpoint,
+        incluir_fita=incluir_fita,
+    )
+    fim = object()
+    try:
+        while True:
+            registro = await laco.run_in_executor(None, next, registros, fim)
+            if registro is fim:
+                break
+            yield registro
+    finally:
+        await laco.run_in_executor(None, registros.close)
+
+
+def _criar_escritor(
+    sim_params: dict, run_id: str, mercado: Mercado, dia_inicial: int
+) -> Optional[EscritorResultados]:
+    """
+    Escritor da seção "saida", gravando em `diretorio/<run_id>`, ou None sem
+    diretório configurado. Ao retomar de um checkpoint, a saída existente é
+    reaberta e truncada no dia do checkpoint.
+    """
+    saida_cfg = sim_params.get("saida", {})
+    if not saida_cfg.get("diretorio"):
+        return None
+    return EscritorResultados(
+        os.path.join(saida_cfg["diretorio"], run_id),
+        mercado.ativos,
+        intervalo_agentes=saida_cfg.get("intervalo_agentes", 1),
+        passo_agentes=saida_cfg.get("passo_agentes", 1),
+        tipo_agentes=saida_cfg.get("tipo_agentes", "float32"),
+        linhas_por_parte=saida_cfg.get("linhas_por_parte", 256),
+        continuar_do_dia=dia_inicial - 1 if dia_inicial > 1 else None,
+    )
+
+
+def _escrever_dia(
+    escritor: EscritorResultados,
+    coletor: ColetorRegistros,
+    sentimento_medio_diario: List[float],
+    dia: int,
+    checkpoint: bool,
+) -> None:
+    """
+    Grava o registro do dia; em dias de checkpoint, descarrega os buffers para
+    que a saída em disco acompanhe o checkpoint.
+    """
+    escritor.escrever(coletor.registrar(sentimento_medio_diario[-1]))
+    if checkpoint:
+        escritor.descarregar()
+
+
+def _executar_simulacao(
+    mercado: Mercado,
+    sim_params: dict,
+    run_id: str,
+    verbose: bool,
+    dia_inicial: int,
+    sentimento_medio_diario: List[float],
+):
+    num_dias = sim_params["geral"]["num_dias"]
+    # O mercado e a saída são fechados mesmo se um dia falhar; a saída grava as
+    # linhas em buffer e os metadados antes de o mercado ser encerrado
+    with mercado:
+        escritor = _criar_escritor(sim_params, run_id, mercado, dia_inicial)
+        with escritor if escritor is not None else nullcontext():
+            ao_fim_do_dia = (
+                partial(
+                    _escrever_dia,
+                    escritor,
+                    ColetorRegistros(
+                        mercado,
+                        incluir_agentes=sim_params["saida"].get("agentes", False),
+                        incluir_fita=sim_params["saida"].get("fita_negocios", True),
+                    ),
+                    sentimento_medio_diario,
+                )
+                if escritor is not None
+                else None
+            )
+            for _ in _simular_dias(
+                mercado,
+                sim_params,
+                run_id,
+                verbose,
+                dia_inicial,
+                sentimento_medio_diario,
+                ao_fim_do_dia,
+            ):
+                pass
+
+    # Coleta de resultados brutos; com memória limitada, as séries cobrem só a
+    # janela retida e a trajetória completa fica na saída em disco
     historico_precos_fii = np.array(mercado.fii.historico_precos[-num_dias:])
     log_returns = np.diff(np.log(historico_precos_fii[historico_precos_fii > 0]))
 
-    window = sim_params["plot"]["window_volatilidade"]
-    volatilidade_rolante = np.full_like(log_returns, np.nan)
-    for i in range(window, len(log_returns)):
-        volatilidade_rolante[i] = np.std(log_returns[i - window : i]) * (252**0.5)
+    volatilidade_rolante = fatos_estilizados.volatilidade_rolante(
+        log_returns, sim_params["plot"]["window_volatilidade"]
+    )
 
-    # Resultado completo
+    # Resultado completo; com vários FIIs, "historico_precos_fii" é o do primeiro
     results = {
         "historico_precos_fii": historico_precos_fii,
+        "historico_precos_fiis": np.array(
+            [fii.historico_precos[-num_dias:] for fii in mercado.fiis]
+        ),
         "log_returns": log_returns,
         "volatilidade_rolante": volatilidade_rolante,
         "sentimento_medio_diario": sentimento_medio_diario,
         "objeto_fii_final": mercado.fii,
+        "lista_fiis_final": mercado.fiis,
         "lista_investidores_final": mercado.investidores,
     }
 
-    print(f"--- Simulação {run_id} Concluída ---")
+    if mercado.instrumentacao.ativa:
+        results["instrumentacao"] = mercado.instrumentacao.tabela()
+        arquivo_trace = sim_params["mercado"].get("arquivo_trace")
+        if arquivo_trace:
+            mercado.instrumentacao.salvar_trace(arquivo_trace)
+
+    if verbose:
+        print(f"--- Simulação {run_id} Concluída ---")
     return results
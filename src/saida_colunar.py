@@ -0,0 +1,300 @@
+import glob
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from .registros import RegistroDia
+
+_ARQUIVO_METADADOS = "metadados.json"
+_PADRAO_PARTE = "parte_{indice:06d}.npy"
+
+
+class _TabelaEmPartes:
+    """
+    Tabela gravada por colunas, cada uma como uma sequência de arquivos .npy
+    (partes) com o mesmo número de linhas. As linhas ficam em memória até somar
+    `linhas_por_parte` ou `bytes_por_parte`, o que limita a memória usada pela
+    escrita independentemente da duração da simulação.
+    """
+
+    def __init__(self, pasta: str, linhas_por_parte: int, bytes_por_parte: int):
+        self.pasta = pasta
+        self.linhas_por_parte = linhas_por_parte
+        self.bytes_por_parte = bytes_por_parte
+        self.colunas: Dict[str, dict] = {}
+        self.linhas = 0
+        self.partes = 0
+        self._pendentes: Dict[str, List[np.ndarray]] = {}
+        self._linhas_pendentes = 0
+        self._bytes_pendentes = 0
+
+    def adicionar_linhas(self, **colunas: np.ndarray) -> None:
+        """
+        Acrescenta linhas; cada coluna é um array cujo primeiro eixo são as linhas.
+        """
+        linhas = None
+        for nome, valores in colunas.items():
+            valores = np.asarray(valores)
+            if linhas is None:
+                linhas = valores.shape[0]
+            elif valores.shape[0] != linhas:
+                raise ValueError("Todas as colunas devem ter o mesmo número de linhas.")
+            if nome not in self.colunas:
+                self.colunas[nome] = {
+                    "dtype": valores.dtype.str,
+                    "forma": list(valores.shape[1:]),
+                }
+                self._pendentes[nome] = []
+            self._pendentes[nome].append(valores)
+            self._bytes_pendentes += valores.nbytes
+        if not linhas:
+            return
+        self._linhas_pendentes += linhas
+        if (
+            self._linhas_pendentes >= self.linhas_por_parte
+            or self._bytes_pendentes >= self.bytes_por_parte
+        ):
+            self.descarregar()
+
+    def adicionar_linha(self, **valores) -> None:
+        self.adicionar_linhas(
+            **{nome: np.asarray(valor)[np.newaxis] for nome, valor in valores.items()}
+        )
+
+    def descarregar(self) -> None:
+        if not self._linhas_pendentes:
+            return
+        for nome, partes in self._pendentes.items():
+            pasta = os.path.join(self.pasta, nome)
+            os.makedirs(pasta, exist_ok=True)
+            np.save(
+                os.path.join(pasta, _PADRAO_PARTE.format(indice=self.partes)),
+                np.concatenate(partes).astype(self.colunas[nome]["dtype"], copy=False),
+            )
+            partes.clear()
+        self.partes += 1
+        self.linhas += self._linhas_pendentes
+        self._linhas_pendentes = 0
+        self._bytes_pendentes = 0
+
+    def metadados(self) -> dict:
+        return {"linhas": self.linhas, "partes": self.partes, "colunas": self.colunas}
+
+    def retomar(self, metadados: dict, ultimo_dia: int) -> None:
+        """
+        Reabre uma tabela gravada, descartando as linhas com "dia" posterior a
+        `ultimo_dia` (escritas depois do checkpoint de onde a simulação retoma).
+        """
+        self.colunas = metadados["colunas"]
+        self._pendentes = {nome: [] for nome in self.colunas}
+        self.linhas = 0
+        self.partes = 0
+        for indice in range(metadados["partes"]):
+            dias = np.load(self._caminho("dia", indice))
+            manter = int(np.searchsorted(dias, ultimo_dia, side="right"))
+            if manter == 0:
+                break
+            if manter < len(dias):
+                for nome in self.colunas:
+                    caminho = self._caminho(nome, indice)
+                    np.save(caminho, np.load(caminho)[:manter])
+            self.partes += 1
+            self.linhas += manter
+            if manter < len(dias):
+                break
+        # Partes posteriores ao ponto de retomada são apagadas
+        for nome in self.colunas:
+            for caminho in _partes(os.path.join(self.pasta, nome))[self.partes :]:
+                os.remove(caminho)
+
+    def _caminho(self, nome: str, indice: int) -> str:
+        return os.path.join(self.pasta, nome, _PADRAO_PARTE.format(indice=indice))
+
+
+class EscritorResultados:
+    """
+    Grava os `RegistroDia` de uma simulação em disco, em formato colunar:
+
+      - "mercado": uma linha por dia com preços, volumes, negócios e
+        volatilidades por FII, sentimento médio e notícia (e, com várias
+        rodadas por dia, os preços ao fim de cada rodada);
+      - "negocios": a fita de negócios, uma linha por negócio (quando os
+        registros trazem `fita`);
+      - "agentes": painéis investidores × dias de sentimento, caixa, riqueza e
+        cotas (quando os registros trazem `agentes`), opcionalmente apenas a
+        cada `intervalo_agentes` dias e para um investidor a cada
+        `passo_agentes`, em `tipo_agentes` para reduzir o tamanho.
+
+    Cada coluna é uma sequência de arquivos .npy que podem ser abertos com
+    mapeamento de memória (`ler_coluna`, `partes_coluna`), de modo que séries
+    longas são analisadas sem carregar tudo na memória nem repetir a simulação.
+    """
+
+    TABELAS = ("mercado", "negocios", "agentes")
+
+    def __init__(
+        self,
+        diretorio: str,
+        ativos: Sequence[str],
+        intervalo_agentes: int = 1,
+        passo_agentes: int = 1,
+        tipo_agentes: str = "float32",
+        linhas_por_parte: int = 256,
+        bytes_por_parte: int = 64 * 2**20,
+        continuar_do_dia: Optional[int] = None,
+    ):
+        self.diretorio = diretorio
+        self.ativos = list(ativos)
+        self.intervalo_agentes = max(int(intervalo_agentes), 1)
+        self.passo_agentes = max(int(passo_agentes), 1)
+        self.tipo_agentes = np.dtype(tipo_agentes)
+        self.tabelas = {
+            nome: _TabelaEmPartes(
+                os.path.join(diretorio, nome), linhas_por_parte, bytes_por_parte
+            )
+            for nome in self.TABELAS
+        }
+        self.indices_agentes: Optional[np.ndarray] = None
+        os.makedirs(diretorio, exist_ok=True)
+
+        caminho_metadados = os.path.join(diretorio, _ARQUIVO_METADADOS)
+        if continuar_do_dia is not None and os.path.exists(caminho_metadados):
+            metadados = ler_metadados(diretorio)
+            for nome, tabela in self.tabelas.items():
+                tabela.retomar(metadados["tabelas"][nome], continuar_do_dia)
+            caminho_indices = os.path.join(diretorio, "agentes", "indices.npy")
+            if os.path.exists(caminho_indices):
+                self.indices_agentes = np.load(caminho_indices)
+        else:
+            for nome in self.TABELAS:
+                for caminho in glob.glob(os.path.join(diretorio, nome, "*", "*.npy")):
+                    os.remove(caminho)
+        self._gravar_metadados()
+
+    def escrever(self, registro: RegistroDia) -> None:
+        intradiario = {}
+        if registro.precos_rodadas is not None:
+            intradiario["precos_rodadas"] = registro.precos_rodadas
+        self.tabelas["mercado"].adicionar_linha(
+            dia=registro.dia,
+            precos=registro.precos,
+            volumes=registro.volumes,
+            negocios=registro.negocios,
+            volatilidades=registro.volatilidades,
+            sentimento_medio=registro.sentimento_medio,
+            news=registro.news,
+            **intradiario,
+        )
+
+        if registro.fita is not None and len(registro.fita["preco"]):
+            self.tabelas["negocios"].adicionar_linhas(
+                dia=np.full(len(registro.fita["preco"]), registro.dia, dtype=np.int32),
+                **registro.fita,
+            )
+
+        if registro.agentes is not None and registro.dia % self.intervalo_agentes == 0:
+            if self.indices_agentes is None:
+                num_agentes = len(registro.agentes["caixa"])
+                self.indices_agentes = np.arange(0, num_agentes, self.passo_agentes)
+                os.makedirs(os.path.join(self.diretorio, "agentes"), exist_ok=True)
+                np.save(
+                    os.path.join(self.diretorio, "agentes", "indices.npy"),
+                    self.indices_agentes,
+                )
+            amostra = self.indices_agentes
+            self.tabelas["agentes"].adicionar_linha(
+                dia=registro.dia,
+                **{
+                    nome: registro.agentes[nome][amostra].astype(self.tipo_agentes)
+                    for nome in ("sentimento", "caixa", "riqueza")
+                },
+                cotas=registro.agentes["cotas"][amostra].astype(np.int32),
+            )
+
+    def descarregar(self) -> None:
+        """
+        Grava em disco todas as linhas pendentes e atualiza os metadados.
+        """
+        for tabela in self.tabelas.values():
+            tabela.descarregar()
+        self._gravar_metadados()
+
+    def fechar(self) -> None:
+        self.descarregar()
+
+    def __enter__(self) -> "EscritorResultados":
+        return self
+
+    def __exit__(self, *excecao) -> None:
+        self.fechar()
+
+    def _gravar_metadados(self) -> None:
+        metadados = {
+            "ativos": self.ativos,
+            "intervalo_agentes": self.intervalo_agentes,
+            "passo_agentes": self.passo_agentes,
+            "tabelas": {
+                nome: tabela.metadados() for nome, tabela in self.tabelas.items()
+            },
+        }
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        with os.fdopen(descritor, "w", encoding="utf-8") as f:
+            json.dump(metadados, f, indent=2, ensure_ascii=False)
+        os.replace(temporario, os.path.join(self.diretorio, _ARQUIVO_METADADOS))
+
+
+def _partes(pasta: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(pasta, "parte_*.npy")))
+
+
+def ler_metadados(diretorio: str) -> dict:
+    with open(os.path.join(diretorio, _ARQUIVO_METADADOS), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def partes_coluna(
+    diretorio: str, tabela: str, coluna: str, mapear: bool = True
+) -> Iterator[np.ndarray]:
+    """
+    Partes gravadas de uma coluna, em ordem, abertas com mapeamento de memória;
+    permite percorrer colunas maiores que a memória disponível.
+    """
+    num_partes = ler_metadados(diretorio)["tabelas"][tabela]["partes"]
+    pasta = os.path.join(diretorio, tabela, coluna)
+    for caminho in _partes(pasta)[:num_partes]:
+        yield np.load(caminho, mmap_mode="r" if mapear else None)
+
+
+def ler_coluna(diretorio: str, tabela: str, coluna: str) -> np.ndarray:
+    """
+    Coluna inteira em memória, por exemplo `ler_coluna(d, "agentes", "riqueza")`
+    para o painel dias × investidores amostrados.
+    """
+    metadados = ler_metadados(diretorio)["tabelas"][tabela]
+    partes = list(partes_coluna(diretorio, tabela, coluna))
+    if not partes:
+        info = metadados["colunas"].get(coluna, {"dtype": "<f8", "forma": []})
+        return np.empty([0] + info["forma"], dtype=info["dtype"])
+    return np.concatenate(partes)
+
+
+def ler_tabela(diretorio: str, tabela: str) -> pd.DataFrame:
+    """
+    Tabela como DataFrame; colunas com um valor por FII ("precos", "volumes")
+    viram uma coluna por fundo, como "precos_FII". Indicada para "mercado" e
+    "negocios"; os painéis de agentes são lidos com `ler_coluna`.
+    """
+    metadados = ler_metadados(diretorio)
+    ativos = metadados["ativos"]
+    dados = {}
+    for coluna, info in metadados["tabelas"][tabela]["colunas"].items():
+        valores = ler_coluna(diretorio, tabela, coluna)
+        if info["forma"] == [len(ativos)]:
+            for indice, ativo in enumerate(ativos):
+                dados[f"{coluna}_{ativo}"] = valores[:, indice]
+        elif not info["forma"]:
+            dados[coluna] = valores
+    return pd.DataFrame(dados)
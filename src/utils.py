@@ -2,23 +2,24 @@ import numpy as np
 import pandas as pd
 from scipy.stats import truncnorm
 
+from .configuracao import ParametrosMediaMovel
+from .historico_de_mercado import num_precos
 
-def calcular_media_movel_tecnica(precos_historicos, lf, tipo_media, params_media):
-    if not isinstance(precos_historicos, np.ndarray):
-        precos_historicos = np.array(precos_historicos)
-
-    if len(precos_historicos) == 0:
-        return 0.0, 0.0
 
-    dias_uteis_ano = params_media.get("dias_uteis_ano", 252)
-    janela_curta_divisor = params_media.get("janela_curta_divisor", 4)
-
-    omega = int(lf * dias_uteis_ano)
+def calcular_janelas_media_movel(lf, params_media):
+    """
+    `params_media` é um `ParametrosMediaMovel` ou o dicionário da configuração.
+    """
+    params_media = ParametrosMediaMovel.resolver(params_media)
+    omega = int(lf * params_media.dias_uteis_ano)
     if omega < 2:
         omega = 2
 
-    janela_curta = max(2, int(omega / janela_curta_divisor))
+    janela_curta = max(2, int(omega / params_media.janela_curta_divisor))
+    return omega, janela_curta
+
 
+def calcular_media_movel_por_janela(precos_historicos, omega, janela_curta, tipo_media):
     if tipo_media == "sma":
         media_curta = (
             np.mean(precos_historicos[-janela_curta:])
@@ -42,6 +43,57 @@ def calcular_media_movel_tecnica(precos_historicos, lf, tipo_media, params_media
     return media_curta, media_longa
 
 
+def calcular_media_movel_tecnica(precos_historicos, lf, tipo_media, params_media):
+    if not isinstance(precos_historicos, np.ndarray):
+        precos_historicos = np.array(precos_historicos)
+
+    if len(precos_historicos) == 0:
+        return 0.0, 0.0
+
+    omega, janela_curta = calcular_janelas_media_movel(lf, params_media)
+    return calcular_media_movel_por_janela(
+        precos_historicos, omega, janela_curta, tipo_media
+    )
+
+
+def agrupar_janelas_media_movel(lfs, params_media):
+    """
+    Agrupa os agentes por janela de média móvel. Devolve as janelas distintas
+    (`omega` e janela curta) e, para cada agente, o índice de sua janela.
+    """
+    params_media = ParametrosMediaMovel.resolver(params_media)
+    omegas = np.maximum(
+        (np.asarray(lfs, dtype=float) * params_media.dias_uteis_ano).astype(int), 2
+    )
+    omegas_unicos, indices = np.unique(omegas, return_inverse=True)
+    janelas_curtas = [
+        max(2, int(omega / params_media.janela_curta_divisor))
+        for omega in omegas_unicos
+    ]
+    return [int(omega) for omega in omegas_unicos], janelas_curtas, indices
+
+
+def calcular_medias_moveis_populacao(precos_historicos, lfs, tipo_media, params_media):
+    """
+    Versão vetorizada de `calcular_media_movel_tecnica` para uma população inteira.
+    As médias dependem da LF apenas através de `omega`, então cada janela distinta
+    é calculada uma única vez e o resultado é espalhado para os agentes.
+    """
+    precos_historicos = np.asarray(precos_historicos, dtype=float)
+    lfs = np.asarray(lfs, dtype=float)
+    if len(precos_historicos) == 0:
+        return np.zeros(lfs.shape), np.zeros(lfs.shape)
+
+    omegas, janelas_curtas, indices = agrupar_janelas_media_movel(lfs, params_media)
+    curtas = np.empty(len(omegas))
+    longas = np.empty(len(omegas))
+    for j, (omega, janela_curta) in enumerate(zip(omegas, janelas_curtas)):
+        curtas[j], longas[j] = calcular_media_movel_por_janela(
+            precos_historicos, omega, janela_curta, tipo_media
+        )
+    return curtas[indices], longas[indices]
+
+
 def gerar_literacia_financeira(media, desvio, minimo, maximo):
     a, b = (minimo - media) / desvio, (maximo - media) / desvio
     return truncnorm.rvs(a, b, loc=float(media), scale=float(desvio))
@@ -52,3 +104,161 @@ def calcular_sentimento_medio(investidores: list) -> float:
         return 0.0
     sentimentos = np.array([investidor.sentimento for investidor in investidores])
     return np.mean(sentimentos)
+
+
+class ServicoMediasMoveis:
+    """
+    Médias móveis técnicas compartilhadas por todos os agentes.
+
+    Todos os agentes observam a mesma série de preços e muitos compartilham a
+    mesma janela (`omega` deriva de `int(lf * dias_uteis_ano)`). O serviço mantém
+    um acumulador por janela distinta, atualizado em O(1) a cada novo preço, e
+    devolve os valores em cache com a mesma semântica de
+    `calcular_media_movel_tecnica`.
+    """
+
+    def __init__(self, precos, tipo_media, params_media):
+        self.precos = precos
+        self.tipo_media = tipo_media
+        self.params_media = ParametrosMediaMovel.resolver(params_media)
+        self._num_processados = 0
+        # Acumuladores por chave: (janela,) para SMA e (janela, alpha) para EMA
+        self._acumuladores = {}
+        self._cache = {}
+
+    def _precos_array(self):
+        return np.asarray(self.precos, dtype=float)
+
+    def _registrar(self, chave, precos):
+        janela = chave[0]
+        ultimos = precos[-janela:]
+        if self.tipo_media == "sma":
+            self._acumuladores[chave] = float(np.sum(ultimos))
+        else:
+            alpha = chave[1]
+            pesos = alpha * (1 - alpha) ** np.arange(len(ultimos) - 1, -1, -1)
+            self._acumuladores[chave] = float(np.dot(pesos, ultimos))
+
+    def _sincronizar(self):
+        # Posições absolutas: uma série limitada (`HistoricoPrecos` com janela)
+        # retém apenas os últimos preços, e `deslocamento` converte a posição
+        # absoluta na posição dentro da janela retida
+        total = num_precos(self.precos)
+        if total == self._num_processados:
+            return
+        if not self._acumuladores:
+            self._num_processados = total
+            return
+        precos = self._precos_array()
+        deslocamento = total - len(precos)
+        maior_janela = max(chave[0] for chave in self._acumuladores)
+        if deslocamento > 0 and self._num_processados - maior_janela < deslocamento:
+            raise ValueError(
+                "A janela de preços retida é menor que a maior média móvel; "
+                "aumente 'janela_precos' ou sincronize as médias a cada preço."
+            )
+        for n in range(self._num_processados, total):
+            novo = precos[n - deslocamento]
+            for chave in self._acumuladores:
+                janela = chave[0]
+                saindo = precos[n - janela - deslocamento] if n >= janela else 0.0
+                if self.tipo_media == "sma":
+                    self._acumuladores[chave] += novo - saindo
+                else:
+                    alpha = chave[1]
+                    self._acumuladores[chave] = (
+                        (1 - alpha) * self._acumuladores[chave]
+                        + alpha * novo
+                        - alpha * (1 - alpha) ** janela * saindo
+                    )
+        self._num_processados = total
+        self._cache.clear()
+
+    def _media(self, chave, precos):
+        if chave not in self._acumuladores:
+            self._registrar(chave, precos)
+        janela = chave[0]
+        if self.tipo_media == "sma":
+            if len(precos) < janela:
+                return precos[-1]
+            return self._acumuladores[chave] / janela
+        alpha = chave[1]
+        tamanho = min(len(precos), janela)
+        return self._acumuladores[chave] + (1 - alpha) ** tamanho * precos[-tamanho]
+
+    def medias_por_janela(self, omega, janela_curta):
+        self._sincronizar()
+        chave_cache = (omega, janela_curta)
+        if chave_cache in self._cache:
+            return self._cache[chave_cache]
+
+        precos = self._precos_array()
+        if len(precos) == 0:
+            resultado = (0.0, 0.0)
+        elif self.tipo_media == "sma":
+            resultado = (
+                self._media((janela_curta,), precos),
+                self._media((omega,), precos),
+            )
+        elif min(len(precos), omega) < 2:
+            resultado = (precos[-1], precos[-1])
+        else:
+            resultado = (
+                self._media((omega, 2 / (janela_curta + 1)), precos),
+                self._media((omega, 2 / (omega + 1)), precos),
+            )
+        self._cache[chave_cache] = resultado
+        return resultado
+
+    def atualizar(self):
+        """
+        Incorpora os preços acrescentados desde a última consulta. Com uma série
+        limitada, precisa ser chamado a cada novo preço, antes que os preços que
+        saem das médias deixem a janela retida.
+        """
+        self._sincronizar()
+
+    def estado(self):
+        """
+        Acumuladores e número de preços já processados, para checkpoints.
+        """
+        self._sincronizar()
+        return {
+            "num_processados": self._num_processados,
+            "acumuladores": dict(self._acumuladores),
+        }
+
+    def restaurar_estado(self, estado):
+        self._num_processados = estado["num_processados"]
+        self._acumuladores = dict(estado["acumuladores"])
+        self._cache.clear()
+
+    def medias_para_lf(self, lf):
+        omega, janela_curta = calcular_janelas_media_movel(lf, self.params_media)
+        return self.medias_por_janela(omega, janela_curta)
+
+    def registrar_janelas(self, lfs):
+        """
+        Registra de antemão as janelas de toda a população. Acumuladores criados
+        no mesmo instante evoluem de forma idêntica em qualquer processo, mesmo
+        quando uma janela só é consultada em alguns dias (vários ativos).
+        """
+        self.medias_para_populacao(lfs)
+
+    def medias_para_janelas(self, omegas, janelas_curtas):
+        """
+        Médias (curtas, longas) de cada janela distinta, na ordem dada, como
+        devolvidas por `agrupar_janelas_media_movel`.
+        """
+        curtas = np.empty(len(omegas))
+        longas = np.empty(len(omegas))
+        for j, (omega, janela_curta) in enumerate(zip(omegas, janelas_curtas)):
+            curtas[j], longas[j] = self.medias_por_janela(omega, janela_curta)
+        return curtas, longas
+
+    def medias_para_populacao(self, lfs):
+        omegas, janelas_curtas, indices = agrupar_janelas_media_movel(
+            lfs, self.params_media
+        )
+        curtas, longas = self.medias_para_janelas(omegas, janelas_curtas)
+        return curtas[indices], longas[indices]
@@ -0,0 +1,285 @@
+import argparse
+import dataclasses
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .cenarios import cenario_da_configuracao, sobrescritas_cenario_compartilhado
+from .configuracao import carregar_parametros, compilar_parametros
+from .monte_carlo import (
+    SERIES_RESUMO,
+    _executar_replicacao,
+    aplicar_sobrescritas,
+    gerar_sementes,
+)
+
+_PASTA_SRC = os.path.dirname(os.path.abspath(__file__))
+
+
+def expandir_grade(grade: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Produto cartesiano de uma grade {chave com pontos: lista de valores}.
+    """
+    chaves = sorted(grade)
+    return [
+        dict(zip(chaves, valores))
+        for valores in itertools.product(*(grade[chave] for chave in chaves))
+    ]
+
+
+def versao_codigo() -> str:
+    """
+    Hash do código-fonte do modelo; resultados de versões diferentes não se misturam.
+    """
+    h = hashlib.sha256()
+    for nome in sorted(os.listdir(_PASTA_SRC)):
+        if nome.endswith(".py"):
+            h.update(nome.encode("utf-8"))
+            with open(os.path.join(_PASTA_SRC, nome), "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+
+# Seções que `compilar_parametros` não resolve, mas que mudam a trajetória;
+# "saida", "checkpoint" e "plot" não entram na chave
+_SECOES_NAO_COMPILADAS = (
+    "geral",
+    "agente",
+    "imoveis_lista",
+    "universo_fiis",
+    "banco_central",
+    "midia",
+    "cenario",
+)
+
+
+def chave_resultado(sim_params: dict, semente: int, versao: str) -> str:
+    """
+    Endereço do resultado: hash da configuração resolvida, da semente e do código.
+
+    Os parâmetros validados entram já com os valores padrão resolvidos, de modo
+    que omitir um padrão ou escrevê-lo explicitamente leva à mesma chave.
+    """
+    parametros = {
+        secao: sim_params[secao]
+        for secao in _SECOES_NAO_COMPILADAS
+        if secao in sim_params
+    }
+    if "agente" in parametros:
+        parametros["agente"] = {
+            nome: valor
+            for nome, valor in parametros["agente"].items()
+            if nome != "params"
+        }
+    parametros["compilados"] = dataclasses.asdict(compilar_parametros(sim_params))
+    conteudo = json.dumps(
+        {"parametros": parametros, "semente": semente, "versao": versao},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+class CacheResultados:
+    """
+    Cache em disco de resumos de simulação endereçados por conteúdo.
+
+    Cada resultado é um `.npz` nomeado pela sua chave. Leituras renovam a data de
+    modificação do arquivo, e a remoção por tamanho descarta primeiro os menos
+    usados recentemente.
+    """
+
+    def __init__(self, diretorio: str, tamanho_maximo_bytes: Optional[int] = None):
+        self.diretorio = diretorio
+        self.tamanho_maximo_bytes = tamanho_maximo_bytes
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{chave}.npz")
+
+    def __contains__(self, chave: str) -> bool:
+        return os.path.exists(self._caminho(chave))
+
+    def obter(self, chave: str) -> Optional[Dict[str, np.ndarray]]:
+        caminho = self._caminho(chave)
+        try:
+            with np.load(caminho) as dados:
+                resumo = {nome: dados[nome] for nome in dados.files}
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        os.utime(caminho)
+        return resumo
+
+    def guardar(self, chave: str, resumo: Dict[str, Any]) -> None:
+        """
+        Grava o resumo de forma atômica (arquivo temporário + rename).
+        """
+        arrays = {nome: np.asarray(resumo[nome]) for nome in SERIES_RESUMO}
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".npz.tmp")
+        try:
+            with os.fdopen(descritor, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(temporario, self._caminho(chave))
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        self.remover_excedente()
+
+    def remover_excedente(self) -> None:
+        if self.tamanho_maximo_bytes is None:
+            return
+        arquivos = []
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith(".npz"):
+                caminho = os.path.join(self.diretorio, nome)
+                info = os.stat(caminho)
+                arquivos.append((info.st_mtime, info.st_size, caminho))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.tamanho_maximo_bytes:
+                break
+            os.remove(caminho)
+            total -= tamanho
+
+
+def executar_varredura(
+    sim_params: dict,
+    sobrescritas: Union[Dict[str, List[Any]], List[Dict[str, Any]]],
+    cache: CacheResultados,
+    num_rodadas: int = 1,
+    num_processos: Optional[int] = None,
+    semente_base: Optional[int] = None,
+) -> List[Tuple[Dict[str, Any], int, Dict[str, np.ndarray]]]:
+    """
+    Executa uma varredura sobre `config/parametros.json`.
+
+    `sobrescritas` é uma grade (dict de listas) ou uma lista de sobrescritas.
+    Combinações já presentes no cache não são simuladas de novo; as demais rodam
+    em paralelo e são gravadas assim que terminam, de modo que uma varredura
+    interrompida pode ser retomada. Um cenário exógeno em arquivo é gerado uma
+    única vez, com a semente fixada para todas as execuções.
+
+    Devolve uma lista de (sobrescritas, semente, resumo) na ordem da varredura.
+    """
+    if isinstance(sobrescritas, dict):
+        sobrescritas = expandir_grade(sobrescritas)
+    if semente_base is None:
+        semente_base = sim_params["geral"].get("random_seed", 42)
+    num_processos = num_processos or os.cpu_count() or 1
+    versao = versao_codigo()
+    cenario_compartilhado = sobrescritas_cenario_compartilhado(sim_params)
+    sim_params = aplicar_sobrescritas(sim_params, cenario_compartilhado)
+    cenario_da_configuracao(sim_params)
+
+    combinacoes = []
+    for sobrescrita in sobrescritas:
+        for semente in gerar_sementes(semente_base, num_rodadas):
+            params = aplicar_sobrescritas(
+                sim_params,
+                {
+                    **sobrescrita,
+                    "geral.random_seed": semente,
+                    "mercado.num_processos_paralelos": 1,
+                },
+            )
+            if cenario_compartilhado:
+                cenario_da_configuracao(params)
+            chave = chave_resultado(params, semente, versao)
+            combinacoes.append((sobrescrita, semente, params, chave))
+
+    resumos: Dict[str, Dict[str, np.ndarray]] = {}
+    pendentes = {}
+    for _, _, params, chave in combinacoes:
+        if chave in resumos or chave in pendentes:
+            continue
+        resumo = cache.obter(chave)
+        if resumo is None:
+            pendentes[chave] = params
+        else:
+            resumos[chave] = resumo
+
+    if num_processos <= 1:
+        for chave, params in pendentes.items():
+            resumo = _executar_replicacao(params, chave, 0)
+            cache.guardar(chave, resumo)
+            resumos[chave] = {nome: resumo[nome] for nome in SERIES_RESUMO}
+    elif pendentes:
+        with ProcessPoolExecutor(max_workers=num_processos) as executor:
+            futuros = {
+                executor.submit(_executar_replicacao, params, chave, 0): chave
+                for chave, params in pendentes.items()
+            }
+            for futuro in as_completed(futuros):
+                chave = futuros[futuro]
+                resumo = futuro.result()
+                cache.guardar(chave, resumo)
+                resumos[chave] = {nome: resumo[nome] for nome in SERIES_RESUMO}
+
+    return [
+        (sobrescrita, semente, resumos[chave])
+        for sobrescrita, semente, _, chave in combinacoes
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Varredura de parâmetros com cache de resultados em disco."
+    )
+    parser.add_argument("--config", default="config/parametros.json")
+    parser.add_argument(
+        "--grade",
+        required=True,
+        help="JSON com uma grade {chave: [valores]} ou uma lista de sobrescritas.",
+    )
+    parser.add_argument("--rodadas", type=int, default=1)
+    parser.add_argument("--processos", type=int, default=None)
+    parser.add_argument("--semente", type=int, default=None)
+    parser.add_argument("--cache", default="results/cache")
+    parser.add_argument("--limite-mb", type=float, default=None)
+    parser.add_argument("--saida", default="results/varredura.json")
+    args = parser.parse_args(argv)
+
+    sim_params = carregar_parametros(args.config)
+    with open(args.grade, "r", encoding="utf-8") as f:
+        grade = json.load(f)
+
+    limite = None if args.limite_mb is None else int(args.limite_mb * 1024**2)
+    cache = CacheResultados(args.cache, limite)
+    resultados = executar_varredura(
+        sim_params,
+        grade,
+        cache,
+        num_rodadas=args.rodadas,
+        num_processos=args.processos,
+        semente_base=args.semente,
+    )
+
+    resumo_saida = []
+    for sobrescrita, semente, resumo in resultados:
+        precos = resumo["precos"]
+        resumo_saida.append(
+            {
+                "sobrescritas": sobrescrita,
+                "semente": semente,
+                "preco_final": float(precos[-1]) if len(precos) else None,
+                "volatilidade": float(np.nanstd(resumo["retornos"]) * 252**0.5),
+                "sentimento_medio": float(np.nanmean(resumo["sentimento_medio"])),
+            }
+        )
+    pasta = os.path.dirname(args.saida)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resumo_saida, f, indent=2, ensure_ascii=False)
+    print(f"{len(resultados)} execuções; resumo salvo em: {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import numpy as np
+from typing import Iterable, Optional
+
+from .configuracao import ParametrosMercado
+
+
+class EstimadorVolatilidade:
+    """
+    Estimador incremental da volatilidade anualizada dos retornos logarítmicos.
+
+    Cada novo preço custa O(1), independentemente do tamanho do histórico.
+    Modos disponíveis:
+      - "completo": desvio-padrão de todos os retornos (Welford), equivalente a
+        `np.std(np.diff(np.log(precos)))`;
+      - "janela": desvio-padrão dos últimos `janela` retornos;
+      - "ewma": média móvel exponencial da variância com fator `lambda_ewma`.
+    Preços não positivos são ignorados, como no cálculo original.
+    """
+
+    MODOS = ("completo", "janela", "ewma")
+
+    def __init__(
+        self,
+        modo: str = ParametrosMercado.volatilidade_modo,
+        janela: int = ParametrosMercado.volatilidade_janela,
+        lambda_ewma: float = ParametrosMercado.volatilidade_lambda_ewma,
+        dias_uteis_ano: int = 252,
+    ):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de volatilidade desconhecido: {modo!r}")
+        if modo == "janela" and janela < 2:
+            raise ValueError("A janela de volatilidade deve ter pelo menos 2 dias.")
+        if modo == "ewma" and not 0 < lambda_ewma < 1:
+            raise ValueError("lambda_ewma deve estar entre 0 e 1.")
+
+        self.modo = modo
+        self.janela = janela
+        self.lambda_ewma = lambda_ewma
+        self.fator_anual = dias_uteis_ano**0.5
+
+        self.ultimo_preco: Optional[float] = None
+        self.num_retornos = 0
+        self._media = 0.0
+        self._m2 = 0.0
+        self._variancia_ewma = 0.0
+        self._retornos_janela = np.zeros(janela if modo == "janela" else 0)
+
+    @classmethod
+    def a_partir_de_configuracao(
+        cls, configuracao: ParametrosMercado
+    ) -> "EstimadorVolatilidade":
+        return cls(
+            modo=configuracao.volatilidade_modo,
+            janela=configuracao.volatilidade_janela,
+            lambda_ewma=configuracao.volatilidade_lambda_ewma,
+        )
+
+    def estado(self) -> dict:
+        return {
+            "ultimo_preco": self.ultimo_preco,
+            "num_retornos": self.num_retornos,
+            "media": self._media,
+            "m2": self._m2,
+            "variancia_ewma": self._variancia_ewma,
+            "retornos_janela": self._retornos_janela.copy(),
+        }
+
+    def restaurar_estado(self, estado: dict) -> None:
+        self.ultimo_preco = estado["ultimo_preco"]
+        self.num_retornos = estado["num_retornos"]
+        self._media = estado["media"]
+        self._m2 = estado["m2"]
+        self._variancia_ewma = estado["variancia_ewma"]
+        self._retornos_janela = np.array(estado["retornos_janela"], dtype=float)
+
+    def adicionar_precos(self, precos: Iterable[float]) -> None:
+        for preco in precos:
+            self.adicionar_preco(preco)
+
+    def adicionar_preco(self, preco: float) -> None:
+        if preco <= 0:
+            return
+        if self.ultimo_preco is not None:
+            self._adicionar_retorno(np.log(preco) - np.log(self.ultimo_preco))
+        self.ultimo_preco = preco
+
+    def _adicionar_retorno(self, retorno: float) -> None:
+        if self.modo == "ewma":
+            if self.num_retornos == 0:
+                self._variancia_ewma = retorno * retorno
+            else:
+                self._variancia_ewma = (
+                    self.lambda_ewma * self._variancia_ewma
+                    + (1 - self.lambda_ewma) * retorno * retorno
+                )
+        elif self.modo == "janela" and self.num_retornos >= self.janela:
+            posicao = self.num_retornos % self.janela
+            antigo = self._retornos_janela[posicao]
+            self._retornos_janela[posicao] = retorno
+            media_anterior = self._media
+            self._media += (retorno - antigo) / self.janela
+            self._m2 += (retorno - antigo) * (
+                retorno - self._media + antigo - media_anterior
+            )
+            self._m2 = max(self._m2, 0.0)
+        else:
+            if self.modo == "janela":
+                self._retornos_janela[self.num_retornos] = retorno
+            delta = retorno - self._media
+            self._media += delta / (self.num_retornos + 1)
+            self._m2 += delta * (retorno - self._media)
+        self.num_retornos += 1
+
+    @property
+    def volatilidade(self) -> Optional[float]:
+        """
+        Volatilidade anualizada, ou None enquanto não houver retornos.
+        """
+        if self.num_retornos == 0:
+            return None
+        if self.modo == "ewma":
+            variancia = self._variancia_ewma
+        else:
+            variancia = self._m2 / min(
+                self.num_retornos,
+                self.janela if self.modo == "janela" else self.num_retornos,
+            )
+        return np.sqrt(variancia) * self.fator_anual